@@ -61,8 +61,6 @@ async def generate_images_null_login():
 
 async def download_images():
     """Generate and download images to disk"""
-    import httpx
-    
     print("\n" + "="*60)
     print("Method 3: Generate and Download Images")
     print("="*60)
@@ -75,20 +73,13 @@ async def download_images():
             if response.get("media"):
                 print(f"Downloading {len(response['media'])} images...\n")
                 
-                # Download each image
-                async with httpx.AsyncClient() as client:
-                    for idx, img in enumerate(response["media"], 1):
-                        img_url = img['url']
-                        filename = f"generated_image_{idx}.jpg"
-                        
-                        # Download image
-                        img_response = await client.get(img_url)
-                        
-                        # Save to file
-                        with open(filename, "wb") as f:
-                            f.write(img_response.content)
-                        
-                        print(f"✅ Saved: {filename}")
+                # Download all images concurrently, skipping duplicates
+                downloaded = await ai.download_media(response["media"], directory="generated_images")
+                for img in downloaded:
+                    if img["path"]:
+                        print(f"✅ Saved: {img['path']}")
+                    else:
+                        print(f"❌ Failed: {img['url'][:80]}... ({img['error']})")
                 
                 print(f"\n✨ Downloaded {len(response['media'])} images successfully!")
             else:
@@ -1,2 +1,19 @@
 __version__ = "1.2.5"
 from .main import MetaAI  # noqa
+from .proxy_pool import ProxyPool  # noqa
+from .cache import ResponseCache  # noqa
+from .coalesce import SingleFlight  # noqa
+from .media import MediaDownloader  # noqa
+from .sync import SyncMetaAI  # noqa
+from .deadline import Deadline  # noqa
+from .models import Media, PromptResult, Source  # noqa
+from .operations import OperationRegistry  # noqa
+from .merge import merge_streams, stream_many  # noqa
+from .hooks import Hooks, HookEvent  # noqa
+from .capture import TailCapture  # noqa
+from .offload import LoopWatchdog, Offloader  # noqa
+from .trace import TraceWriter, read_trace  # noqa
+from .trace_reader import TraceReader  # noqa
+from .limiter import AdaptiveLimiter  # noqa
+from .scheduler import Scheduler, TenantQuota  # noqa
+from .state import MemoryStore, RedisStore, SharedState, SQLiteStore, StateStore, open_store  # noqa
@@ -0,0 +1,102 @@
+import argparse
+import sys
+
+import ujson as json
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m meta_ai_api")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run a JSONL batch of prompts with checkpointing.")
+    run.add_argument("input", nargs="?", default="-", help="JSONL input file, or - for stdin.")
+    run.add_argument("-o", "--output", default="results.jsonl", help="JSONL file results are appended to.")
+    run.add_argument("--checkpoint", help="File of finished ids (default: <output>.ckpt).")
+    run.add_argument("-c", "--concurrency", type=int, default=4, help="Number of parallel sessions.")
+    run.add_argument("-p", "--processes", type=int, default=1, help="Worker processes to shard prompts over.")
+    run.add_argument("--max-attempts", type=int, default=3, help="Attempts per item before giving up.")
+    run.add_argument("--min-delay", type=float, default=0.0, help="Minimum seconds between request starts.")
+    run.add_argument("--media-dir", help="Download generated media into this directory.")
+    run.add_argument("--fb-email", help="Facebook email for authenticated sessions.")
+    run.add_argument("--fb-password", help="Facebook password for authenticated sessions.")
+    run.add_argument("--proxy", help="Proxy URL for every session.")
+    run.add_argument(
+        "--state", metavar="URL",
+        help="Share logins and limits through memory://, sqlite:///<path> or redis://<host>:<port>/<db>.",
+    )
+    run.add_argument(
+        "--global-limit", metavar="PROMPTS/SECONDS",
+        help="Prompt requests allowed across every session sharing --state, e.g. 100/60.",
+    )
+    run.add_argument(
+        "--adaptive", choices=("aimd", "gradient"),
+        help="Adapt the number of parallel prompts (up to --concurrency) to latency and errors.",
+    )
+
+    serve = commands.add_parser("serve", help="Run the OpenAI-compatible HTTP gateway.")
+    serve.add_argument("--host", default="127.0.0.1", help="Interface to listen on.")
+    serve.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    serve.add_argument("--identities", type=int, default=4, help="Number of warm MetaAI sessions.")
+    serve.add_argument("--max-waiting", type=int, default=64, help="Queued requests before answering 429.")
+    serve.add_argument("--api-key", help="Require this bearer token from clients.")
+    serve.add_argument("--fb-email", help="Facebook email for authenticated sessions.")
+    serve.add_argument("--fb-password", help="Facebook password for authenticated sessions.")
+    serve.add_argument("--proxy", help="Proxy URL for every session.")
+    serve.add_argument(
+        "--state", metavar="URL",
+        help="Share logins and limits through memory://, sqlite:///<path> or redis://<host>:<port>/<db>.",
+    )
+    serve.add_argument(
+        "--global-limit", metavar="PROMPTS/SECONDS",
+        help="Prompt requests allowed across every session sharing --state, e.g. 100/60.",
+    )
+    serve.add_argument(
+        "--adaptive", choices=("aimd", "gradient"),
+        help="Adapt the number of parallel prompts (up to --identities) to latency and errors.",
+    )
+    serve.add_argument(
+        "--fair", action="store_true",
+        help="Admit requests by X-Priority class and fair share per X-Tenant.",
+    )
+    serve.add_argument(
+        "--quota", action="append", metavar="TENANT=WEIGHT[:CONCURRENCY[:RATE]]",
+        help="Share and limits of a tenant (implies --fair); may be repeated.",
+    )
+
+    trace = commands.add_parser("trace", help="Query binary trace files.")
+    trace.add_argument("paths", nargs="+", help="A trace prefix, or trace files.")
+    trace.add_argument("--conversation", help="Only records of this conversation id.")
+    trace.add_argument("--request", type=int, help="Only records of this request id.")
+    trace.add_argument("--endpoint", help="Only records whose endpoint contains this text.")
+    trace.add_argument("--since", help="Earliest time, as unix seconds or ISO 8601.")
+    trace.add_argument("--until", help="Latest time, as unix seconds or ISO 8601.")
+    trace.add_argument("--stats", action="store_true", help="Print latency stats instead of records.")
+    trace.add_argument("--conversations", action="store_true", help="Print record counts per conversation.")
+    trace.add_argument("--reindex", action="store_true", help="Rebuild the sidecar indexes.")
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "run":
+        from meta_ai_api.batch import run_batch
+
+        stats = run_batch(args)
+        sys.stderr.write(json.dumps(stats) + "\n")
+        return 1 if stats["failed"] else 0
+    if args.command == "serve":
+        from meta_ai_api.gateway import run_gateway
+
+        run_gateway(args)
+        return 0
+    if args.command == "trace":
+        from meta_ai_api.trace_reader import run_trace
+
+        return run_trace(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
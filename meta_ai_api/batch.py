@@ -0,0 +1,459 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import ujson as json
+
+from meta_ai_api.hooks import Hooks
+from meta_ai_api.limiter import AdaptiveLimiter, limiter_from_args
+from meta_ai_api.main import MetaAI
+from meta_ai_api.models import to_plain
+from meta_ai_api.scheduler import Scheduler
+from meta_ai_api.state import state_from_args
+
+logger = logging.getLogger(__name__)
+
+
+def parse_item(line: str, line_number: int) -> Optional[Dict]:
+    """
+    Parses one line of a batch input file.
+
+    A line is either a JSON object with a "prompt" key (and optionally "id",
+    "conversation", "new_conversation" and "download_media"), or a bare JSON string.
+    Items without an explicit id get their line number, which stays stable across
+    restarts. Items sharing a "conversation" key continue the same conversation.
+    Any other line raises ValueError.
+
+    Args:
+        line (str): The raw input line.
+        line_number (int): The 1-based line number.
+
+    Returns:
+        Optional[Dict]: The normalized item, or None for blank lines.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"prompt": item}
+    if not isinstance(item, dict):
+        raise ValueError(f"Line {line_number} is neither a JSON object nor a string")
+    if "prompt" not in item:
+        raise ValueError(f"Line {line_number} has no prompt")
+    item.setdefault("id", str(line_number))
+    item["id"] = str(item["id"])
+    item.setdefault("new_conversation", "conversation" not in item)
+    return item
+
+
+class Throttle:
+    """
+    Spaces out request starts, backing off multiplicatively on errors and easing
+    off again while requests succeed.
+    """
+
+    def __init__(self, min_delay: float = 0.0, max_delay: float = 60.0, backoff: float = 2.0, recovery: float = 0.8):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.recovery = recovery
+        self.delay = min_delay
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_start > now:
+                await asyncio.sleep(self._next_start - now)
+                now = time.monotonic()
+            self._next_start = now + self.delay
+
+    def success(self):
+        self.delay = max(self.min_delay, self.delay * self.recovery)
+        if self.delay < 0.01:
+            self.delay = self.min_delay
+
+    def failure(self):
+        self.delay = min(self.max_delay, max(self.delay * self.backoff, 0.5))
+
+
+def affinity(key: str, buckets: int, salt: str = "") -> int:
+    """
+    Stable bucket for a conversation key, identical across processes and runs.
+
+    Different salts give independent buckets for the same key, so picking a worker
+    process and then a session inside it does not leave sessions idle when the two
+    counts share a factor.
+    """
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8, person=salt.encode("utf-8")).digest()
+    return int.from_bytes(digest, "big") % buckets
+
+
+class PromptExecutor:
+    """
+    Executes prompt items on a fixed set of MetaAI sessions within one event loop.
+
+    Each session has its own queue. Items of the same conversation are always routed
+    to the same session and run in submission order; stateless items go to the least
+    loaded session. Every finished item is handed to the on_result callback.
+    """
+
+    def __init__(
+        self,
+        on_result: Callable[[Dict], None],
+        sessions: int = 4,
+        max_attempts: int = 3,
+        media_directory: Optional[str] = None,
+        client_kwargs: Optional[Dict] = None,
+        throttle: Optional[Throttle] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+        scheduler: Optional[Scheduler] = None,
+        conversations: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            on_result (Callable): Called with the result record of every item.
+            sessions (int): Number of MetaAI sessions working in parallel.
+            max_attempts (int): Attempts per item before it is reported as failed.
+            media_directory (str): Download generated media here when set.
+            client_kwargs (Dict): Keyword arguments for each MetaAI session.
+            throttle (Throttle): Pacing of request starts across all sessions.
+            limiter (AdaptiveLimiter): Adapts how many of the sessions prompt at once.
+            scheduler (Scheduler): Admits every prompt by the item's "tenant" and
+                "priority" (default: the lowest class), e.g. one shared with a Gateway.
+            conversations (Dict): External conversation ids by conversation key to
+                resume, e.g. from the checkpoint of an earlier run.
+        """
+        self.on_result = on_result
+        self.sessions = sessions
+        self.max_attempts = max_attempts
+        self.media_directory = media_directory
+        self.client_kwargs = client_kwargs or {}
+        self.throttle = throttle or Throttle()
+        self.limiter = limiter
+        self.scheduler = scheduler
+        if limiter is not None:
+            # Retries inside prompt() signal throttling long before an item fails
+            self.client_kwargs = {**self.client_kwargs, "hooks": self.client_kwargs.get("hooks") or Hooks()}
+            limiter.attach(self.client_kwargs["hooks"])
+        self.stats = {"succeeded": 0, "failed": 0}
+        # conversation key -> external_conversation_id of its last answer
+        self.conversations: Dict[str, str] = dict(conversations or {})
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._queues = [asyncio.Queue(maxsize=4) for _ in range(self.sessions)]
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def submit(self, item: Dict):
+        """Queues an item, waiting while the chosen session's queue is full."""
+        if "conversation" in item:
+            queue = self._queues[affinity(str(item["conversation"]), self.sessions, salt="session")]
+        else:
+            queue = min(self._queues, key=lambda q: q.qsize())
+        await queue.put(item)
+
+    async def join(self):
+        """Waits for every submitted item and closes the sessions."""
+        try:
+            for queue in self._queues:
+                await queue.put(None)
+            await asyncio.gather(*self._tasks)
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def _worker(self, queue: asyncio.Queue):
+        # The session is created lazily, so a failed login is retried like any error
+        session = {"ai": None}
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                self.on_result(await self.run_item(session, item))
+        finally:
+            if session["ai"] is not None:
+                await session["ai"].close()
+
+    def _admit(self, item: Dict):
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(item.get("tenant"), item.get("priority", self.scheduler.priorities[-1]))
+
+    async def run_item(self, session: Dict, item: Dict) -> Dict:
+        record = {"id": item["id"], "prompt": item["prompt"]}
+        conversation = item.get("conversation")
+        if conversation is not None:
+            record["conversation"] = conversation
+        for attempt in range(1, self.max_attempts + 1):
+            await self.throttle.wait()
+            started = time.monotonic()
+            try:
+                if session["ai"] is None:
+                    ai = MetaAI(**self.client_kwargs)
+                    await ai.initialize()
+                    session["ai"] = ai
+                ai = session["ai"]
+                if conversation is not None:
+                    # Sessions are shared between conversations; resume this one
+                    ai.external_conversation_id = self.conversations.get(str(conversation))
+                result = None
+                async with self._admit(item), self.limiter.slot() if self.limiter is not None else nullcontext():
+                    async for result in ai.prompt(item["prompt"], new_conversation=item["new_conversation"]):
+                        pass
+                    if result is None:
+                        raise Exception("Empty response from Meta AI.")
+                if conversation is not None:
+                    self.conversations[str(conversation)] = ai.external_conversation_id
+                media = result.get("media", [])
+                if media and (self.media_directory or item.get("download_media")):
+                    media = await ai.download_media(media, directory=self.media_directory or "media")
+                self.throttle.success()
+                self.stats["succeeded"] += 1
+                record.pop("error", None)
+                record.update(
+                    message=result.get("message"),
+                    sources=to_plain(result.get("sources", [])),
+                    media=to_plain(media),
+                    uuid=result.get("uuid"),
+                    attempts=attempt,
+                    elapsed=round(time.monotonic() - started, 3),
+                )
+                return record
+            except Exception as e:
+                self.throttle.failure()
+                logger.warning(f"Item {item['id']} failed on attempt {attempt}: {e}")
+                record["error"] = str(e)
+        self.stats["failed"] += 1
+        record["attempts"] = self.max_attempts
+        return record
+
+
+class BatchRunner:
+    """
+    Runs a stream of prompts concurrently through a set of MetaAI sessions.
+
+    Every result is appended to the output JSONL file as soon as it completes, and
+    the ids of finished items are appended to a checkpoint file, so a restarted run
+    skips everything that already succeeded. Items of a conversation are
+    checkpointed with the conversation's external id, so the remaining items of the
+    conversation continue it after a restart. Failed items, and input lines that are
+    not valid items, are written with an "error" key and are not checkpointed, so
+    they are retried on the next run.
+    With processes > 1 the prompts are executed by a ShardedExecutor while this
+    process keeps reading input and writing results.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        checkpoint_path: Optional[str] = None,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        media_directory: Optional[str] = None,
+        client_kwargs: Optional[Dict] = None,
+        throttle: Optional[Throttle] = None,
+        processes: int = 1,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        """
+        Args:
+            output_path (str): JSONL file the results are appended to.
+            checkpoint_path (str): File of finished ids; defaults to "<output>.ckpt".
+            concurrency (int): Number of MetaAI sessions working in parallel (per process).
+            max_attempts (int): Attempts per item before it is written as failed.
+            media_directory (str): Download generated media here when set.
+            client_kwargs (Dict): Keyword arguments for each MetaAI session.
+            throttle (Throttle): Pacing of request starts across all sessions.
+            processes (int): Number of worker processes to shard the prompts over.
+            limiter (AdaptiveLimiter): Adapts how many sessions prompt at once; with
+                processes > 1 every worker adapts its own copy of its settings.
+        """
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path or f"{output_path}.ckpt"
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.media_directory = media_directory
+        self.client_kwargs = client_kwargs or {}
+        self.throttle = throttle or Throttle()
+        self.processes = processes
+        self.limiter = limiter
+        self.completed: Set[str] = set()
+        # conversation key -> external_conversation_id of its last checkpointed answer
+        self.conversations: Dict[str, str] = {}
+        self._load_checkpoint()
+        self.stats = {"succeeded": 0, "failed": 0, "skipped": 0}
+
+    def _load_checkpoint(self):
+        """
+        Reads the checkpoint: one id per line, or a JSON object with the id,
+        conversation key and external conversation id for items of a conversation.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = None
+                if line.startswith("{"):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        pass
+                if not isinstance(entry, dict) or "id" not in entry:
+                    self.completed.add(line)
+                    continue
+                self.completed.add(str(entry["id"]))
+                if entry.get("uuid") is not None:
+                    self.conversations[str(entry["conversation"])] = entry["uuid"]
+
+    @staticmethod
+    def _checkpoint_line(record: Dict) -> str:
+        if "conversation" not in record:
+            return record["id"]
+        return json.dumps(
+            {"id": record["id"], "conversation": str(record["conversation"]), "uuid": record.get("uuid")},
+            ensure_ascii=False,
+        )
+
+    def _create_executor(self, on_result: Callable[[Dict], None]):
+        if self.processes > 1:
+            from meta_ai_api.sharding import ShardedExecutor
+
+            return ShardedExecutor(
+                on_result,
+                processes=self.processes,
+                sessions_per_process=self.concurrency,
+                max_attempts=self.max_attempts,
+                media_directory=self.media_directory,
+                client_kwargs=self.client_kwargs,
+                min_delay=self.throttle.min_delay,
+                limiter=self.limiter,
+                conversations=self.conversations,
+            )
+        return PromptExecutor(
+            on_result,
+            sessions=self.concurrency,
+            max_attempts=self.max_attempts,
+            media_directory=self.media_directory,
+            client_kwargs=self.client_kwargs,
+            throttle=self.throttle,
+            limiter=self.limiter,
+            conversations=self.conversations,
+        )
+
+    async def run(self, lines: Iterable[str]) -> Dict:
+        """
+        Runs every item of the input that has not been completed yet.
+
+        Args:
+            lines (Iterable[str]): Raw JSONL input lines.
+
+        Returns:
+            Dict: Counts of succeeded, failed and skipped items.
+        """
+        started = time.monotonic()
+        with open(self.output_path, "a", encoding="utf-8") as output, open(
+            self.checkpoint_path, "a", encoding="utf-8"
+        ) as checkpoint:
+
+            def write_result(record: Dict):
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                if "error" in record:
+                    self.stats["failed"] += 1
+                else:
+                    self.stats["succeeded"] += 1
+                    checkpoint.write(self._checkpoint_line(record) + "\n")
+                    checkpoint.flush()
+                    self.completed.add(record["id"])
+
+            executor = self._create_executor(write_result)
+            executor.start()
+            try:
+                await self._produce(lines, executor, write_result)
+                await executor.join()
+            finally:
+                executor.cancel()
+        self.stats["elapsed"] = round(time.monotonic() - started, 3)
+        return self.stats
+
+    async def _produce(self, lines: Iterable[str], executor, write_result: Callable[[Dict], None]):
+        iterator = iter(lines)
+        line_number = 0
+        # Results and the checkpoint are keyed by id, so an id runs once per input
+        submitted: Set[str] = set()
+        while True:
+            # Reading may block on stdin, so keep it off the event loop
+            line = await asyncio.to_thread(next, iterator, None)
+            if line is None:
+                return
+            line_number += 1
+            try:
+                item = parse_item(line, line_number)
+            except ValueError as e:
+                logger.error(f"Invalid input line {line_number}: {e}")
+                write_result({"id": str(line_number), "error": f"Invalid input line: {e}", "attempts": 0})
+                continue
+            if item is None:
+                continue
+            if item["id"] in self.completed:
+                self.stats["skipped"] += 1
+                continue
+            if item["id"] in submitted:
+                logger.error(f"Duplicate id {item['id']!r} on line {line_number}")
+                write_result(
+                    {"id": item["id"], "prompt": item["prompt"], "error": "Duplicate id in the input", "attempts": 0}
+                )
+                continue
+            submitted.add(item["id"])
+            await executor.submit(item)
+
+
+def run_batch(args) -> Dict:
+    """Entry point for `python -m meta_ai_api run`."""
+    client_kwargs = {}
+    if args.fb_email is not None:
+        client_kwargs.update(fb_email=args.fb_email, fb_password=args.fb_password)
+    if args.proxy:
+        client_kwargs["proxy"] = args.proxy
+    state = state_from_args(args)
+    if state is not None:
+        client_kwargs["state"] = state
+    runner = BatchRunner(
+        output_path=args.output,
+        checkpoint_path=args.checkpoint,
+        concurrency=args.concurrency,
+        max_attempts=args.max_attempts,
+        media_directory=args.media_dir,
+        client_kwargs=client_kwargs,
+        throttle=Throttle(min_delay=args.min_delay),
+        processes=args.processes,
+        limiter=limiter_from_args(args, args.concurrency),
+    )
+
+    async def run(lines: Iterable[str]) -> Dict:
+        try:
+            return await runner.run(lines)
+        finally:
+            if state is not None:
+                await state.close()
+
+    if args.input == "-":
+        return asyncio.run(run(sys.stdin))
+    with open(args.input, "r", encoding="utf-8") as f:
+        return asyncio.run(run(f))
@@ -0,0 +1,163 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import ujson as json
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    An exact-match cache for stateless (new conversation) prompts.
+
+    Entries are stored serialized, which keeps the memory accounting exact and hands
+    every caller its own copy of the cached result. Eviction is LRU, bounded both by
+    entry count and by total serialized size, and every entry expires after a TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 3600.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        path: Optional[str] = None,
+    ):
+        """
+        Args:
+            max_entries (int): Maximum number of cached results.
+            ttl (float): Seconds an entry stays valid. None disables expiry.
+            max_bytes (int): Upper bound for the total size of the serialized entries.
+            path (str): Optional JSON file the cache is loaded from and persisted to.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path = path
+        # key -> (expires_at wall clock, UTF-8 encoded serialized result)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        """Collapse whitespace and case so trivially different prompts share an entry."""
+        return " ".join(message.split()).casefold()
+
+    def key(self, message: str, mode: str) -> str:
+        return f"{mode}\x00{self.normalize(message)}"
+
+    def get(self, message: str, mode: str) -> Optional[Dict]:
+        """
+        Looks up a cached result.
+
+        Args:
+            message (str): The prompt text.
+            mode (str): The prompt mode (e.g. authenticated or anonymous).
+
+        Returns:
+            Optional[Dict]: A fresh copy of the cached result, or None on a miss.
+        """
+        key = self.key(message, mode)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.time():
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return json.loads(entry[1])
+
+    def set(self, message: str, mode: str, result: Dict):
+        """
+        Stores the result of a prompt.
+
+        Args:
+            message (str): The prompt text.
+            mode (str): The prompt mode (e.g. authenticated or anonymous).
+            result (Dict): The extracted data (message, sources, media, uuid).
+        """
+        serialized = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        if len(serialized) > self.max_bytes:
+            return
+        key = self.key(message, mode)
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (expires_at, serialized)
+        self._bytes += len(serialized)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, serialized = self._entries.pop(key)
+        self._bytes -= len(serialized)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Returns hit/miss metrics and the current size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def save(self, path: Optional[str] = None):
+        """Persist the non-expired entries to disk, least recently used first."""
+        path = path or self.path
+        if not path:
+            return
+        now = time.time()
+        entries = [
+            [key, expires_at, serialized.decode("utf-8")]
+            for key, (expires_at, serialized) in self._entries.items()
+            if expires_at is None or expires_at > now
+        ]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None):
+        """Load entries persisted by save(), skipping the ones that expired meanwhile."""
+        path = path or self.path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to load response cache from {path}: {e}")
+            return
+        now = time.time()
+        for key, expires_at, serialized in entries:
+            if expires_at is not None and expires_at <= now:
+                continue
+            if key in self._entries:
+                self._remove(key)
+            serialized = serialized.encode("utf-8")
+            self._entries[key] = (expires_at, serialized)
+            self._bytes += len(serialized)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
@@ -0,0 +1,155 @@
+import logging
+import time
+import weakref
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List
+
+import ujson as json
+
+from meta_ai_api.exceptions import FacebookRegionBlocked
+from meta_ai_api.hooks import HookEvent, Hooks
+
+logger = logging.getLogger(__name__)
+
+
+class _Buffer:
+    """The bounded raw data and events of one in-flight prompt."""
+
+    __slots__ = ("started", "entries", "size", "dropped", "retries")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.entries: Deque[tuple] = deque()
+        self.size = 0
+        self.dropped = 0
+        self.retries = 0
+
+
+class TailCapture:
+    """
+    Tail-based capture of the raw responses of slow or failed prompts.
+
+    While a prompt runs, its raw response lines, extracted data and hook events are
+    kept in a small per-request buffer instead of the dump files. When the prompt
+    ends, the buffer is appended to `path` as one JSON line if the prompt was slower
+    than latency_threshold, retried, raised, or was region blocked; otherwise it is
+    dropped without any I/O.
+
+    Pass it to MetaAI(capture=...); one capture can be shared by many sessions.
+    """
+
+    def __init__(
+        self,
+        path: str = "meta_ai_tail.jsonl",
+        latency_threshold: float = 10.0,
+        max_entries: int = 256,
+        max_bytes: int = 1024 * 1024,
+    ):
+        """
+        Args:
+            path (str): JSON lines file captured requests are appended to.
+            latency_threshold (float): Seconds after which a prompt counts as slow.
+            max_entries (int): Entries kept per request; the oldest are dropped first.
+            max_bytes (int): Raw bytes kept per request; the oldest are dropped first.
+        """
+        self.path = path
+        self.latency_threshold = latency_threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._buffers: Dict[int, _Buffer] = {}
+        # Hook buses the capture is registered on; sessions often share one
+        self._attached: "weakref.WeakSet[Hooks]" = weakref.WeakSet()
+        self.kept = 0
+        self.discarded = 0
+
+    def attach(self, hooks: Hooks):
+        """Registers the capture on a hook bus; attaching to the same bus again is a no-op."""
+        if hooks in self._attached:
+            return
+        hooks.on("*", self._on_event)
+        self._attached.add(hooks)
+
+    def _buffer(self, request: int) -> _Buffer:
+        buffer = self._buffers.get(request)
+        if buffer is None:
+            buffer = self._buffers[request] = _Buffer(time.monotonic())
+        return buffer
+
+    def add(self, request: int, endpoint: str, data):
+        """Buffers raw data for a request; older entries make room when a bound is hit."""
+        buffer = self._buffer(request)
+        size = self._size(data)
+        buffer.entries.append((time.monotonic() - buffer.started, endpoint, data, size))
+        buffer.size += size
+        while buffer.entries and (len(buffer.entries) > self.max_entries or buffer.size > self.max_bytes):
+            buffer.size -= buffer.entries.popleft()[3]
+            buffer.dropped += 1
+
+    @staticmethod
+    def _size(data) -> int:
+        """Bytes an entry counts towards max_bytes; decoded payloads by their JSON length."""
+        if isinstance(data, (str, bytes, bytearray)):
+            return len(data)
+        try:
+            return len(json.dumps(data, ensure_ascii=False))
+        except (TypeError, OverflowError):
+            return len(repr(data))
+
+    def _on_event(self, event: HookEvent):
+        if event.request is None:
+            return
+        buffer = self._buffer(event.request)
+        if event.name == "retry":
+            buffer.retries += 1
+        if event.name == "chunk":
+            # The raw line itself is buffered through add()
+            return
+        data = {key: repr(value) if key == "error" else value for key, value in event.data.items()}
+        self.add(event.request, f"event:{event.name}", data)
+        if event.name in ("done", "error"):
+            self._finish(event, buffer)
+
+    def _finish(self, event: HookEvent, buffer: _Buffer):
+        del self._buffers[event.request]
+        elapsed = event.data.get("elapsed", event.time - buffer.started)
+        error = event.data.get("error")
+        reasons: List[str] = []
+        if elapsed >= self.latency_threshold:
+            reasons.append("slow")
+        if buffer.retries:
+            reasons.append("retried")
+        if isinstance(error, FacebookRegionBlocked):
+            reasons.append("region_blocked")
+        elif error is not None:
+            reasons.append("error")
+        if not reasons:
+            self.discarded += 1
+            return
+
+        self.kept += 1
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "request": event.request,
+            "reasons": reasons,
+            "elapsed": elapsed,
+            "retries": buffer.retries,
+            "error": repr(error) if error is not None else None,
+            "dropped": buffer.dropped,
+            "entries": [
+                {
+                    "offset": offset,
+                    "endpoint": endpoint,
+                    "data": data.decode("utf-8", errors="replace") if isinstance(data, (bytes, bytearray)) else data,
+                }
+                for offset, endpoint, data, _ in buffer.entries
+            ],
+        }
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except (OSError, TypeError, OverflowError) as e:
+            logger.warning(f"Unable to write tail capture for request {event.request}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._buffers), "kept": self.kept, "discarded": self.discarded}
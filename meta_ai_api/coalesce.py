@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """A single upstream call and the chunks it has produced so far."""
+
+    def __init__(self):
+        self.chunks: List = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls onto one upstream async generator.
+
+    The first caller for a key starts the upstream call in a background task; every
+    caller for the same key, including ones that join late, receives all chunks in
+    order as they arrive. The upstream call is cancelled only when every subscriber
+    has gone away. Chunks are shared between subscribers, not copied.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator]):
+        """
+        Subscribes to the flight for a key, starting it if needed.
+
+        Args:
+            key (Hashable): Identifies calls that may share a result.
+            factory (Callable): Returns the upstream async iterator; only called by the leader.
+
+        Yields:
+            The chunks produced by the upstream iterator.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"Coalescing onto in-flight call for {key!r}")
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: flight.done or len(flight.chunks) > index)
+                while index < len(flight.chunks):
+                    chunk = flight.chunks[index]
+                    index += 1
+                    yield chunk
+                if flight.done and index >= len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    async def _run(self, key: Hashable, flight: _Flight, factory: Callable[[], AsyncIterator]):
+        try:
+            async for chunk in factory():
+                async with flight.changed:
+                    flight.chunks.append(chunk)
+                    flight.changed.notify_all()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            # New callers from here on start a fresh flight
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done = True
+            async with flight.changed:
+                flight.changed.notify_all()
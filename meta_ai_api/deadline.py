@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from meta_ai_api.exceptions import MetaAITimeout
+
+
+class Deadline:
+    """
+    Time budget for a single prompt() call, retries included.
+
+    Each limit is optional and in seconds:
+        connect: establishing the connection to Meta AI.
+        first_byte: from sending the request until the first response line arrives.
+        idle: the longest gap allowed between two streamed lines.
+        total: the whole call, including retries and back-off sleeps.
+
+    A Deadline is started when prompt() begins; every phase limit is additionally
+    capped by what is left of the total budget.
+    """
+
+    def __init__(
+        self,
+        connect: Optional[float] = None,
+        first_byte: Optional[float] = None,
+        idle: Optional[float] = None,
+        total: Optional[float] = None,
+    ):
+        self.connect = connect
+        self.first_byte = first_byte
+        self.idle = idle
+        self.total = total
+        self.started: Optional[float] = None
+
+    def start(self) -> "Deadline":
+        """Returns a started copy, so one Deadline can serve as a default for many calls."""
+        started = Deadline(self.connect, self.first_byte, self.idle, self.total)
+        started.started = time.monotonic()
+        return started
+
+    def remaining(self) -> Optional[float]:
+        if self.total is None:
+            return None
+        return self.total - (time.monotonic() - self.started)
+
+    def limit(self, phase_limit: Optional[float]) -> Optional[float]:
+        """The effective limit for a phase: its own limit capped by the remaining total."""
+        remaining = self.remaining()
+        if remaining is None:
+            return phase_limit
+        if remaining <= 0:
+            raise MetaAITimeout("total", self.total)
+        return remaining if phase_limit is None else min(phase_limit, remaining)
+
+    def httpx_timeout(self, default: float = 30.0) -> httpx.Timeout:
+        """
+        Socket-level timeouts for a request made under this deadline.
+
+        The read timeout also bounds the wait for the response headers, so it is only a
+        backstop no shorter than first_byte or idle; both are enforced by run() and lines().
+        """
+        return httpx.Timeout(
+            default,
+            connect=self.connect if self.connect is not None else default,
+            read=max(limit for limit in (default, self.first_byte, self.idle) if limit is not None),
+        )
+
+    async def run(self, phase: str, awaitable, phase_limit: Optional[float] = None):
+        """Awaits something within a phase limit, raising MetaAITimeout when it expires."""
+        limit = self.limit(phase_limit)
+        if limit is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, limit)
+        except asyncio.TimeoutError:
+            if phase_limit is None or (self.remaining() is not None and self.remaining() <= 0):
+                raise MetaAITimeout("total", self.total)
+            raise MetaAITimeout(phase, phase_limit)
+
+    async def sleep(self, seconds: float):
+        """Back-off sleep that never outlasts the total budget."""
+        remaining = self.remaining()
+        if remaining is not None and remaining <= seconds:
+            raise MetaAITimeout("total", self.total)
+        await asyncio.sleep(seconds)
+
+    async def lines(self, lines: AsyncIterator[str]):
+        """Yields lines (or body chunks), enforcing the idle limit between them."""
+        while True:
+            try:
+                line = await self.run("idle", lines.__anext__(), self.idle)
+            except StopAsyncIteration:
+                return
+            yield line
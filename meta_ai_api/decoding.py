@@ -0,0 +1,210 @@
+import abc
+import logging
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import ujson as json
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+
+class LineDecoder(abc.ABC):
+    """
+    Decodes one line of a Meta AI stream into the nested dict shape the rest of the
+    client walks (data.node.bot_response_message...).
+
+    Decoders raise ValueError for lines that are not valid JSON. A decoder that only
+    materializes part of the payload sets complete = False, so callers know to keep
+    the raw line when they need the full content (e.g. for dumps).
+    """
+
+    name = "base"
+    complete = True
+
+    @abc.abstractmethod
+    def decode(self, line: Union[str, bytes]) -> Dict:
+        pass
+
+
+class UjsonDecoder(LineDecoder):
+    """Full decode with ujson; the original path and the universal fallback."""
+
+    name = "ujson"
+    complete = True
+
+    def decode(self, line: Union[str, bytes]) -> Dict:
+        return json.loads(line)
+
+
+if msgspec is not None:
+
+    class _Text(msgspec.Struct, omit_defaults=True):
+        text: str
+
+    class _ComposedText(msgspec.Struct, omit_defaults=True):
+        content: List[_Text] = []
+
+    class _ImagineMedia(msgspec.Struct, omit_defaults=True):
+        uri: Optional[str] = None
+        media_type: Optional[str] = None
+        prompt: Optional[str] = None
+
+    class _MediaSet(msgspec.Struct, omit_defaults=True):
+        imagine_media: List[_ImagineMedia] = []
+
+    class _ImagineSession(msgspec.Struct, omit_defaults=True):
+        media_sets: List[_MediaSet] = []
+
+    class _ImagineCard(msgspec.Struct, omit_defaults=True):
+        session: Optional[_ImagineSession] = None
+
+    class _BotResponseMessage(msgspec.Struct, omit_defaults=True):
+        id: Optional[str] = None
+        streaming_state: Optional[str] = None
+        composed_text: Optional[_ComposedText] = None
+        fetch_id: Optional[str] = None
+        imagine_card: Optional[_ImagineCard] = None
+
+    class _Node(msgspec.Struct, omit_defaults=True):
+        bot_response_message: Optional[_BotResponseMessage] = None
+
+    class _Data(msgspec.Struct, omit_defaults=True):
+        node: Optional[_Node] = None
+
+    class _StreamLine(msgspec.Struct, omit_defaults=True):
+        data: Optional[_Data] = None
+        errors: Optional[List[Any]] = None
+
+
+class MsgspecDecoder(LineDecoder):
+    """
+    Schema-driven decode with msgspec: only the fields the client reads are
+    materialized, everything else is skipped while parsing. Lines that do not fit
+    the schema are handed to the fallback decoder.
+
+    Requires `pip install msgspec`.
+    """
+
+    name = "msgspec"
+    complete = False
+
+    def __init__(self, fallback: Optional[LineDecoder] = None):
+        if msgspec is None:
+            raise ImportError("MsgspecDecoder requires msgspec: pip install msgspec")
+        self._decoder = msgspec.json.Decoder(_StreamLine)
+        self.fallback = fallback or UjsonDecoder()
+
+    def decode(self, line: Union[str, bytes]) -> Dict:
+        try:
+            return msgspec.to_builtins(self._decoder.decode(line))
+        except msgspec.ValidationError:
+            return self.fallback.decode(line)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+
+DECODERS = {
+    "ujson": UjsonDecoder,
+    "msgspec": MsgspecDecoder,
+}
+
+
+def _sample_line(chunks: int = 200) -> bytes:
+    """A realistic late stream line: long cumulative text plus unrelated metadata."""
+    return json.dumps({
+        "data": {
+            "node": {
+                "bot_response_message": {
+                    "id": "1234_5678_0",
+                    "streaming_state": "STREAMING",
+                    "composed_text": {"content": [{"text": "lorem ipsum dolor sit amet " * chunks}]},
+                    "fetch_id": None,
+                    "imagine_card": None,
+                    "tracking": {f"key_{i}": {"value": i, "tags": ["a", "b"]} for i in range(50)},
+                },
+                "__typename": "XFBAbraMessage",
+            }
+        },
+        "extensions": {"is_final": False, "server_metadata": list(range(100))},
+    }).encode("utf-8")
+
+
+def _needed_fields(decoded: Dict) -> tuple:
+    message = decoded.get("data", {}).get("node", {}).get("bot_response_message", {})
+    return (
+        message.get("id"),
+        message.get("streaming_state"),
+        [c["text"] for c in message.get("composed_text", {}).get("content", [])],
+        message.get("fetch_id"),
+    )
+
+
+def benchmark(decoders: Optional[List[LineDecoder]] = None, rounds: int = 200) -> Dict[str, float]:
+    """
+    Times each decoder on a sample stream line.
+
+    Decoders that are unavailable or disagree with the full decode are left out.
+
+    Returns:
+        Dict[str, float]: Seconds per decoded line, by decoder name.
+    """
+    if decoders is None:
+        decoders = []
+        for cls in DECODERS.values():
+            try:
+                decoders.append(cls())
+            except ImportError:
+                continue
+    line = _sample_line()
+    expected = _needed_fields(UjsonDecoder().decode(line))
+    timings = {}
+    for decoder in decoders:
+        if _needed_fields(decoder.decode(line)) != expected:
+            logger.warning(f"Decoder {decoder.name} disagrees with the full decode; skipping it")
+            continue
+        started = time.perf_counter()
+        for _ in range(rounds):
+            decoder.decode(line)
+        timings[decoder.name] = (time.perf_counter() - started) / rounds
+    return timings
+
+
+_selected: Optional[LineDecoder] = None
+
+
+def get_decoder(decoder: Union[str, LineDecoder, None] = "auto", complete: bool = False) -> LineDecoder:
+    """
+    Resolves a decoder.
+
+    Args:
+        decoder: A LineDecoder instance, a name from DECODERS, or "auto" to use the
+            fastest available backend as measured once per process by benchmark().
+        complete (bool): The decoded lines must hold the whole payload (e.g. to keep
+            raw payloads); a partial decoder is replaced with UjsonDecoder.
+
+    Returns:
+        LineDecoder: The decoder to use.
+    """
+    global _selected
+    auto = decoder in (None, "auto")
+    if isinstance(decoder, LineDecoder):
+        resolved = decoder
+    elif auto:
+        if _selected is None:
+            timings = benchmark()
+            name = min(timings, key=timings.get)
+            _selected = DECODERS[name]()
+            logger.debug(f"Selected {name} stream decoder: {timings}")
+        resolved = _selected
+    else:
+        resolved = DECODERS[decoder]()
+    if complete and not resolved.complete:
+        if not auto:
+            logger.warning(f"The {resolved.name} decoder drops fields; using ujson to keep the full payloads")
+        return UjsonDecoder()
+    return resolved
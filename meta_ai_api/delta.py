@@ -0,0 +1,205 @@
+import base64
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Union
+
+# Endpoints whose data is a cumulative stream snapshot
+SNAPSHOT_ENDPOINTS = (
+    "prompt (stream - first line)",
+    "stream_response",
+    "prompt (non-stream - line ",
+    "extract_last_response (FINAL)",
+)
+# The first line of a prompt always starts a new chain of deltas
+KEYFRAME_ENDPOINTS = ("prompt (stream - first line)", "prompt (non-stream - line 1)")
+# Tags bytes in the JSON form of snapshots, since JSON has no bytes type
+BYTES_MARKER = "$bytes"
+
+
+def is_snapshot(endpoint: str) -> bool:
+    return endpoint.startswith(SNAPSHOT_ENDPOINTS)
+
+
+def is_keyframe(endpoint: str) -> bool:
+    return endpoint in KEYFRAME_ENDPOINTS
+
+
+def _common_prefix(previous: Union[str, bytes], current: Union[str, bytes]) -> int:
+    # Stream snapshots mostly share a long prefix; compare in halving steps first
+    low, high = 0, min(len(previous), len(current))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if previous[:middle] == current[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _splice(previous: Union[str, bytes], current: Union[str, bytes]) -> list:
+    """[prefix length, suffix length, middle] turning previous into current."""
+    prefix = _common_prefix(previous, current)
+    limit = min(len(previous), len(current)) - prefix
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if previous[len(previous) - middle:] == current[len(current) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return [prefix, low, current[prefix:len(current) - low]]
+
+
+def diff(previous: Any, current: Any) -> Optional[Dict]:
+    """
+    Structural delta turning previous into current, or None when they are equal.
+
+    Dicts are diffed per key (keeping key order), lists per index plus appended
+    items, and strings or bytes as a splice of their common prefix and suffix, which
+    makes a growing stream snapshot cost about as much as the text it adds.
+    """
+    if isinstance(previous, dict) and isinstance(current, dict):
+        changes: Dict[str, Any] = {}
+        removed = [key for key in previous if key not in current]
+        for key, value in current.items():
+            if key not in previous:
+                changes[key] = {"=": value}
+            else:
+                change = diff(previous[key], value)
+                if change is not None:
+                    changes[key] = change
+        delta: Dict[str, Any] = {"d": changes}
+        if removed:
+            delta["-"] = removed
+        # Dict equality ignores key order, so an order change is recorded separately
+        expected = [key for key in previous if key in current]
+        expected += [key for key in current if key not in previous]
+        if expected != list(current):
+            delta["o"] = list(current)
+        if len(delta) == 1 and not changes:
+            return None
+        return delta
+    if isinstance(previous, list) and isinstance(current, list):
+        shared = min(len(previous), len(current))
+        changes = {}
+        for i in range(shared):
+            change = diff(previous[i], current[i])
+            if change is not None:
+                changes[str(i)] = change
+        if not changes and len(previous) == len(current):
+            return None
+        return {"l": changes, "+": current[shared:], "n": len(current)}
+    if type(previous) is type(current) and previous == current:
+        return None
+    if isinstance(previous, (str, bytes)) and type(previous) is type(current):
+        return {"s": _splice(previous, current)}
+    return {"=": current}
+
+
+def patch(previous: Any, delta: Optional[Dict]) -> Any:
+    """Applies a delta from diff() and returns the reconstructed value."""
+    if delta is None:
+        return previous
+    if "=" in delta:
+        return delta["="]
+    if "d" in delta:
+        removed = set(delta.get("-", ()))
+        changes = delta["d"]
+        result = {}
+        for key, value in previous.items():
+            if key in removed:
+                continue
+            result[key] = patch(value, changes[key]) if key in changes else value
+        for key, change in changes.items():
+            if key not in result:
+                result[key] = patch(None, change)
+        if "o" in delta:
+            result = {key: result[key] for key in delta["o"]}
+        return result
+    if "l" in delta:
+        result = list(previous[:delta["n"]])
+        for index, change in delta["l"].items():
+            result[int(index)] = patch(result[int(index)], change)
+        result.extend(delta["+"])
+        return result
+    if "s" in delta:
+        prefix, suffix, middle = delta["s"]
+        return previous[:prefix] + middle + previous[len(previous) - suffix:]
+    raise ValueError(f"Unknown delta: {delta!r}")
+
+
+def to_json_safe(value: Any) -> Any:
+    """
+    Returns a snapshot or delta with every bytes value replaced by
+    {BYTES_MARKER: base64}, so text formats (JSON dumps and traces) keep the type.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return {BYTES_MARKER: base64.b64encode(value).decode("ascii")}
+    if isinstance(value, dict):
+        return {key: to_json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_json_safe(item) for item in value]
+    return value
+
+
+def from_json_safe(value: Any) -> Any:
+    """Reverses to_json_safe()."""
+    if isinstance(value, dict):
+        if len(value) == 1 and BYTES_MARKER in value:
+            return base64.b64decode(value[BYTES_MARKER])
+        return {key: from_json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_json_safe(item) for item in value]
+    return value
+
+
+class SnapshotEncoder:
+    """
+    Delta-encodes successive stream snapshots, per stream.
+
+    The first snapshot of a stream (and every keyframe_interval-th one, if set) is
+    kept in full; later ones only as a diff() against the one before. A bounded
+    number of streams is tracked; the least recently used one is forgotten first and
+    simply restarts with a full snapshot.
+    """
+
+    def __init__(self, keyframe_interval: int = 0, max_streams: int = 1024):
+        self.keyframe_interval = keyframe_interval
+        self.max_streams = max_streams
+        self._previous: "OrderedDict[Hashable, list]" = OrderedDict()
+
+    def encode(self, stream: Hashable, value: Any, keyframe: bool = False) -> Dict:
+        """
+        Returns {"full": value} or {"delta": ...} for the next snapshot of a stream.
+        """
+        state = self._previous.get(stream)
+        if state is None or keyframe or (self.keyframe_interval and state[1] >= self.keyframe_interval):
+            encoded = {"full": value}
+            state = [value, 0]
+        else:
+            encoded = {"delta": diff(state[0], value)}
+            state = [value, state[1] + 1]
+        self._previous[stream] = state
+        self._previous.move_to_end(stream)
+        while len(self._previous) > self.max_streams:
+            self._previous.popitem(last=False)
+        return encoded
+
+    def reset(self):
+        self._previous.clear()
+
+
+class SnapshotDecoder:
+    """Reconstructs the original snapshots from SnapshotEncoder output, per stream."""
+
+    def __init__(self):
+        self._previous: Dict[Hashable, Any] = {}
+
+    def decode(self, stream: Hashable, encoded: Dict) -> Any:
+        if "full" in encoded:
+            value = encoded["full"]
+        else:
+            if stream not in self._previous:
+                raise ValueError(f"Delta without a preceding full snapshot for stream {stream!r}")
+            value = patch(self._previous[stream], encoded["delta"])
+        self._previous[stream] = value
+        return value
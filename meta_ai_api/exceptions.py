@@ -4,3 +4,16 @@ class FacebookInvalidCredentialsException(Exception):
 
 class FacebookRegionBlocked(Exception):
     pass
+
+
+class MetaAITimeout(TimeoutError):
+    """Raised when a prompt exceeds one of the limits of its Deadline."""
+
+    def __init__(self, phase: str, limit: float):
+        super().__init__(f"Meta AI {phase} timeout after {limit:.2f}s")
+        self.phase = phase
+        self.limit = limit
+
+
+class SchedulerRejected(Exception):
+    """Raised when a tenant's scheduler queue is full."""
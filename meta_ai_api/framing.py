@@ -0,0 +1,90 @@
+import logging
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+class NDJSONFramer:
+    """
+    Frames newline-delimited JSON straight from a byte stream.
+
+    Lines are returned as bytes, ready for a JSON decoder that accepts bytes, so the
+    stream is never decoded to str. Partial lines are carried over in one reusable
+    buffer; lines that complete inside a chunk are sliced out of it directly.
+    Lines longer than max_line_bytes are dropped (or raise LineTooLong) without
+    buffering the rest of them.
+    """
+
+    def __init__(self, max_line_bytes: int = 16 * 1024 * 1024, raise_on_oversize: bool = False):
+        """
+        Args:
+            max_line_bytes (int): Longest line that is buffered and returned.
+            raise_on_oversize (bool): Raise LineTooLong instead of skipping oversized lines.
+        """
+        self.max_line_bytes = max_line_bytes
+        self.raise_on_oversize = raise_on_oversize
+        self.lines = 0
+        self.oversized = 0
+        self.bytes = 0
+
+    def _oversize(self, size: int):
+        self.oversized += 1
+        if self.raise_on_oversize:
+            raise LineTooLong(f"Stream line exceeds {self.max_line_bytes} bytes")
+        logger.warning(f"Skipping stream line of at least {size} bytes (limit {self.max_line_bytes})")
+
+    async def frames(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Yields every non-empty line of the byte stream, without its line ending.
+
+        Args:
+            chunks: Async iterator of raw byte chunks, e.g. response.aiter_bytes().
+        """
+        buffer = bytearray()
+        discarding = False
+        async for chunk in chunks:
+            self.bytes += len(chunk)
+            start = 0
+            end = chunk.find(b"\n")
+            if discarding:
+                # Still inside an oversized line; skip to its end
+                if end == -1:
+                    continue
+                discarding = False
+                start = end + 1
+                end = chunk.find(b"\n", start)
+
+            while end != -1:
+                if buffer:
+                    buffer += chunk[start:end]
+                    line = bytes(buffer)
+                    buffer.clear()
+                else:
+                    line = chunk[start:end]
+                if line.endswith(b"\r"):
+                    line = line[:-1]
+                if len(line) > self.max_line_bytes:
+                    self._oversize(len(line))
+                elif line:
+                    self.lines += 1
+                    yield line
+                start = end + 1
+                end = chunk.find(b"\n", start)
+
+            if start < len(chunk):
+                if len(buffer) + len(chunk) - start > self.max_line_bytes:
+                    self._oversize(len(buffer) + len(chunk) - start)
+                    buffer.clear()
+                    discarding = True
+                else:
+                    buffer += chunk[start:]
+
+        if buffer and not discarding:
+            line = bytes(buffer).rstrip(b"\r")
+            if line:
+                self.lines += 1
+                yield line
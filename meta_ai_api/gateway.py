@@ -0,0 +1,521 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import ujson as json
+
+from meta_ai_api.exceptions import SchedulerRejected
+from meta_ai_api.hooks import Hooks
+from meta_ai_api.limiter import AdaptiveLimiter, Permit, limiter_from_args
+from meta_ai_api.main import MetaAI
+from meta_ai_api.models import to_plain
+from meta_ai_api.scheduler import Scheduler, parse_quota
+from meta_ai_api.state import SharedState, state_from_args
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "meta-ai"
+MAX_BODY_BYTES = 1024 * 1024
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class IdentityPool:
+    """
+    A fixed set of warm MetaAI sessions shared by all gateway clients.
+
+    A conversation only exists for the identity that started it, so requests that
+    continue a conversation wait for that specific session; everything else takes
+    the first free one. The number of waiting requests is bounded, and callers over
+    the bound are rejected immediately instead of queueing without limit. With a
+    limiter, only as many sessions as it currently allows prompt at once.
+
+    With a SharedState, session i uses the identity "gateway-<i>" on every node, so
+    nodes share its cookies and token, and a conversation started on one node can
+    continue on the same identity on any other.
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        max_waiting: int = 64,
+        client_kwargs: Optional[Dict] = None,
+        max_conversations: int = 100_000,
+        limiter: Optional[AdaptiveLimiter] = None,
+        state: Optional[SharedState] = None,
+    ):
+        self.size = size
+        self.max_waiting = max_waiting
+        self.client_kwargs = client_kwargs or {}
+        self.limiter = limiter
+        if limiter is not None:
+            # Retries inside prompt() signal throttling before a request fails
+            self.client_kwargs = {**self.client_kwargs, "hooks": self.client_kwargs.get("hooks") or Hooks()}
+            limiter.attach(self.client_kwargs["hooks"])
+        self._permits: Dict[int, Permit] = {}
+        self.state = state
+        if state is not None:
+            self.client_kwargs = {**self.client_kwargs, "state": self.client_kwargs.get("state") or state}
+        self.identities = [f"gateway-{index}" for index in range(size)]
+        self.sessions: List[MetaAI] = []
+        self._free: set = set()
+        self._changed = asyncio.Condition()
+        self.waiting = 0
+        # conversation id -> index of the session that owns it, oldest first
+        self.conversations: "OrderedDict[str, int]" = OrderedDict()
+        self.max_conversations = max_conversations
+
+    async def start(self):
+        """Initializes every session concurrently."""
+        if self.state is not None:
+            self.sessions = [MetaAI(**{**self.client_kwargs, "identity": identity}) for identity in self.identities]
+        else:
+            self.sessions = [MetaAI(**self.client_kwargs) for _ in range(self.size)]
+        await asyncio.gather(*(ai.initialize() for ai in self.sessions))
+        self._free = set(range(self.size))
+
+    async def close(self):
+        await asyncio.gather(*(ai.close() for ai in self.sessions))
+
+    async def acquire(self, conversation_id: Optional[str] = None) -> int:
+        """
+        Waits for a session and marks it busy.
+
+        Args:
+            conversation_id (str): Continue this conversation on the session that owns it.
+
+        Returns:
+            int: The index of the acquired session.
+        """
+        preferred = self.conversations.get(conversation_id) if conversation_id else None
+        if conversation_id and preferred is None and self.state is not None:
+            # Possibly started on another node
+            owner = await self.state.conversation_owner(conversation_id)
+            if owner in self.identities:
+                preferred = self.identities.index(owner)
+        if conversation_id and preferred is None:
+            raise HTTPError(404, f"Unknown conversation_id: {conversation_id}")
+        if self.waiting >= self.max_waiting:
+            raise HTTPError(429, "Gateway is at capacity, retry later.", {"retry-after": "1"})
+
+        self.waiting += 1
+        permit = None
+        try:
+            if self.limiter is not None:
+                permit = await self.limiter.acquire()
+            async with self._changed:
+                if preferred is not None:
+                    await self._changed.wait_for(lambda: preferred in self._free)
+                    index = preferred
+                else:
+                    await self._changed.wait_for(lambda: bool(self._free))
+                    index = min(self._free)
+                self._free.discard(index)
+            if permit is not None:
+                # Only the upstream call counts towards the latency the limiter sees
+                permit.started = time.monotonic()
+                self._permits[index] = permit
+                permit = None
+            return index
+        finally:
+            if permit is not None:
+                self.limiter.release(permit, sample=False)
+            self.waiting -= 1
+
+    async def remember(self, conversation_id: str, index: int):
+        """Pins a conversation to the session that answered it."""
+        self.conversations[conversation_id] = index
+        self.conversations.move_to_end(conversation_id)
+        while len(self.conversations) > self.max_conversations:
+            self.conversations.popitem(last=False)
+        if self.state is not None:
+            await self.state.remember_conversation(conversation_id, self.identities[index])
+
+    async def release(self, index: int, outcome: Optional[bool] = True):
+        """
+        Marks a session free again.
+
+        Args:
+            index (int): From acquire().
+            outcome (bool): True for an answered prompt, False for an upstream
+                failure, None when the client went away; reported to the limiter.
+        """
+        permit = self._permits.pop(index, None)
+        if permit is not None:
+            permit.error = outcome is False
+            self.limiter.release(permit, sample=outcome is not None)
+        async with self._changed:
+            self._free.add(index)
+            self._changed.notify_all()
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": self.size,
+            "busy": self.size - len(self._free),
+            "waiting": self.waiting,
+            "conversations": len(self.conversations),
+            **({"limiter": self.limiter.stats()} if self.limiter is not None else {}),
+            **({"state": self.state.stats()} if self.state is not None else {}),
+        }
+
+
+def _prompt_from_messages(messages: List[Dict]) -> str:
+    """The text of the last user message; content may be a string or a list of parts."""
+    if not isinstance(messages, list) or not all(isinstance(message, dict) for message in messages):
+        raise HTTPError(400, "messages must be a list of message objects.")
+    for message in reversed(messages):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, list):
+            content = "".join(
+                part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text"
+            )
+        if isinstance(content, str) and content:
+            return content
+    raise HTTPError(400, "messages must contain a user message with text content.")
+
+
+class Gateway:
+    """
+    An OpenAI-compatible HTTP gateway in front of a pool of warm MetaAI sessions.
+
+    POST /v1/chat/completions accepts the usual {"messages": [...], "stream": bool}
+    body and answers with chat.completion objects, or with chat.completion.chunk
+    Server-Sent Events when streaming. Meta AI keeps the conversation history on its
+    side, so only the last user message is sent upstream; a response carries a
+    "conversation_id" that clients pass back (in the body or the X-Conversation-Id
+    header) to continue that conversation. Requests without one start a new
+    conversation.
+
+    Streamed deltas are what each cumulative Meta AI chunk adds to the text sent so
+    far. Deltas cannot take text back, so when Meta AI revises text the client
+    already has, chunks are held back until the text extends what was sent again;
+    if the final answer never does, the closing chunk carries it whole as
+    "revised_content".
+
+    With a Scheduler, requests are admitted by priority class and tenant: the
+    X-Priority header (or "priority" in the body) picks the class, the X-Tenant
+    header (or the OpenAI "user" field) the tenant, so batch clients cannot starve
+    interactive ones.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        identities: int = 4,
+        max_waiting: int = 64,
+        api_key: Optional[str] = None,
+        client_kwargs: Optional[Dict] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+        scheduler: Optional[Scheduler] = None,
+        state: Optional[SharedState] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.pool = IdentityPool(identities, max_waiting, client_kwargs, limiter=limiter, state=state)
+        self.state = state
+        self.scheduler = scheduler
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        await self.pool.start()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"Gateway listening on http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            await self.pool.close()
+            if self.state is not None:
+                await self.state.close()
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.pool.close()
+        if self.state is not None:
+            await self.state.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict, bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length.")
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length.")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    keep_alive = await self._dispatch(writer, method, path, headers, body) and keep_alive
+                except HTTPError as e:
+                    await self._send_error(writer, e)
+                    keep_alive = keep_alive and e.status not in (400, 413)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception:
+            logger.exception("Gateway connection failed")
+        finally:
+            writer.close()
+
+    async def _dispatch(self, writer, method: str, path: str, headers: Dict, body: bytes) -> bool:
+        """Handles one request; returns False when the connection must be closed."""
+        if self.api_key and headers.get("authorization") != f"Bearer {self.api_key}":
+            raise HTTPError(401, "Invalid API key.")
+        if path == "/health":
+            health = {"status": "ok", **self.pool.stats()}
+            if self.scheduler is not None:
+                health["scheduler"] = self.scheduler.stats()
+            await self._send_json(writer, 200, health)
+            return True
+        if path == "/v1/models":
+            await self._send_json(writer, 200, {
+                "object": "list",
+                "data": [{"id": MODEL_NAME, "object": "model", "owned_by": "meta"}],
+            })
+            return True
+        if path != "/v1/chat/completions":
+            raise HTTPError(404, f"No route for {path}")
+        if method != "POST":
+            raise HTTPError(405, "Use POST.")
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON.")
+        if not isinstance(request, dict):
+            raise HTTPError(400, "Body must be a JSON object.")
+        message = _prompt_from_messages(request.get("messages") or [])
+        conversation_id = request.get("conversation_id") or headers.get("x-conversation-id")
+        stream = bool(request.get("stream"))
+        if self.scheduler is None:
+            return await self._complete(writer, message, conversation_id, stream)
+
+        tenant = headers.get("x-tenant") or request.get("user")
+        priority = headers.get("x-priority") or request.get("priority")
+        try:
+            ticket = await self.scheduler.acquire(tenant, priority)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        except SchedulerRejected as e:
+            raise HTTPError(429, str(e), {"retry-after": "1"})
+        try:
+            return await self._complete(writer, message, conversation_id, stream)
+        finally:
+            self.scheduler.release(ticket)
+
+    async def _complete(self, writer, message: str, conversation_id: Optional[str], stream: bool) -> bool:
+        """Answers a prompt from a pooled session; returns False when the connection must be closed."""
+        index = await self.pool.acquire(conversation_id)
+        outcome = None
+        try:
+            ai = self.pool.sessions[index]
+            if conversation_id:
+                ai.external_conversation_id = conversation_id
+            results = ai.prompt(message, stream=stream, new_conversation=not conversation_id)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            if stream:
+                outcome = await self._stream_completion(writer, completion_id, results, index)
+                return False
+            final = None
+            try:
+                async for result in results:
+                    final = result
+            except Exception as e:
+                outcome = False
+                raise HTTPError(502, f"Upstream error: {e}")
+            if final is None:
+                outcome = False
+                raise HTTPError(502, "Empty response from Meta AI.")
+            outcome = True
+            await self.pool.remember(final["uuid"], index)
+            await self._send_json(writer, 200, self._completion(completion_id, final))
+            return True
+        finally:
+            await self.pool.release(index, outcome)
+
+    def _completion(self, completion_id: str, result: Dict) -> Dict:
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": MODEL_NAME,
+            "conversation_id": result.get("uuid"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": result.get("message", "")},
+                "finish_reason": "stop",
+            }],
+            "sources": to_plain(result.get("sources", [])),
+            "media": to_plain(result.get("media", [])),
+        }
+
+    def _chunk(self, completion_id: str, delta: Dict, finish_reason: Optional[str] = None, **extra) -> bytes:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": MODEL_NAME,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n"
+
+    async def _stream_completion(self, writer, completion_id: str, results, index: int) -> bool:
+        """Streams a completion as Server-Sent Events; returns whether upstream answered."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"content-type: text/event-stream\r\n"
+            b"cache-control: no-cache\r\n"
+            b"connection: close\r\n\r\n"
+        )
+        writer.write(self._chunk(completion_id, {"role": "assistant", "content": ""}))
+        # drain() blocks while the client is slow to read, which in turn pauses the upstream stream
+        await writer.drain()
+        sent = ""
+        final = None
+        failed = False
+        revised = None
+        try:
+            async for result in results:
+                # Meta AI chunks are cumulative; send only what is new. Every chunk
+                # ends in a newline, which is held back until the text that follows it.
+                text = result.get("message", "").rstrip("\n")
+                final = result
+                if not text.startswith(sent):
+                    # A revision of text the client already has; wait for text that extends it
+                    continue
+                delta = text[len(sent):]
+                sent = text
+                if delta:
+                    writer.write(self._chunk(completion_id, {"content": delta}))
+                    await writer.drain()
+            if final is not None:
+                if final.get("message", "").startswith(sent):
+                    rest = final["message"][len(sent):]
+                    if rest:
+                        writer.write(self._chunk(completion_id, {"content": rest}))
+                else:
+                    revised = final.get("message", "")
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            logger.warning(f"Upstream stream failed: {e}")
+            failed = True
+            error = {"error": {"message": f"Upstream error: {e}", "type": "upstream_error"}}
+            writer.write(b"data: " + json.dumps(error).encode("utf-8") + b"\n\n")
+        finally:
+            await results.aclose()
+        if final is not None:
+            await self.pool.remember(final["uuid"], index)
+            extra = {} if revised is None else {"revised_content": revised}
+            writer.write(self._chunk(
+                completion_id, {}, "stop",
+                conversation_id=final.get("uuid"),
+                sources=to_plain(final.get("sources", [])),
+                media=to_plain(final.get("media", [])),
+                **extra,
+            ))
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+        return final is not None and not failed
+
+    async def _send_json(self, writer, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\ncontent-type: application/json\r\ncontent-length: {len(body)}\r\n"
+        for name, value in (headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def _send_error(self, writer, error: HTTPError):
+        payload = {"error": {"message": error.message, "type": REASONS.get(error.status, "error"), "code": error.status}}
+        await self._send_json(writer, error.status, payload, error.headers)
+
+
+def run_gateway(args):
+    """Entry point for `python -m meta_ai_api serve`."""
+    # Identities are long-lived, so have them start with hot connections and tokens
+    client_kwargs = {"warmup": True}
+    if args.fb_email is not None:
+        client_kwargs.update(fb_email=args.fb_email, fb_password=args.fb_password)
+    if args.proxy:
+        client_kwargs["proxy"] = args.proxy
+    limiter = limiter_from_args(args, args.identities)
+    state = state_from_args(args)
+    scheduler = None
+    if args.fair or args.quota:
+        scheduler = Scheduler(
+            capacity=(lambda: limiter.limit) if limiter is not None else args.identities,
+            quotas=dict(parse_quota(spec) for spec in args.quota or ()),
+        )
+    gateway = Gateway(
+        host=args.host,
+        port=args.port,
+        identities=args.identities,
+        max_waiting=args.max_waiting,
+        api_key=args.api_key,
+        client_kwargs=client_kwargs,
+        limiter=limiter,
+        scheduler=scheduler,
+        state=state,
+    )
+    try:
+        asyncio.run(gateway.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,99 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EVENTS = (
+    "request_start",  # an HTTP request is about to be sent (per attempt)
+    "headers",  # response status and headers received
+    "first_chunk",  # first line of a streamed response received
+    "chunk",  # every further stream line
+    "retry",  # an attempt failed and another one follows
+    "sources",  # search sources fetched for an answer
+    "done",  # prompt() finished; closed=True when the caller stopped early
+    "error",  # prompt() raised
+)
+
+
+class HookEvent:
+    """
+    One instrumentation event.
+
+    Attributes:
+        name (str): One of EVENTS.
+        time (float): time.monotonic() when the event was emitted.
+        request (int): Id of the prompt() call the event belongs to, or None outside one
+            (e.g. the cookie fetch of initialize()).
+        data (Dict): Event specific fields (attempt, status, elapsed, size, ...).
+    """
+
+    __slots__ = ("name", "time", "request", "data")
+
+    def __init__(self, name: str, time: float, request: Optional[int], data: Dict):
+        self.name = name
+        self.time = time
+        self.request = request
+        self.data = data
+
+    def __repr__(self) -> str:
+        return f"HookEvent({self.name!r}, time={self.time:.6f}, request={self.request!r}, data={self.data!r})"
+
+
+class Hooks:
+    """
+    A small synchronous event bus for instrumenting MetaAI.
+
+    Handlers are called inline with a HookEvent and should return quickly; spawn a
+    task from the handler for anything slow. Exceptions raised by handlers are logged
+    and never reach the request. Emitters check `active` before building an event,
+    so an instance without handlers costs one attribute lookup per emit site.
+
+    Example:
+        hooks = Hooks()
+        hooks.on("first_chunk", lambda event: print(event.data["elapsed"]))
+        ai = MetaAI(hooks=hooks)
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[HookEvent], None]]] = {}
+        self.active = False
+
+    def on(self, event: str, handler: Optional[Callable[[HookEvent], None]] = None):
+        """
+        Registers a handler for an event name, or for every event with "*".
+        Can be used as a decorator when the handler is omitted.
+        """
+        if event != "*" and event not in EVENTS:
+            raise ValueError(f"Unknown event {event!r}; expected one of {EVENTS} or '*'")
+        if handler is None:
+            def decorator(func):
+                self.on(event, func)
+                return func
+
+            return decorator
+        self._handlers.setdefault(event, []).append(handler)
+        self.active = True
+        return handler
+
+    def off(self, event: str, handler: Callable[[HookEvent], None]):
+        """Removes a handler registered with on()."""
+        handlers = self._handlers.get(event, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self._handlers.pop(event, None)
+        self.active = bool(self._handlers)
+
+    def emit(self, name: str, request: Optional[int] = None, **data):
+        """Calls the handlers of an event; a no-op when nothing listens to it."""
+        handlers = self._handlers.get(name)
+        wildcard = self._handlers.get("*")
+        if not handlers and not wildcard:
+            return
+        event = HookEvent(name, time.monotonic(), request, data)
+        for handler in (handlers or []) + (wildcard or []):
+            try:
+                handler(event)
+            except Exception:
+                logger.exception(f"Hook for {name!r} failed")
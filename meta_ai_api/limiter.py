@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from meta_ai_api.hooks import HookEvent, Hooks
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ("aimd", "gradient")
+
+
+class Permit:
+    """One admitted call; set `error` before it is released to report a failure."""
+
+    __slots__ = ("started", "in_flight", "error")
+
+    def __init__(self, started: float, in_flight: int):
+        self.started = started
+        self.in_flight = in_flight
+        self.error = False
+
+
+class AdaptiveLimiter:
+    """
+    A concurrency limit that follows the observed latency and errors.
+
+    Every call holds a permit from acquire() to release(); the limit on permits in
+    flight is adjusted from the latency and outcome of each released permit:
+
+    - "aimd" adds one permit per limit's worth of successes, and multiplies the
+      limit by `backoff` on an error or when the recent latency exceeds `tolerance`
+      times the long-term latency.
+    - "gradient" scales the limit by the ratio of long-term to recent latency
+      (scaled by `tolerance`, within 0.5 and 1) plus a queue allowance of
+      sqrt(limit), so it settles where latency stops rising; errors back off as in
+      "aimd".
+
+    The limit only grows while at least half of it is in use, and drops at most once
+    per recent latency, since the calls still in flight were admitted before the
+    last drop. attach() also treats every prompt retry (an empty response or a
+    GraphQL error on the first line) as a drop signal.
+
+    One limiter can be shared by any number of sessions on the same event loop.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        algorithm: str = "aimd",
+        backoff: float = 0.5,
+        tolerance: float = 2.0,
+        smoothing: float = 0.2,
+    ):
+        """
+        Args:
+            initial_limit (int): Permits in flight before anything was measured.
+            min_limit (int): Lowest limit.
+            max_limit (int): Highest limit.
+            algorithm (str): "aimd" or "gradient".
+            backoff (float): Factor the limit is multiplied by on a drop.
+            tolerance (float): How many times the long-term latency the recent latency may reach.
+            smoothing (float): Weight of a new sample in the recent latency; the
+                long-term latency uses a tenth of it.
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm {algorithm!r}, use one of {ALGORITHMS}")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.algorithm = algorithm
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.drops = 0
+        self.errors = 0
+        self._last_drop = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def settings(self) -> Dict:
+        """Constructor arguments for an equivalent limiter, e.g. in another process."""
+        return {
+            "initial_limit": self.limit,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "algorithm": self.algorithm,
+            "backoff": self.backoff,
+            "tolerance": self.tolerance,
+            "smoothing": self.smoothing,
+        }
+
+    async def acquire(self) -> Permit:
+        """Waits until a call may start and returns its permit."""
+        if self.in_flight >= self.limit or self._waiters:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted just before the cancellation; hand the permit on
+                    self.in_flight -= 1
+                    self._wake()
+                raise
+            finally:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+        else:
+            self.in_flight += 1
+        return Permit(time.monotonic(), self.in_flight)
+
+    def release(self, permit: Permit, sample: bool = True):
+        """
+        Returns a permit.
+
+        Args:
+            permit (Permit): From acquire(); permit.error marks a failed call.
+            sample (bool): Adjust the limit from this call; False for calls that were
+                abandoned by the caller rather than answered.
+        """
+        self.in_flight -= 1
+        if sample:
+            self._update(time.monotonic() - permit.started, permit.error, permit.in_flight)
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Holds a permit for the body of an `async with`; an exception marks it failed,
+        a cancellation releases it without a sample.
+        """
+        permit = await self.acquire()
+        try:
+            yield permit
+        except (asyncio.CancelledError, GeneratorExit):
+            self.release(permit, sample=False)
+            raise
+        except Exception:
+            permit.error = True
+            self.release(permit)
+            raise
+        else:
+            self.release(permit)
+
+    def attach(self, hooks: Hooks) -> "AdaptiveLimiter":
+        """Drops the limit on the prompt retries reported by hooks."""
+        hooks.on("retry", self._on_retry)
+        return self
+
+    def _on_retry(self, event: HookEvent):
+        self._drop(time.monotonic(), f"retry ({event.data.get('reason')})")
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def _drop(self, now: float, reason: str):
+        # The calls in flight were admitted under the old limit; let them finish first
+        if self.latency is not None and now - self._last_drop < self.latency:
+            return
+        self._last_drop = now
+        self.drops += 1
+        self._limit = max(self.min_limit, self._limit * self.backoff)
+        logger.debug(f"Concurrency limit dropped to {self.limit} after {reason}")
+
+    def _update(self, latency: float, error: bool, in_flight: int):
+        now = time.monotonic()
+        if error:
+            self.errors += 1
+            self._drop(now, "error")
+            return
+        if self.latency is None:
+            self.latency = self.baseline = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+            self.baseline += self.smoothing / 10 * (latency - self.baseline)
+        # Without enough calls to fill the limit, latency says nothing about a higher one
+        saturated = in_flight * 2 >= self._limit
+        if self.algorithm == "aimd":
+            if self.latency > self.tolerance * self.baseline:
+                self._drop(now, f"latency {self.latency:.2f}s (baseline {self.baseline:.2f}s)")
+            elif saturated:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+        else:
+            gradient = max(0.5, min(1.0, self.tolerance * self.baseline / self.latency))
+            target = self._limit * gradient + (math.sqrt(self._limit) if saturated else 0.0)
+            # A full step per limit's worth of samples, i.e. about once per round trip
+            self._limit += (target - self._limit) / max(self._limit, 1.0)
+            self._limit = min(self.max_limit, max(self.min_limit, self._limit))
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "latency": self.latency,
+            "baseline": self.baseline,
+            "drops": self.drops,
+            "errors": self.errors,
+        }
+
+
+def limiter_from_args(args, max_limit: int) -> Optional[AdaptiveLimiter]:
+    """The AdaptiveLimiter selected by the --adaptive CLI option, capped at max_limit."""
+    if not args.adaptive:
+        return None
+    return AdaptiveLimiter(initial_limit=min(4, max_limit), max_limit=max_limit, algorithm=args.adaptive)
@@ -1,9 +1,11 @@
 import ujson as json
 import logging
 import asyncio
-import urllib
+import time
 import uuid
-from typing import Dict, List, Optional
+from contextlib import aclosing
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 
 import httpx
@@ -17,17 +19,100 @@ from meta_ai_api.utils import (
 
 from meta_ai_api.utils import get_fb_session, get_session
 
-from meta_ai_api.exceptions import FacebookRegionBlocked
+from meta_ai_api.exceptions import FacebookRegionBlocked, MetaAITimeout
 from meta_ai_api.extras import fake_agent
+from meta_ai_api.proxy_pool import ProxyPool
+from meta_ai_api.cache import ResponseCache
+from meta_ai_api.coalesce import SingleFlight
+from meta_ai_api.media import MediaDownloader
+from meta_ai_api.deadline import Deadline
+from meta_ai_api.decoding import LineDecoder, get_decoder
+from meta_ai_api.framing import NDJSONFramer
+from meta_ai_api.operations import OperationRegistry, get_operations
+from meta_ai_api.hooks import Hooks
+from meta_ai_api.capture import TailCapture
+from meta_ai_api.offload import Offloader
+from meta_ai_api.trace import TraceWriter
+from meta_ai_api.state import SharedState
+from meta_ai_api.delta import (
+    SnapshotDecoder,
+    SnapshotEncoder,
+    from_json_safe,
+    is_keyframe,
+    is_snapshot,
+    to_json_safe,
+)
+from meta_ai_api.models import Media, PromptResult, Source, to_plain
 
 from meta_ai_api.session_meta import fb_session_cookie
 MAX_RETRIES = 3
 
+
+def new_request_id() -> int:
+    """
+    A prompt() request id that is unique across sessions, processes and runs (63
+    random bits of a uuid4), so hook buses, captures and traces can be shared.
+    """
+    return uuid.uuid4().int >> 65
+
+
+# Id of the prompt() step running in the current context; concurrent prompts on one
+# session each see their own
+_current_request: ContextVar[Optional[int]] = ContextVar("meta_ai_request", default=None)
+
+
+# Hosts opened ahead of the first prompt when warm-up is enabled
+WARMUP_URLS = ("https://www.meta.ai/", "https://graph.meta.ai/")
+WARMUP_TIMEOUT = 10.0
+# Statuses that mean the cookies or access token were rejected
+AUTH_FAILURE_STATUSES = (401, 403)
+
 # Setup logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
+class _ResponseScan:
+    """What a pass over a full response body found, before it touches the session."""
+
+    __slots__ = ("last_response", "last_line", "chat_id", "line_count", "final_line")
+
+    def __init__(self):
+        self.last_response: Optional[Dict] = None
+        self.last_line: Union[str, bytes, None] = None
+        self.chat_id: Optional[str] = None
+        self.line_count = 0
+        self.final_line = 0
+
+
+def _scan_response(decoder, response: Union[str, bytes]) -> _ResponseScan:
+    """
+    Decodes every line of a response body and keeps the last chat id and the last
+    OVERALL_DONE line. Pure, so it can run on a parser thread.
+    """
+    scan = _ResponseScan()
+    for line in response.split(b"\n" if isinstance(response, bytes) else "\n"):
+        try:
+            json_line = decoder.decode(line)
+            scan.line_count += 1
+        except ValueError:
+            continue
+
+        bot_response_message = (
+            json_line.get("data", {})
+            .get("node", {})
+            .get("bot_response_message", {})
+        )
+        chat_id = bot_response_message.get("id")
+        if chat_id:
+            scan.chat_id = chat_id
+        if bot_response_message.get("streaming_state") == "OVERALL_DONE":
+            scan.last_response = json_line
+            scan.last_line = line
+            scan.final_line = scan.line_count
+    return scan
+
+
 class MetaAI:
     """
     A class to interact with the Meta AI API to obtain and use access tokens for sending
@@ -35,13 +120,72 @@ class MetaAI:
     """
 
     def __init__(
-        self, fb_email: str = None, fb_password: str = None, proxy: dict = None
+        self,
+        fb_email: str = None,
+        fb_password: str = None,
+        proxy: dict = None,
+        proxy_pool: ProxyPool = None,
+        identity: str = None,
+        cache: ResponseCache = None,
+        coalescer: SingleFlight = None,
+        deadline: Deadline = None,
+        keep_raw: bool = False,
+        decoder: Union[str, LineDecoder] = "auto",
+        operations: OperationRegistry = None,
+        warmup: bool = False,
+        hooks: Hooks = None,
+        capture: TailCapture = None,
+        offload: Offloader = None,
+        trace: TraceWriter = None,
+        delta_snapshots: bool = False,
+        state: SharedState = None,
     ):
         self.session = None  # Will be created in async context
         self.access_token = None
         self.fb_email = fb_email
         self.fb_password = fb_password
         self.proxy = proxy
+        # A pool overrides the single proxy; the identity keeps the assignment sticky
+        self.proxy_pool = proxy_pool
+        self.identity = identity or fb_email or str(uuid.uuid4())
+        # Only a named identity can be looked up again in a shared state
+        self._named_identity = bool(identity or fb_email)
+        # Opt-in result cache for new_conversation prompts
+        self.cache = cache
+        # Optional single-flight group shared by callers of identical prompts
+        self.coalescer = coalescer
+        # Default time budget for every prompt() call
+        self.deadline = deadline
+        # Keep the raw payloads on results, media and sources (off to save memory)
+        self.keep_raw = keep_raw
+        # Stream line decoder; "auto" benchmarks the available backends once. Raw
+        # payloads need every field, which the schema-driven decoders skip.
+        self.decoder = get_decoder(decoder, complete=keep_raw)
+        # GraphQL operations with pre-encoded bodies; doc_ids can be overridden from the environment
+        self.operations = operations or get_operations()
+        # Request headers per operation, rebuilt whenever the cookies change
+        self._headers: Dict[str, Dict[str, str]] = {}
+        self._headers_cookies = None
+        # Pre-connect to both hosts and fetch the access token in the background on initialize()
+        self.warmup = warmup
+        self._warmup_tasks: List[asyncio.Task] = []
+        self._token_task: Optional[asyncio.Task] = None
+        # Instrumentation events; emit sites are skipped while no handler is registered
+        self.hooks = hooks or Hooks()
+        # Tail capture buffers raw responses per prompt instead of dumping them
+        self.capture = capture
+        if capture is not None:
+            capture.attach(self.hooks)
+        # Optional executor for large payload parsing and dump serialization
+        self.offload = offload
+        # Compact binary trace written instead of the text dump of raw responses
+        self.trace = trace
+        # Store stream snapshots (and non-stream body lines) in the JSON dump as deltas against
+        # the previous line of the same prompt (see raw_responses())
+        self._snapshots = SnapshotEncoder() if delta_snapshots else None
+        # Cookies, tokens and prompt limits shared with other sessions and nodes, by identity
+        self.state = state
+        self._identity_record: Optional[Dict] = None
 
         # Special handling for NULL login (empty strings)
         # NULL login should NOT be treated as authenticated
@@ -80,39 +224,241 @@ class MetaAI:
 
     async def initialize(self):
         """Initialize the async session and fetch cookies"""
-        client_kwargs = {
-            "timeout": 30.0,
-            "follow_redirects": True,
-        }
-        if self.proxy:
-            client_kwargs["proxy"] = self.proxy
-        
-        self.session = httpx.AsyncClient(**client_kwargs)
+        if self.proxy_pool:
+            await self.proxy_pool.start()
+            self.proxy = self.proxy_pool.assign(self.identity)
+
+        self.session = self._create_session(follow_redirects=True)
         # Don't override default headers - httpx defaults work fine!
+        if self.warmup:
+            # Open connections to both hosts while the cookies are fetched (and, for
+            # Facebook logins, while the login flow runs)
+            self._warmup_tasks = [
+                asyncio.create_task(self._preconnect(url)) for url in WARMUP_URLS
+            ]
+        if self.state is None or not self._named_identity:
+            self.cookies = await self.get_cookies()
+        else:
+            await self._load_identity()
+        if self.warmup and not self.is_authed and not self.access_token:
+            self._token_task = asyncio.create_task(self._fetch_access_token())
+
+    async def _load_identity(self):
+        """Takes the cookies and access token of the identity from the shared state."""
+        self._identity_record = await self.state.identity(self.identity, self._login)
+        self.cookies = self._identity_record["cookies"]
+        self.access_token = self._identity_record.get("access_token")
+
+    async def _credentials_rejected(self, status: int) -> str:
+        """
+        Drops credentials the server rejected so the retry logs in again. A shared
+        identity is also dropped from the state, unless another node has replaced it
+        already, and then taken from whichever node logs in first.
+        """
+        self._dump_log(f"Credentials rejected with status {status}, logging in again...", level="WARNING")
+        self.access_token = None
+        if self.state is not None and self._named_identity:
+            await self.state.forget_identity(self.identity, self._identity_record)
+            await self._load_identity()
+        elif self.is_authed:
+            self.cookies = await self.get_cookies()
+        return "unauthorized"
+
+    async def _login(self) -> Dict:
+        """Logs in for the shared state: the cookies and, for temporary users, an access token."""
         self.cookies = await self.get_cookies()
+        record = {"cookies": self.cookies}
+        if not self.is_authed:
+            record["access_token"] = await self.get_access_token()
+        return record
+
+    async def _preconnect(self, url: str):
+        """Resolve a host and leave an open connection to it in the session's pool."""
+        started = time.monotonic()
+        try:
+            await self.session.head(url, timeout=WARMUP_TIMEOUT)
+        except Exception as e:
+            # Best effort; the first real request simply opens its own connection
+            self._dump_log(f"Warm-up of {url} failed: {e!r}", level="WARNING")
+        else:
+            self._dump_log(f"Warmed up {url} in {time.monotonic() - started:.3f}s")
+
+    async def _fetch_access_token(self) -> str:
+        self.access_token = await self.get_access_token()
+        return self.access_token
+
+    async def _ensure_access_token(self) -> str:
+        """The access token, taken from the warm-up fetch when one was started."""
+        task, self._token_task = self._token_task, None
+        if task is not None:
+            try:
+                return await task
+            except Exception as e:
+                self._dump_log(f"Background access token fetch failed: {e!r}", level="WARNING")
+        return await self._fetch_access_token()
 
     async def close(self):
         """Close the async session"""
+        for task in [*self._warmup_tasks, self._token_task]:
+            if task is not None and not task.done():
+                task.cancel()
+        await asyncio.gather(*[t for t in [*self._warmup_tasks, self._token_task] if t], return_exceptions=True)
+        self._warmup_tasks, self._token_task = [], None
         if self.session:
             await self.session.aclose()
+        if self.cache:
+            self.cache.save()
+        if self.offload is not None:
+            # The offloader may be shared, so only wait for this session's writes
+            await asyncio.to_thread(self.offload.flush)
+        if self.trace is not None:
+            self.trace.flush()
+
+    def _create_session(self, **kwargs) -> httpx.AsyncClient:
+        """Create an async client routed through the current proxy."""
+        client_kwargs = {"timeout": 30.0, **kwargs}
+        if self.proxy:
+            client_kwargs["proxy"] = self.proxy
+        return httpx.AsyncClient(**client_kwargs)
+
+    async def _refresh_proxy(self):
+        """
+        Swap to a different pooled proxy if the current one has degraded.
+        This only consults the pool's scores; it never probes.
+        """
+        if not self.proxy_pool:
+            return
+        proxy = self.proxy_pool.assign(self.identity)
+        if proxy != self.proxy:
+            self._dump_log(f"Proxy failover: {self.proxy} -> {proxy}", level="WARNING")
+            self.proxy = proxy
+            if self.session:
+                await self.session.aclose()
+            self.session = self._create_session(follow_redirects=True)
+
+    def _report_proxy(self, ok: bool, started: float):
+        """Feed the outcome of a request, and its time to the headers, back into the proxy pool."""
+        if self.proxy_pool and self.proxy:
+            self.proxy_pool.report(self.proxy, ok, time.monotonic() - started)
+
+    def _operation_headers(self, friendly_name: str) -> Dict[str, str]:
+        """
+        Headers for a GraphQL operation, built once per set of cookies.
+        The returned dict is shared; do not modify it.
+        """
+        if self._headers_cookies is not self.cookies:
+            self._headers.clear()
+            self._headers_cookies = self.cookies
+        headers = self._headers.get(friendly_name)
+        if headers is not None:
+            return headers
+
+        headers = {
+            "content-type": "application/x-www-form-urlencoded",
+            "x-fb-friendly-name": friendly_name,
+        }
+        if friendly_name == "useAbraAcceptTOSForTempUserMutation":
+            headers["cookie"] = (
+                f'_js_datr={self.cookies["_js_datr"]}; '
+                f'abra_csrf={self.cookies.get("abra_csrf", "")}; '
+                f'datr={self.cookies["datr"]}; '
+                f'abra_sess={self.cookies.get("abra_sess", "")};'
+            )
+            headers["sec-fetch-site"] = "same-origin"
+        elif friendly_name == "AbraSearchPluginDialogQuery":
+            headers = {
+                "authority": "graph.meta.ai",
+                "accept-language": "en-US,en;q=0.9,fr-FR;q=0.8,fr;q=0.7",
+                **headers,
+                "cookie": f'dpr=2; abra_csrf={self.cookies.get("abra_csrf")}; datr={self.cookies.get("datr")}; ps_n=1; ps_l=1',
+            }
+        elif friendly_name == "useAbraSendMessageMutation" and self.is_authed:
+            headers["cookie"] = f'abra_sess={self.cookies["abra_sess"]}'
+        self._headers[friendly_name] = headers
+        return headers
 
     def _dump_log(self, content: str, level: str = "INFO"):
         """Log to both file and console."""
         timestamp = datetime.now().isoformat()
+        if self.offload is not None:
+            self.offload.write(self._write_log, self.dump_file, timestamp, content, level)
+        else:
+            self._write_log(self.dump_file, timestamp, content, level)
+
+    @staticmethod
+    def _write_log(path: str, timestamp: str, content: str, level: str):
         formatted = f"[{timestamp}] [{level}] {content}"
         
         print(formatted)
         
-        with open(self.dump_file, 'a', encoding='utf-8') as f:
+        with open(path, 'a', encoding='utf-8') as f:
             f.write(formatted + "\n")
 
     def _dump_raw_response(self, raw_data, endpoint: str = ""):
         """Dump raw response data."""
+        if self.capture is not None and self._request_id is not None:
+            # Kept in memory and only written out if the prompt turns out slow or failed
+            self.capture.add(self._request_id, endpoint, raw_data)
+            return
         timestamp = datetime.now().isoformat()
+        snapshot = None
+        if self._snapshots is not None and is_snapshot(endpoint):
+            # One chain of deltas per prompt, so concurrent prompts do not diff against each other
+            snapshot = self._snapshots.encode(self._request_id, raw_data, keyframe=is_keyframe(endpoint))
+        # The text dump is meant for reading, so it always holds the full data
+        if self.trace is not None:
+            self._write_trace(endpoint, raw_data)
+        elif self.offload is not None:
+            self.offload.write(self._write_raw_response, self.dump_file, timestamp, endpoint, raw_data)
+        else:
+            self._write_raw_response(self.dump_file, timestamp, endpoint, raw_data)
         
+        # Also store for JSON dump; bytes are decoded when it is saved
+        entry = {
+            "timestamp": timestamp,
+            "endpoint": endpoint,
+        }
+        if snapshot is None:
+            entry["data"] = raw_data
+        else:
+            entry["request"] = self._request_id
+            entry["snapshot"] = snapshot
+        self.all_raw_responses.append(entry)
+
+    @property
+    def _delta_lines(self) -> bool:
+        """Whether a full body is dumped line by line, for the delta encoding of its snapshots."""
+        return self._snapshots is not None or (self.trace is not None and self.trace.delta)
+
+    def _dump_body(self, body: bytes):
+        """
+        Dumps a non-stream response body. Every line of it repeats the text so far, so
+        with delta snapshots the lines are dumped one by one and stored as deltas.
+        """
+        if not self._delta_lines:
+            self._dump_raw_response(body, endpoint="prompt (non-stream)")
+            return
+        number = 0
+        for line in body.split(b"\n"):
+            if line.strip():
+                number += 1
+                self._dump_raw_response(line, endpoint=f"prompt (non-stream - line {number})")
+
+    def _write_trace(self, endpoint: str, data):
+        args = (endpoint, data, self.external_conversation_id, self._request_id, time.time())
+        if self.offload is not None:
+            self.offload.write(self.trace.write, *args)
+        else:
+            self.trace.write(*args)
+
+    @staticmethod
+    def _write_raw_response(path: str, timestamp: str, endpoint: str, raw_data):
         separator = "\n" + "="*80 + "\n"
         dump_content = f"{separator}[{timestamp}] RAW RESPONSE{f' - {endpoint}' if endpoint else ''}\n{separator}\n"
         
+        if isinstance(raw_data, (bytes, bytearray)):
+            # Stream lines arrive as bytes; only decode them for the dump
+            raw_data = raw_data.decode("utf-8", errors="replace")
         if isinstance(raw_data, dict):
             dump_content += json.dumps(raw_data, indent=2, ensure_ascii=False)
         else:
@@ -120,26 +466,22 @@ class MetaAI:
         
         dump_content += "\n"
         
-        with open(self.dump_file, 'a', encoding='utf-8') as f:
+        with open(path, 'a', encoding='utf-8') as f:
             f.write(dump_content)
-        
-        # Also store for JSON dump
-        self.all_raw_responses.append({
-            "timestamp": timestamp,
-            "endpoint": endpoint,
-            "data": raw_data
-        })
 
     def _dump_extracted_data(self, data: dict):
         """Dump extracted and processed data."""
+        if self.capture is not None and self._request_id is not None:
+            self.capture.add(self._request_id, "extracted", to_plain(data))
+            return
         timestamp = datetime.now().isoformat()
-        
-        dump_content = f"\n{'='*80}\n[{timestamp}] EXTRACTED DATA\n{'='*80}\n"
-        dump_content += json.dumps(data, indent=2, ensure_ascii=False)
-        dump_content += "\n"
-        
-        with open(self.dump_file, 'a', encoding='utf-8') as f:
-            f.write(dump_content)
+        data = to_plain(data)
+        if self.trace is not None:
+            self._write_trace("extracted", data)
+        elif self.offload is not None:
+            self.offload.write(self._write_extracted_data, self.dump_file, timestamp, data)
+        else:
+            self._write_extracted_data(self.dump_file, timestamp, data)
         
         # Store for JSON dump
         self.all_extracted_data.append({
@@ -147,6 +489,29 @@ class MetaAI:
             "data": data
         })
 
+    @staticmethod
+    def _write_extracted_data(path: str, timestamp: str, data: dict):
+        dump_content = f"\n{'='*80}\n[{timestamp}] EXTRACTED DATA\n{'='*80}\n"
+        dump_content += json.dumps(data, indent=2, ensure_ascii=False)
+        dump_content += "\n"
+        
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(dump_content)
+
+    def _emit_request_start(self, operation: str, url: str) -> float:
+        """Emits request_start for a setup call (cookies, token); returns its start time."""
+        started = time.monotonic()
+        if self.hooks.active:
+            self.hooks.emit("request_start", self._request_id, operation=operation, url=url)
+        return started
+
+    def _emit_headers(self, operation: str, response: httpx.Response, started: float):
+        if self.hooks.active:
+            self.hooks.emit(
+                "headers", self._request_id, operation=operation, status=response.status_code,
+                elapsed=time.monotonic() - started,
+            )
+
     async def get_access_token(self) -> str:
         """
         Retrieves an access token using Meta's authentication API.
@@ -159,30 +524,14 @@ class MetaAI:
             return self.access_token
 
         url = "https://www.meta.ai/api/graphql/"
-        payload = {
-            "lsd": self.cookies["lsd"],
-            "fb_api_caller_class": "RelayModern",
-            "fb_api_req_friendly_name": "useAbraAcceptTOSForTempUserMutation",
-            "variables": {
-                "dob": "1999-01-01",
-                "icebreaker_type": "TEXT",
-                "__relay_internal__pv__WebPixelRatiorelayprovider": 1,
-            },
-            "doc_id": "7604648749596940",
-        }
-        payload = urllib.parse.urlencode(payload)
-        headers = {
-            "content-type": "application/x-www-form-urlencoded",
-            "cookie": f'_js_datr={self.cookies["_js_datr"]}; '
-             f'abra_csrf={self.cookies.get("abra_csrf", "")}; '
-             f'datr={self.cookies["datr"]}; '
-             f'abra_sess={self.cookies.get("abra_sess", "")};', 
-            "sec-fetch-site": "same-origin",
-            "x-fb-friendly-name": "useAbraAcceptTOSForTempUserMutation",
-            }
+        friendly_name = "useAbraAcceptTOSForTempUserMutation"
+        payload = self.operations[friendly_name].body({"lsd": self.cookies["lsd"]})
+        headers = self._operation_headers(friendly_name)
         self._dump_log(f"Requesting access token from {url}")
 
+        started = self._emit_request_start(friendly_name, url)
         response = await self.session.post(url, headers=headers, content=payload)
+        self._emit_headers(friendly_name, response, started)
 
         # Dump raw response
         response_text = response.text
@@ -209,172 +558,410 @@ class MetaAI:
 
         return access_token
 
-    async def prompt(self, message: str, stream: bool = False, attempts: int = 0, new_conversation: bool = False):
+    async def prompt(
+        self,
+        message: str,
+        stream: bool = False,
+        attempts: int = 0,
+        new_conversation: bool = False,
+        media_events: bool = False,
+        deadline: Optional[Deadline] = None,
+    ):
         """
         Sends a message to the Meta AI and returns/yields the response.
         Always returns an async generator for consistency.
+
+        With media_events=True, a {"event": "media", "media": {...}, "uuid": ...} dict is
+        yielded as soon as each generated image first appears in the stream, before
+        the regular chunks. The response is streamed internally even when stream=False,
+        in which case only the final chunk is yielded after the media events.
+
+        A Deadline (or the instance default) bounds connect, first byte, idle time
+        between chunks and total time; exceeding one raises MetaAITimeout. Use
+        contextlib.aclosing() when breaking out of the loop early to release the
+        connection immediately rather than when the generator is collected.
+
+        New-conversation prompts are answered from the response cache when one is
+        configured; a cache hit is replayed as a single complete chunk in both modes.
+        With a coalescer, identical new-conversation prompts that are in flight at the
+        same time share one upstream call and all receive the same chunks. Only the
+        caller that made the upstream call moves to the new conversation.
         """
-        self._dump_log(f"\n{'#'*80}")
-        self._dump_log(f"NEW PROMPT REQUEST - Attempt {attempts + 1}")
-        self._dump_log(f"Message: {message}")
-        self._dump_log(f"Stream: {stream}")
-        self._dump_log(f"New Conversation: {new_conversation}")
-        self._dump_log(f"{'#'*80}\n")
+        if not new_conversation or (self.cache is None and self.coalescer is None):
+            async with aclosing(
+                self._upstream(message, stream, attempts, new_conversation, media_events, deadline)
+            ) as results:
+                async for result in results:
+                    yield result
+            return
 
-        if not self.is_authed:
-            self.access_token = await self.get_access_token()
-            auth_payload = {"access_token": self.access_token}
-            url = "https://graph.meta.ai/graphql?locale=user"
+        mode = "authed" if self.is_authed else "anonymous"
+        if self.cache is not None:
+            cached = self.cache.get(message, mode)
+            if cached is not None:
+                # The entry only answers the prompt; this session's conversation is left as it is
+                cached = PromptResult.from_dict(cached, done=True)
+                self._dump_log(f"Cache hit for prompt: {message}")
+                if media_events:
+                    for event in self._new_media_events(cached.get("media", []), set()):
+                        yield event
+                yield cached
+                return
+
+        if self.coalescer is not None:
+            results = self.coalescer.stream(
+                (mode, stream, media_events, ResponseCache.normalize(message)),
+                lambda: self._upstream(message, stream, attempts, new_conversation, media_events, deadline),
+            )
         else:
-            auth_payload = {"fb_dtsg": self.cookies["fb_dtsg"]}
-            url = "https://www.meta.ai/api/graphql/"
+            results = self._upstream(message, stream, attempts, new_conversation, media_events, deadline)
 
-        if not self.external_conversation_id or new_conversation:
-            external_id = str(uuid.uuid4())
-            self._dump_log(f"Generated Conversation ID: {external_id}")
-            self.external_conversation_id = external_id
-            
-        payload = {
-            **auth_payload,
-            "fb_api_caller_class": "RelayModern",
-            "fb_api_req_friendly_name": "useAbraSendMessageMutation",
-            "variables": json.dumps({
-                "message": {"sensitive_string_value": message},
-                "externalConversationId": self.external_conversation_id,
-                "offlineThreadingId": generate_offline_threading_id(),
-                "suggestedPromptIndex": None,
-                "flashVideoRecapInput": {"images": []},
-                "flashPreviewInput": None,
-                "promptPrefix": None,
-                "entrypoint": "ABRA__CHAT__TEXT",
-                "icebreaker_type": "TEXT",
-                "__relay_internal__pv__AbraDebugDevOnlyrelayprovider": False,
-                "__relay_internal__pv__WebPixelRatiorelayprovider": 1,
-            }),
-            "server_timestamps": "true",
-            "doc_id": "7783822248314888",
-        }
-        payload = urllib.parse.urlencode(payload)
-        headers = {
-            "content-type": "application/x-www-form-urlencoded",
-            "x-fb-friendly-name": "useAbraSendMessageMutation",
-        }
-        
-        if self.is_authed:
-            headers["cookie"] = f'abra_sess={self.cookies["abra_sess"]}'
-            await self.session.aclose()
-            client_kwargs = {"timeout": 30.0}
-            if self.proxy:
-                client_kwargs["proxy"] = self.proxy
-            self.session = httpx.AsyncClient(**client_kwargs)
+        last_result = None
+        async with aclosing(results):
+            async for result in results:
+                if "event" not in result:
+                    last_result = result
+                yield result
+        # The upstream call moved its own session to the new conversation; callers that
+        # joined it keep theirs. A stream cut short before OVERALL_DONE is not cached.
+        if self.cache is not None and last_result is not None and last_result.done:
+            self.cache.set(message, mode, to_plain(last_result))
 
-        self._dump_log(f"Sending POST request to: {url}")
+    def _upstream(self, *args):
+        """The upstream generator for a prompt, tagged with a new request id."""
+        return self._observe(self._prompt(*args))
 
-        if not stream:
-            # Non-streaming: get full response
-            response = await self.session.post(url, headers=headers, content=payload)
-            self._dump_log(f"Response Status Code: {response.status_code}")
-            
-            raw_response = response.text
-            self._dump_raw_response(raw_response, endpoint="prompt (non-stream)")
-            
-            last_streamed_response = self.extract_last_response(raw_response)
-            if not last_streamed_response:
-                self._dump_log("No valid response found, retrying...", level="WARNING")
-                if attempts < MAX_RETRIES:
-                    await asyncio.sleep(3)
-                    async for result in self.prompt(message, stream=stream, attempts=attempts + 1):
-                        yield result
+    async def _observe(self, results):
+        """Tags a prompt's events, dumps and traces with a request id and emits done/error around it."""
+        request = new_request_id()
+        started = time.monotonic()
+        closed = True
+        error = None
+        try:
+            async with aclosing(results):
+                while True:
+                    # Set per step, since one task may drive the generators of several prompts
+                    token = _current_request.set(request)
+                    try:
+                        result = await results.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        _current_request.reset(token)
+                    yield result
+            closed = False
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if self.hooks.active:
+                elapsed = time.monotonic() - started
+                if error is not None:
+                    self.hooks.emit("error", request, error=error, elapsed=elapsed)
                 else:
-                    raise Exception("Unable to obtain a valid response from Meta AI. Try again later.")
+                    self.hooks.emit("done", request, closed=closed, elapsed=elapsed)
+
+    @property
+    def _request_id(self) -> Optional[int]:
+        """Id of the prompt() call this code runs for, or None outside one."""
+        return _current_request.get()
+
+    async def _prompt(
+        self,
+        message: str,
+        stream: bool = False,
+        attempts: int = 0,
+        new_conversation: bool = False,
+        media_events: bool = False,
+        deadline: Optional[Deadline] = None,
+    ):
+        """
+        Sends a single prompt upstream, retrying on empty or errored responses.
+
+        Retries run in a loop within the same generator, so closing the generator
+        or cancelling the caller always closes the one open response.
+        """
+        deadline = (deadline or self.deadline or Deadline()).start()
+        attempt = attempts
+        while True:
+            self._dump_log(f"\n{'#'*80}")
+            self._dump_log(f"NEW PROMPT REQUEST - Attempt {attempt + 1}")
+            self._dump_log(f"Message: {message}")
+            self._dump_log(f"Stream: {stream}")
+            self._dump_log(f"New Conversation: {new_conversation}")
+            self._dump_log(f"{'#'*80}\n")
+
+            if not self.is_authed:
+                self.access_token = await deadline.run("total", self._ensure_access_token())
+                auth_payload = {"access_token": self.access_token}
+                url = "https://graph.meta.ai/graphql?locale=user"
             else:
-                extracted_data = await self.extract_data(last_streamed_response)
-                self._dump_extracted_data(extracted_data)
-                yield extracted_data
-        else:
-            # Streaming: yield chunks as they arrive
-            self._dump_log("Starting stream response processing...")
-            async with self.session.stream('POST', url, headers=headers, content=payload) as response:
+                auth_payload = {"fb_dtsg": self.cookies["fb_dtsg"]}
+                url = "https://www.meta.ai/api/graphql/"
+
+            # Retries continue the conversation started by the first attempt
+            if not self.external_conversation_id or (new_conversation and attempt == attempts):
+                external_id = str(uuid.uuid4())
+                self._dump_log(f"Generated Conversation ID: {external_id}")
+                self.external_conversation_id = external_id
+                
+            friendly_name = "useAbraSendMessageMutation"
+            payload = self.operations[friendly_name].body(
+                auth_payload,
+                message={"sensitive_string_value": message},
+                external_conversation_id=self.external_conversation_id,
+                offline_threading_id=generate_offline_threading_id(),
+            )
+            headers = self._operation_headers(friendly_name)
+            
+            if self.state is not None:
+                await deadline.run("total", self.state.admit(self.identity))
+            await self._refresh_proxy()
+            if self.is_authed:
+                await self.session.aclose()
+                self.session = self._create_session()
+
+            self._dump_log(f"Sending POST request to: {url}")
+            started = time.monotonic()
+            if self.hooks.active:
+                self.hooks.emit(
+                    "request_start", self._request_id, operation=friendly_name, url=url, attempt=attempt, stream=stream
+                )
+            request = self.session.build_request(
+                'POST', url, headers=headers, content=payload, timeout=deadline.httpx_timeout()
+            )
+
+            if not stream and not media_events:
+                # Non-streaming: read the full response under the same limits as a stream
+                try:
+                    response = await deadline.run(
+                        "first_byte", self.session.send(request, stream=True), deadline.first_byte
+                    )
+                except (httpx.TransportError, MetaAITimeout):
+                    self._report_proxy(False, started)
+                    raise
+                self._report_proxy(response.status_code < 500, started)
                 self._dump_log(f"Response Status Code: {response.status_code}")
+                if self.hooks.active:
+                    self.hooks.emit(
+                        "headers", self._request_id, operation=friendly_name, attempt=attempt,
+                        status=response.status_code, elapsed=time.monotonic() - started,
+                    )
+                if response.status_code in AUTH_FAILURE_STATUSES:
+                    await response.aclose()
+                    reason = await self._credentials_rejected(response.status_code)
+                else:
+                    try:
+                        raw_response = await self._read_body(response, deadline, started, attempt)
+                    finally:
+                        await response.aclose()
+                    self._dump_body(raw_response)
                 
-                lines_iter = response.aiter_lines()
+                    if self.offload is None:
+                        last_streamed_response = self.extract_last_response(raw_response)
+                    else:
+                        # Only the pure parse leaves the loop; session state and dumps are applied here
+                        self._dump_log("Extracting last response from stream...")
+                        scan = await self.offload.call(
+                            _scan_response, self.decoder, raw_response, size=len(raw_response)
+                        )
+                        last_streamed_response = self._apply_scan(scan)
+                    if last_streamed_response:
+                        extracted_data = await self.extract_data(last_streamed_response)
+                        self._dump_extracted_data(extracted_data)
+                        yield extracted_data
+                        return
+                    reason = "no valid response"
+                    self._dump_log("No valid response found, retrying...", level="WARNING")
+            else:
+                # Streaming: yield chunks as they arrive
+                self._dump_log("Starting stream response processing...")
                 try:
-                    first_line = await lines_iter.__anext__()
-                    is_error = json.loads(first_line)
-                    self._dump_raw_response(is_error, endpoint="prompt (stream - first line)")
+                    response = await deadline.run(
+                        "first_byte", self.session.send(request, stream=True), deadline.first_byte
+                    )
+                except (httpx.TransportError, MetaAITimeout):
+                    self._report_proxy(False, started)
+                    raise
+                self._report_proxy(response.status_code < 500, started)
+                if self.hooks.active:
+                    self.hooks.emit(
+                        "headers", self._request_id, operation=friendly_name, attempt=attempt,
+                        status=response.status_code, elapsed=time.monotonic() - started,
+                    )
+                try:
+                    self._dump_log(f"Response Status Code: {response.status_code}")
                     
-                    if len(is_error.get("errors", [])) > 0:
-                        self._dump_log("Error detected in stream, retrying...", level="WARNING")
-                        if attempts < MAX_RETRIES:
-                            await asyncio.sleep(3)
-                            async for result in self.prompt(message, stream=stream, attempts=attempts + 1):
-                                yield result
-                        else:
-                            raise Exception("Unable to obtain a valid response from Meta AI. Try again later.")
-                        return
-                except StopAsyncIteration:
-                    self._dump_log("Stream ended prematurely", level="ERROR")
-                    if attempts < MAX_RETRIES:
-                        await asyncio.sleep(3)
-                        async for result in self.prompt(message, stream=stream, attempts=attempts + 1):
-                            yield result
+                    if response.status_code in AUTH_FAILURE_STATUSES:
+                        await response.aclose()
+                        reason = await self._credentials_rejected(response.status_code)
                     else:
-                        raise Exception("Unable to obtain a valid response from Meta AI. Try again later.")
-                    return
-                
-                # Stream the response
-                async for chunk in self.stream_response(lines_iter):
-                    yield chunk
+                        # Frame lines from the raw bytes; the decoders take bytes directly
+                        raw_lines = NDJSONFramer().frames(response.aiter_bytes())
+                        first_byte = deadline.first_byte
+                        if first_byte is not None:
+                            first_byte = max(first_byte - (time.monotonic() - started), 0.0)
+                        try:
+                            first_line = await deadline.run("first_byte", raw_lines.__anext__(), first_byte)
+                        except StopAsyncIteration:
+                            reason = "stream ended prematurely"
+                            self._dump_log("Stream ended prematurely", level="ERROR")
+                        else:
+                            if self.hooks.active:
+                                self.hooks.emit(
+                                    "first_chunk", self._request_id, attempt=attempt, size=len(first_line),
+                                    elapsed=time.monotonic() - started,
+                                )
+                            if self.offload is None:
+                                is_error = self.decoder.decode(first_line)
+                            else:
+                                is_error = await self.offload.decode(self.decoder, first_line)
+                            self._dump_raw_response(
+                                is_error if self.decoder.complete else first_line,
+                                endpoint="prompt (stream - first line)",
+                            )
+                            seen_media = set()
+                            if media_events and stream:
+                                for event in self._new_media_events(self._line_media(is_error), seen_media):
+                                    yield event
+                        
+                            if len(is_error.get("errors", [])) > 0:
+                                reason = "error in stream"
+                                self._dump_log("Error detected in stream, retrying...", level="WARNING")
+                            else:
+                                lines_iter = deadline.lines(raw_lines)
+                                if not stream:
+                                    # The final response may already be in the first line
+                                    lines_iter = self._prepend_line(first_line, lines_iter)
+
+                                # Stream the response
+                                async with aclosing(self.stream_response(
+                                    lines_iter,
+                                    media_events=media_events,
+                                    final_only=not stream,
+                                    seen_media=seen_media,
+                                )) as chunks:
+                                    async for chunk in chunks:
+                                        yield chunk
+                                return
+                finally:
+                    # Hand the connection back to the pool even when the caller stops early
+                    await response.aclose()
+
+            if attempt >= MAX_RETRIES:
+                raise Exception("Unable to obtain a valid response from Meta AI. Try again later.")
+            attempt += 1
+            if self.hooks.active:
+                self.hooks.emit("retry", self._request_id, attempt=attempt, reason=reason)
+            await deadline.sleep(3)
+
+    async def _read_body(self, response: httpx.Response, deadline: Deadline, started: float, attempt: int) -> bytes:
+        """
+        Reads a whole response body: the first chunk within the first_byte limit, every
+        later one within the idle limit, and all of it within the total limit.
+        """
+        chunks = response.aiter_bytes()
+        first_byte = deadline.first_byte
+        if first_byte is not None:
+            first_byte = max(first_byte - (time.monotonic() - started), 0.0)
+        try:
+            first_chunk = await deadline.run("first_byte", chunks.__anext__(), first_byte)
+        except StopAsyncIteration:
+            return b""
+        if self.hooks.active:
+            self.hooks.emit(
+                "first_chunk", self._request_id, attempt=attempt, size=len(first_chunk),
+                elapsed=time.monotonic() - started,
+            )
+        body = [first_chunk]
+        async for chunk in deadline.lines(chunks):
+            body.append(chunk)
+        return b"".join(body)
 
-    def extract_last_response(self, response: str) -> Optional[Dict]:
+    def extract_last_response(self, response: Union[str, bytes]) -> Optional[Dict]:
         """
         Extracts the last response from the Meta AI API.
+
+        Args:
+            response: The full response body, as text or raw bytes.
         """
         self._dump_log("Extracting last response from stream...")
-        last_streamed_response = None
-        line_count = 0
-        
-        for line in response.split("\n"):
-            try:
-                json_line = json.loads(line)
-                line_count += 1
-            except json.JSONDecodeError:
-                continue
+        return self._apply_scan(_scan_response(self.decoder, response))
 
-            bot_response_message = (
-                json_line.get("data", {})
-                .get("node", {})
-                .get("bot_response_message", {})
+    def _apply_scan(self, scan: "_ResponseScan") -> Optional[Dict]:
+        """Applies the session state and dumps of a response scan; runs on the loop."""
+        if scan.chat_id:
+            external_conversation_id, offline_threading_id, _ = scan.chat_id.split("_")
+            self.external_conversation_id = external_conversation_id
+            self.offline_threading_id = offline_threading_id
+        if scan.last_response is not None:
+            self._dump_log(f"Found OVERALL_DONE state at line {scan.final_line}")
+            self._dump_raw_response(
+                # The raw line is a near-empty delta against the last line of the body
+                scan.last_response if self.decoder.complete and not self._delta_lines else scan.last_line,
+                endpoint="extract_last_response (FINAL)",
             )
-            
-            chat_id = bot_response_message.get("id")
-            if chat_id:
-                external_conversation_id, offline_threading_id, _ = chat_id.split("_")
-                self.external_conversation_id = external_conversation_id
-                self.offline_threading_id = offline_threading_id
-
-            streaming_state = bot_response_message.get("streaming_state")
-            if streaming_state == "OVERALL_DONE":
-                last_streamed_response = json_line
-                self._dump_log(f"Found OVERALL_DONE state at line {line_count}")
-                self._dump_raw_response(json_line, endpoint="extract_last_response (FINAL)")
+        self._dump_log(f"Processed {scan.line_count} JSON lines from response")
+        return scan.last_response
 
-        self._dump_log(f"Processed {line_count} JSON lines from response")
-        return last_streamed_response
-
-    async def stream_response(self, lines):
+    async def stream_response(
+        self,
+        lines,
+        media_events: bool = False,
+        final_only: bool = False,
+        seen_media: Optional[set] = None,
+    ):
         """
         Streams the response from the Meta AI API.
+
+        Args:
+            lines: Async iterator over the raw response lines.
+            media_events (bool): Yield a media event the first time each media URI appears.
+            final_only (bool): Only yield the extracted data of the final line.
+            seen_media (set): Media URIs that were already emitted.
         """
         self._dump_log("Starting stream response iteration...")
         line_count = 0
+        seen_media = set() if seen_media is None else seen_media
+        final_line = None
+        final_done = False
         
         async for line in lines:
             if line:
                 line_count += 1
+                if self.hooks.active:
+                    self.hooks.emit("chunk", self._request_id, line=line_count, size=len(line))
                 try:
-                    json_line = json.loads(line)
-                    self._dump_raw_response(json_line, endpoint=f"stream_response (line {line_count})")
+                    if self.offload is None:
+                        json_line = self.decoder.decode(line)
+                    else:
+                        json_line = await self.offload.decode(self.decoder, line)
+                    self._dump_raw_response(
+                        json_line if self.decoder.complete else line,
+                        endpoint=f"stream_response (line {line_count})",
+                    )
+
+                    bot_response_message = (
+                        json_line.get("data", {}).get("node", {}).get("bot_response_message", {})
+                    ) or {}
+                    if final_only:
+                        # Mirror extract_last_response and keep the server's conversation ids
+                        chat_id = bot_response_message.get("id")
+                        if chat_id:
+                            external_conversation_id, offline_threading_id, _ = chat_id.split("_")
+                            self.external_conversation_id = external_conversation_id
+                            self.offline_threading_id = offline_threading_id
+                    if media_events:
+                        for event in self._new_media_events(self.extract_media(bot_response_message, self.keep_raw), seen_media):
+                            yield event
+                    if final_only:
+                        # Settle on the OVERALL_DONE line, or the last line if it never comes
+                        if final_done is False:
+                            final_line = json_line
+                            final_done = bot_response_message.get("streaming_state") == "OVERALL_DONE"
+                        continue
                     
                     extracted_data = await self.extract_data(json_line)
                     if not extracted_data.get("message"):
@@ -382,13 +969,42 @@ class MetaAI:
                     
                     self._dump_extracted_data(extracted_data)
                     yield extracted_data
-                except json.JSONDecodeError as e:
+                except ValueError as e:
                     self._dump_log(f"JSON decode error at line {line_count}: {e}", level="ERROR")
                     continue
 
+        if final_line is not None:
+            extracted_data = await self.extract_data(final_line)
+            self._dump_extracted_data(extracted_data)
+            yield extracted_data
+
         self._dump_log(f"Stream response complete. Processed {line_count} lines")
 
-    async def extract_data(self, json_line: dict):
+    @staticmethod
+    async def _prepend_line(first_line: Union[str, bytes], lines):
+        """Re-attach a line that was consumed ahead of the stream."""
+        yield first_line
+        async for line in lines:
+            yield line
+
+    def _line_media(self, json_line: dict) -> List[Dict]:
+        """Media items carried by a single stream line."""
+        bot_response_message = (
+            json_line.get("data", {}).get("node", {}).get("bot_response_message", {})
+        )
+        return self.extract_media(bot_response_message or {}, self.keep_raw)
+
+    def _new_media_events(self, medias: List[Dict], seen_media: set) -> List[Dict]:
+        """Media events for the items whose URI has not been emitted yet."""
+        events = []
+        for media in medias:
+            uri = media.get("url")
+            if uri and uri not in seen_media:
+                seen_media.add(uri)
+                events.append({"event": "media", "media": media, "uuid": self.external_conversation_id})
+        return events
+
+    async def extract_data(self, json_line: dict) -> PromptResult:
         """
         Extract data and sources from a parsed JSON line.
         """
@@ -400,21 +1016,23 @@ class MetaAI:
         response = format_response(response=json_line)
         fetch_id = bot_response_message.get("fetch_id")
         sources = await self.fetch_sources(fetch_id) if fetch_id else []
-        medias = self.extract_media(bot_response_message)
+        medias = self.extract_media(bot_response_message, self.keep_raw)
         
-        result = {
-            "message": response,
-            "sources": sources,
-            "media": medias,
-            "uuid": self.external_conversation_id
-        }
+        result = PromptResult(
+            response,
+            sources,
+            medias,
+            self.external_conversation_id,
+            json_line if self.keep_raw else None,
+            bot_response_message.get("streaming_state") == "OVERALL_DONE",
+        )
         
         self._dump_log(f"Extracted data: {len(response)} chars, {len(sources)} sources, {len(medias)} media items")
         
         return result
 
     @staticmethod
-    def extract_media(json_line: dict) -> List[Dict]:
+    def extract_media(json_line: dict, keep_raw: bool = False) -> List[Media]:
         """
         Extract media from a parsed JSON line.
         """
@@ -429,13 +1047,26 @@ class MetaAI:
         for media_set in media_sets:
             imagine_media = media_set.get("imagine_media", [])
             for media in imagine_media:
-                medias.append({
-                    "url": media.get("uri"),
-                    "type": media.get("media_type"),
-                    "prompt": media.get("prompt"),
-                })
+                medias.append(Media.from_payload(media, keep_raw))
         return medias
 
+    async def download_media(self, medias: List[Dict], directory: str = "media", concurrency: int = 8) -> List[Dict]:
+        """
+        Downloads media items concurrently through the current proxy.
+
+        Args:
+            medias (List[Dict]): Media dicts as returned by extract_media.
+            directory (str): Where the content-addressed files are stored.
+            concurrency (int): Maximum number of simultaneous downloads.
+
+        Returns:
+            List[Dict]: The media dicts with the local "path" of each file.
+        """
+        async with MediaDownloader(directory, concurrency=concurrency, proxy=self.proxy) as downloader:
+            downloaded = await downloader.download(medias)
+        self._dump_log(f"Downloaded {sum(1 for m in downloaded if m['path'])}/{len(medias)} media items")
+        return downloaded
+
     async def get_cookies(self) -> dict:
         """
         Extracts necessary cookies from the Meta AI main page.
@@ -461,7 +1092,9 @@ class MetaAI:
                 headers = {"cookie": f"abra_sess={fb_session['abra_sess']}"}
                 self._dump_log("Using Facebook authentication")
         
+        started = self._emit_request_start("get_cookies", "https://www.meta.ai/")
         response = await self.session.get("https://www.meta.ai/", headers=headers)
+        self._emit_headers("get_cookies", response, started)
         
         response_text = response.text
         
@@ -495,32 +1128,18 @@ class MetaAI:
             )
         return cookies
 
-    async def fetch_sources(self, fetch_id: str) -> List[Dict]:
+    async def fetch_sources(self, fetch_id: str) -> List[Source]:
         """
         Fetches sources from the Meta AI API based on the given query.
         """
         url = "https://graph.meta.ai/graphql?locale=user"
-        payload = {
-            "access_token": self.access_token,
-            "fb_api_caller_class": "RelayModern",
-            "fb_api_req_friendly_name": "AbraSearchPluginDialogQuery",
-            "variables": json.dumps({"abraMessageFetchID": fetch_id}),
-            "server_timestamps": "true",
-            "doc_id": "6946734308765963",
-        }
-
-        payload = urllib.parse.urlencode(payload)
-
-        headers = {
-            "authority": "graph.meta.ai",
-            "accept-language": "en-US,en;q=0.9,fr-FR;q=0.8,fr;q=0.7",
-            "content-type": "application/x-www-form-urlencoded",
-            "cookie": f'dpr=2; abra_csrf={self.cookies.get("abra_csrf")}; datr={self.cookies.get("datr")}; ps_n=1; ps_l=1',
-            "x-fb-friendly-name": "AbraSearchPluginDialogQuery",
-        }
+        friendly_name = "AbraSearchPluginDialogQuery"
+        payload = self.operations[friendly_name].body({"access_token": self.access_token}, fetch_id=fetch_id)
+        headers = self._operation_headers(friendly_name)
 
         self._dump_log(f"Fetching sources with fetch_id: {fetch_id}")
 
+        started = time.monotonic()
         response = await self.session.post(url, headers=headers, content=payload)
         response_text = response.text
         self._dump_raw_response(response_text, endpoint="fetch_sources")
@@ -534,13 +1153,63 @@ class MetaAI:
             if message
             else None
         )
+        references = search_results["references"] if search_results is not None else []
+        if self.hooks.active:
+            self.hooks.emit(
+                "sources", self._request_id, fetch_id=fetch_id, status=response.status_code,
+                count=len(references), elapsed=time.monotonic() - started,
+            )
         if search_results is None:
             self._dump_log("No search results found")
             return []
 
-        references = search_results["references"]
         self._dump_log(f"Found {len(references)} references")
-        return references
+        return [Source.from_payload(reference, self.keep_raw) for reference in references]
+
+    def raw_responses(self) -> List[Dict]:
+        """
+        The stored raw responses, with delta-encoded stream snapshots expanded back
+        into their original data.
+        """
+        decoder = SnapshotDecoder()
+        expanded = []
+        for entry in self.all_raw_responses:
+            if "snapshot" in entry:
+                entry = {
+                    "timestamp": entry["timestamp"],
+                    "endpoint": entry["endpoint"],
+                    "data": decoder.decode(entry.get("request"), entry["snapshot"]),
+                }
+            expanded.append(entry)
+        return expanded
+
+    @staticmethod
+    def _json_safe_entry(entry: Dict) -> Dict:
+        if "snapshot" in entry:
+            return {**entry, "snapshot": to_json_safe(entry["snapshot"])}
+        if isinstance(entry.get("data"), (bytes, bytearray)):
+            return {**entry, "data": entry["data"].decode("utf-8", errors="replace")}
+        return entry
+
+    @staticmethod
+    def load_raw_responses(path: str) -> List[Dict]:
+        """
+        The raw responses of a saved JSON dump, with delta-encoded stream snapshots
+        expanded back into their original data (bytes included).
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)["raw_responses"]
+        decoder = SnapshotDecoder()
+        expanded = []
+        for entry in entries:
+            if "snapshot" in entry:
+                entry = {
+                    "timestamp": entry["timestamp"],
+                    "endpoint": entry["endpoint"],
+                    "data": decoder.decode(entry.get("request"), from_json_safe(entry["snapshot"])),
+                }
+            expanded.append(entry)
+        return expanded
 
     def save_json_dump(self):
         """Save all data to JSON file."""
@@ -551,7 +1220,7 @@ class MetaAI:
                 "total_raw_responses": len(self.all_raw_responses),
                 "total_extracted_data": len(self.all_extracted_data),
             },
-            "raw_responses": self.all_raw_responses,
+            "raw_responses": [self._json_safe_entry(entry) for entry in self.all_raw_responses],
             "extracted_data": self.all_extracted_data,
         }
         
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+from typing import Dict, List, Optional
+
+import httpx
+import ujson as json
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class MediaDownloader:
+    """
+    Downloads generated media concurrently and stores it content-addressed on disk.
+
+    Files are streamed to a partial file in chunks, so an interrupted download is
+    resumed with a Range request on the next attempt. Once complete, a file is
+    renamed to the SHA-256 of its content; identical images are therefore stored
+    once, and URLs that were already fetched are skipped via a small index.
+    """
+
+    def __init__(
+        self,
+        directory: str = "media",
+        concurrency: int = 8,
+        chunk_size: int = 64 * 1024,
+        max_retries: int = 3,
+        timeout: float = 60.0,
+        proxy: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        """
+        Args:
+            directory (str): Where downloaded files are stored.
+            concurrency (int): Maximum number of simultaneous downloads.
+            chunk_size (int): Size of the chunks streamed to disk.
+            max_retries (int): Retries per URL after the first attempt.
+            timeout (float): Timeout for a single HTTP request.
+            proxy (str): Optional proxy for the downloads.
+            client (httpx.AsyncClient): Reuse an existing client instead of creating one.
+        """
+        self.directory = directory
+        self.partial_directory = os.path.join(directory, ".partial")
+        self.index_file = os.path.join(directory, "index.json")
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._owns_client = client is None
+        if client is None:
+            client_kwargs = {"timeout": timeout, "follow_redirects": True}
+            if proxy:
+                client_kwargs["proxy"] = proxy
+            client = httpx.AsyncClient(**client_kwargs)
+        self.client = client
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        os.makedirs(self.partial_directory, exist_ok=True)
+        self._index: Dict[str, str] = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """Close the HTTP client if it was created by the downloader."""
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def download(self, medias: List[Dict]) -> List[Dict]:
+        """
+        Downloads every media item concurrently.
+
+        Args:
+            medias (List[Dict]): Media dicts as returned by MetaAI.extract_media.
+
+        Returns:
+            List[Dict]: Copies of the media dicts with a "path" key (None when the
+                download failed) and an "error" key on failure.
+        """
+        results = await asyncio.gather(
+            *(self.fetch(media["url"]) for media in medias), return_exceptions=True
+        )
+        downloaded = []
+        for media, result in zip(medias, results):
+            item = dict(media)
+            if isinstance(result, BaseException):
+                item["path"] = None
+                item["error"] = str(result)
+            else:
+                item["path"] = result
+            downloaded.append(item)
+        self._save_index()
+        return downloaded
+
+    async def fetch(self, url: str) -> str:
+        """
+        Downloads a single URL, sharing the work with concurrent calls for the same URL.
+
+        Args:
+            url (str): The media URL.
+
+        Returns:
+            str: The local path of the content-addressed file.
+        """
+        known = self._index.get(url)
+        if known and os.path.exists(os.path.join(self.directory, known)):
+            return os.path.join(self.directory, known)
+
+        task = self._in_flight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._fetch_with_retries(url))
+            self._in_flight[url] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_with_retries(self, url: str) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    return await self._fetch_once(url)
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code not in RETRYABLE_STATUS:
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = 0.5 * 2 ** attempt
+                logger.warning(f"Download of {url} failed ({e}), retry {attempt} in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def _fetch_once(self, url: str) -> str:
+        partial_path = os.path.join(
+            self.partial_directory, hashlib.sha256(url.encode()).hexdigest() + ".part"
+        )
+        digest = hashlib.sha256()
+        offset = 0
+        if os.path.exists(partial_path):
+            with open(partial_path, "rb") as f:
+                for block in iter(lambda: f.read(self.chunk_size), b""):
+                    digest.update(block)
+                    offset += len(block)
+
+        # The content type of the first response, for when a later attempt gets no body
+        type_path = partial_path[:-len(".part")] + ".type"
+        headers = {"range": f"bytes={offset}-"} if offset else {}
+        async with self.client.stream("GET", url, headers=headers) as response:
+            content_type = response.headers.get("content-type", "").split(";")[0].strip()
+            # 416: the partial file already holds the whole body
+            if response.status_code != 416:
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    # Range was ignored; start over
+                    offset = 0
+                    digest = hashlib.sha256()
+                if content_type:
+                    with open(type_path, "w", encoding="utf-8") as f:
+                        f.write(content_type)
+                with open(partial_path, "ab" if offset else "wb") as f:
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+        if response.status_code == 416:
+            content_type = await self._partial_content_type(url, type_path)
+
+        extension = mimetypes.guess_extension(content_type) or ".bin"
+        if extension == ".jpe":
+            extension = ".jpg"
+        filename = digest.hexdigest() + extension
+        final_path = os.path.join(self.directory, filename)
+        if os.path.exists(final_path):
+            logger.debug(f"Skipping duplicate content for {url}")
+            os.remove(partial_path)
+        else:
+            os.replace(partial_path, final_path)
+        if os.path.exists(type_path):
+            os.remove(type_path)
+        self._index[url] = filename
+        return final_path
+
+    async def _partial_content_type(self, url: str, type_path: str) -> str:
+        """The content type recorded with a partial file, or else the one a HEAD request reports."""
+        if os.path.exists(type_path):
+            with open(type_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        try:
+            response = await self.client.head(url)
+        except httpx.TransportError as e:
+            logger.debug(f"HEAD {url} failed: {e}")
+            return ""
+        return response.headers.get("content-type", "").split(";")[0].strip()
+
+    def _save_index(self):
+        tmp_path = f"{self.index_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_file)
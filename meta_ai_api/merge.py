@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from contextlib import aclosing, nullcontext
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Mapping, Optional, Union
+
+from meta_ai_api.limiter import AdaptiveLimiter
+from meta_ai_api.main import MetaAI
+
+logger = logging.getLogger(__name__)
+
+StreamSource = Union[AsyncIterator, Callable[[], AsyncIterator]]
+
+
+async def merge_streams(
+    streams: Mapping[Hashable, StreamSource],
+    max_buffer: int = 64,
+    concurrency: Optional[int] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+):
+    """
+    Runs many async iterators concurrently and yields their items as one stream.
+
+    Every item is tagged with the key of the stream it came from, in arrival order:
+        {"stream": key, "event": "chunk", "chunk": item}
+        {"stream": key, "event": "done"}
+        {"stream": key, "event": "error", "error": exception}
+
+    All streams share one bounded buffer, so a slow consumer holds back every
+    producer. A failing stream ends with an error event and the others keep going.
+    Leaving the loop early cancels and closes every stream still running.
+
+    Args:
+        streams: Async iterators by key, or zero-argument callables that create them;
+            callables are only invoked once the stream may start.
+        max_buffer (int): Items buffered ahead of the consumer across all streams.
+        concurrency (int): Maximum number of streams running at once (default: all).
+        limiter (AdaptiveLimiter): Adapts the number of streams running at once from
+            their durations and failures, within `concurrency`; the time a stream
+            waits for buffer space does not count towards its duration.
+
+    Yields:
+        Dict: Tagged chunk, done and error events.
+    """
+    buffer: asyncio.Queue = asyncio.Queue(max_buffer)
+    limit = asyncio.Semaphore(concurrency) if concurrency else None
+
+    async def pump(key: Hashable, source: StreamSource):
+        try:
+            if limit is not None:
+                await limit.acquire()
+            try:
+                async with limiter.slot() if limiter is not None else nullcontext() as permit:
+                    iterator = source() if callable(source) else source
+                    async with aclosing(iterator) as chunks:
+                        async for chunk in chunks:
+                            blocked = time.monotonic()
+                            await buffer.put({"stream": key, "event": "chunk", "chunk": chunk})
+                            if permit is not None:
+                                # Waiting for the consumer is not upstream latency
+                                permit.started += time.monotonic() - blocked
+            finally:
+                if limit is not None:
+                    limit.release()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Stream {key!r} failed: {e!r}")
+            await buffer.put({"stream": key, "event": "error", "error": e})
+        else:
+            await buffer.put({"stream": key, "event": "done"})
+
+    tasks: List[asyncio.Task] = [asyncio.create_task(pump(key, source)) for key, source in streams.items()]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            item = await buffer.get()
+            if item["event"] != "chunk":
+                remaining -= 1
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def stream_many(
+    sessions: List[MetaAI],
+    prompts: Mapping[Hashable, str],
+    max_buffer: int = 64,
+    limiter: Optional[AdaptiveLimiter] = None,
+    **prompt_kwargs,
+):
+    """
+    Streams many prompts at once over a pool of initialized sessions.
+
+    Each prompt starts a new conversation and holds one session for its duration,
+    so at most len(sessions) prompts run concurrently.
+
+    Args:
+        sessions (List[MetaAI]): Initialized sessions to run the prompts on.
+        prompts: Prompt messages by key; the key tags every event of that prompt.
+        max_buffer (int): Chunks buffered ahead of the consumer across all prompts.
+        limiter (AdaptiveLimiter): Adapts how many of the sessions prompt at once.
+        **prompt_kwargs: Further arguments for MetaAI.prompt.
+
+    Yields:
+        Dict: Tagged events as produced by merge_streams.
+    """
+    idle: asyncio.Queue = asyncio.Queue()
+    for ai in sessions:
+        idle.put_nowait(ai)
+
+    def factory(message: str) -> Callable[[], AsyncIterator]:
+        async def run():
+            ai = await idle.get()
+            try:
+                async with aclosing(ai.prompt(message, stream=True, new_conversation=True, **prompt_kwargs)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+            finally:
+                idle.put_nowait(ai)
+
+        return run
+
+    streams: Dict[Hashable, StreamSource] = {key: factory(message) for key, message in prompts.items()}
+    async with aclosing(merge_streams(streams, max_buffer, concurrency=len(sessions), limiter=limiter)) as events:
+        async for event in events:
+            yield event
@@ -0,0 +1,137 @@
+from typing import Dict, List, Optional
+
+
+def _field(name: str) -> property:
+    """Attribute access to one of the dict keys of a record."""
+    return property(
+        lambda self: dict.__getitem__(self, name),
+        lambda self, value: dict.__setitem__(self, name, value),
+        doc=f"The {name!r} item.",
+    )
+
+
+class _Record(dict):
+    """
+    Base for the compact result types.
+
+    The records are the plain dicts they replace, so indexing, item assignment,
+    json.dumps() and isinstance(r, dict) keep working, with attribute access to the
+    known fields on top. __slots__ keeps the extras (the raw payload, flags) out of
+    a per-instance __dict__. The raw payload is only kept when requested and is not
+    one of the items, but its keys answer r[key], r.get(key) and `key in r` for
+    anything the record does not hold itself.
+    """
+
+    __slots__ = ("raw",)
+    _fields: tuple = ()
+
+    def __missing__(self, key):
+        if self.raw is not None and key in self.raw:
+            return self.raw[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key) -> bool:
+        return dict.__contains__(self, key) or (self.raw is not None and key in self.raw)
+
+    def to_dict(self) -> Dict:
+        """A plain copy, with nested records converted as well."""
+        return {key: to_plain(value) for key, value in self.items()}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class Media(_Record):
+    """A generated image or video from an imagine_card."""
+
+    __slots__ = ()
+    url = _field("url")
+    type = _field("type")
+    prompt = _field("prompt")
+
+    def __init__(self, url: Optional[str], type: Optional[str] = None, prompt: Optional[str] = None, raw: Optional[Dict] = None):
+        super().__init__(url=url, type=type, prompt=prompt)
+        self.raw = raw
+
+    @classmethod
+    def from_payload(cls, media: Dict, keep_raw: bool = False) -> "Media":
+        return cls(media.get("uri"), media.get("media_type"), media.get("prompt"), media if keep_raw else None)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Media":
+        return cls(data.get("url"), data.get("type"), data.get("prompt"))
+
+
+class Source(_Record):
+    """A search reference attached to an answer."""
+
+    __slots__ = ()
+    title = _field("title")
+    link = _field("link")
+
+    def __init__(self, title: Optional[str], link: Optional[str], raw: Optional[Dict] = None):
+        super().__init__(title=title, link=link)
+        self.raw = raw
+
+    @classmethod
+    def from_payload(cls, reference: Dict, keep_raw: bool = False) -> "Source":
+        return cls(reference.get("title"), reference.get("link"), reference if keep_raw else None)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Source":
+        return cls(data.get("title"), data.get("link"))
+
+
+class PromptResult(_Record):
+    """
+    One extracted chunk (or the final answer) of a prompt.
+
+    done is True for the chunk the server marked OVERALL_DONE; like raw, it is not
+    one of the items.
+    """
+
+    __slots__ = ("done",)
+    message = _field("message")
+    sources = _field("sources")
+    media = _field("media")
+    uuid = _field("uuid")
+
+    def __init__(
+        self,
+        message: str,
+        sources: List[Source],
+        media: List[Media],
+        uuid: Optional[str],
+        raw: Optional[Dict] = None,
+        done: bool = False,
+    ):
+        super().__init__(message=message, sources=sources, media=media, uuid=uuid)
+        self.raw = raw
+        self.done = done
+
+    @classmethod
+    def from_dict(cls, data: Dict, done: bool = False) -> "PromptResult":
+        return cls(
+            data.get("message", ""),
+            [Source.from_dict(source) for source in data.get("sources", [])],
+            [Media.from_dict(media) for media in data.get("media", [])],
+            data.get("uuid"),
+            done=done,
+        )
+
+
+def to_plain(value):
+    """Recursively converts result types inside lists and dicts to plain dicts."""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+from meta_ai_api.decoding import DECODERS, LineDecoder
+
+logger = logging.getLogger(__name__)
+
+_worker_decoders: Dict[str, LineDecoder] = {}
+
+
+def _decode_line(decoder_name: str, line: Union[str, bytes]) -> Dict:
+    """Decodes a line in a worker process, reusing one decoder per backend."""
+    decoder = _worker_decoders.get(decoder_name)
+    if decoder is None:
+        decoder = _worker_decoders[decoder_name] = DECODERS[decoder_name]()
+    return decoder.decode(line)
+
+
+class Offloader:
+    """
+    Moves CPU-heavy parsing and dump serialization off the event loop.
+
+    Payloads below `threshold` bytes are still handled inline, where a thread handoff
+    would cost more than it saves. Larger ones are parsed on a thread pool, and the
+    largest (from `process_threshold`) on a process pool when `processes` is set, so
+    they do not hold the GIL either. Dump formatting and file writes go to a single
+    writer thread, which keeps them in order.
+
+    Pass it to MetaAI(offload=...); one Offloader can be shared by many sessions.
+    """
+
+    def __init__(
+        self,
+        threads: int = 4,
+        processes: int = 0,
+        threshold: int = 64 * 1024,
+        process_threshold: int = 1024 * 1024,
+    ):
+        """
+        Args:
+            threads (int): Parser threads.
+            processes (int): Parser processes for very large payloads (0 to disable).
+            threshold (int): Payload size in bytes from which parsing leaves the loop.
+            process_threshold (int): Payload size in bytes from which the process pool is used.
+        """
+        self.threshold = threshold
+        self.process_threshold = process_threshold
+        self._threads = ThreadPoolExecutor(threads, thread_name_prefix="meta-ai-parse")
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="meta-ai-dump")
+        self._processes: Optional[Executor] = None
+        if processes > 0:
+            self._processes = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        self.offloaded = 0
+
+    async def call(self, func: Callable, *args, size: int = 0):
+        """Runs func(*args) on the parser threads if size reaches the threshold, else inline."""
+        if size < self.threshold:
+            return func(*args)
+        self.offloaded += 1
+        return await asyncio.get_running_loop().run_in_executor(self._threads, func, *args)
+
+    async def decode(self, decoder: LineDecoder, line: Union[str, bytes]) -> Dict:
+        """Decodes a stream line inline, on a thread or in a process depending on its size."""
+        size = len(line)
+        if size < self.threshold:
+            return decoder.decode(line)
+        self.offloaded += 1
+        loop = asyncio.get_running_loop()
+        if self._processes is not None and size >= self.process_threshold and decoder.name in DECODERS:
+            return await loop.run_in_executor(self._processes, _decode_line, decoder.name, line)
+        return await loop.run_in_executor(self._threads, decoder.decode, line)
+
+    def write(self, func: Callable, *args):
+        """Queues a dump write; failures are logged."""
+        future = self._writer.submit(func, *args)
+        future.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Offloaded dump write failed: {future.exception()!r}")
+
+    def flush(self):
+        """Blocks until every queued write has been written."""
+        self._writer.submit(lambda: None).result()
+
+    def close(self):
+        """Finishes queued writes and stops the pools."""
+        self._writer.shutdown(wait=True)
+        self._threads.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
+
+
+class LoopWatchdog:
+    """
+    Reports event-loop stalls and the call that caused them.
+
+    A heartbeat task on the loop records when it last ran; a monitor thread checks it
+    and, once the loop has been blocked for longer than `threshold` seconds, samples
+    the loop thread's stack so the blocking call shows up in the report. Each stall is
+    reported once, when first detected.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.02,
+        on_stall: Optional[Callable[[float, List[str]], None]] = None,
+    ):
+        """
+        Args:
+            threshold (float): Seconds the loop may be blocked before it is reported.
+            interval (float): Heartbeat and check interval in seconds.
+            on_stall (Callable): Called with (seconds blocked so far, formatted stack);
+                defaults to a warning log.
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.on_stall = on_stall or self._log_stall
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def _log_stall(blocked: float, stack: List[str]):
+        logger.warning(f"Event loop blocked for {blocked * 1000:.0f} ms in:\n{''.join(stack)}")
+
+    async def start(self):
+        """Starts watching the running loop."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name="meta-ai-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self._beat = time.monotonic()
+            self.max_lag = max(self.max_lag, self._beat - expected)
+
+    def _monitor(self):
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            try:
+                self.on_stall(blocked, stack)
+            except Exception:
+                logger.exception("Loop watchdog callback failed")
+
+    async def close(self):
+        """Stops watching."""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, float]:
+        return {"stalls": self.stalls, "max_lag": self.max_lag}
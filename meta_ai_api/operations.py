@@ -0,0 +1,226 @@
+import os
+import urllib.parse
+from typing import Dict, Iterable, List, Optional, Union
+
+import ujson as json
+
+# Overrides for rotated doc_ids: "friendly_name=doc_id" pairs separated by commas,
+# or a path to a JSON file mapping friendly names to doc_ids.
+DOC_IDS_ENV = "META_AI_DOC_IDS"
+DOC_IDS_FILE_ENV = "META_AI_DOC_IDS_FILE"
+
+
+class Slot:
+    """A variable that is substituted into a compiled operation body on every call."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def marker(self) -> str:
+        return f"\x01{self.name}\x01"
+
+
+class Operation:
+    """
+    One persisted GraphQL operation: its friendly name, doc_id and variables.
+
+    The form body is url-encoded once into a template per set of auth fields; a call
+    only JSON-encodes and quotes the Slot values and joins the pre-encoded parts.
+    """
+
+    def __init__(
+        self,
+        friendly_name: str,
+        doc_id: str,
+        variables: Union[Dict, str],
+        server_timestamps: bool = True,
+    ):
+        """
+        Args:
+            friendly_name (str): The fb_api_req_friendly_name of the operation.
+            doc_id (str): The persisted query id.
+            variables: The variables dict, with Slot values for the parts that change per
+                call, or an already encoded string.
+            server_timestamps (bool): Send server_timestamps=true.
+        """
+        self.friendly_name = friendly_name
+        self.doc_id = doc_id
+        self.variables = variables
+        self.server_timestamps = server_timestamps
+        self._templates: Dict[tuple, tuple] = {}
+
+    def _compile(self, auth_fields: tuple) -> tuple:
+        slots = {}
+        variables = self.variables
+        if isinstance(variables, dict):
+            variables = {key: value.marker() if isinstance(value, Slot) else value for key, value in variables.items()}
+            for key, value in self.variables.items():
+                if isinstance(value, Slot):
+                    slots[urllib.parse.quote_plus(json.dumps(value.marker()))] = value.name
+            variables = json.dumps(variables)
+
+        fields = [(field, Slot(field).marker()) for field in auth_fields]
+        fields += [
+            ("fb_api_caller_class", "RelayModern"),
+            ("fb_api_req_friendly_name", self.friendly_name),
+            ("variables", variables),
+        ]
+        if self.server_timestamps:
+            fields.append(("server_timestamps", "true"))
+        fields.append(("doc_id", self.doc_id))
+        body = urllib.parse.urlencode(fields)
+
+        auth_markers = {urllib.parse.quote_plus(Slot(field).marker()): field for field in auth_fields}
+        # Split the encoded body at every marker: (literal, slot, literal, slot, ..., literal)
+        parts: List = [body]
+        for marker, name in list(slots.items()) + list(auth_markers.items()):
+            split = []
+            for part in parts:
+                if isinstance(part, str) and marker in part:
+                    pieces = part.split(marker)
+                    for piece in pieces[:-1]:
+                        split += [piece, (name, marker in auth_markers)]
+                    split.append(pieces[-1])
+                else:
+                    split.append(part)
+            parts = split
+        return tuple(part.encode("ascii") if isinstance(part, str) else part for part in parts)
+
+    def body(self, auth: Optional[Dict[str, str]] = None, **values) -> bytes:
+        """
+        Renders the url-encoded request body.
+
+        Args:
+            auth: Auth form fields sent ahead of the operation (e.g. access_token, lsd).
+            **values: Values for the Slot variables.
+
+        Returns:
+            bytes: The form body.
+        """
+        auth = auth or {}
+        key = tuple(auth)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = self._compile(key)
+        out = []
+        for part in template:
+            if isinstance(part, bytes):
+                out.append(part)
+                continue
+            name, is_auth = part
+            if is_auth:
+                value = urllib.parse.quote_plus(str(auth[name]))
+            else:
+                value = urllib.parse.quote_plus(json.dumps(values[name]))
+            out.append(value.encode("ascii"))
+        return b"".join(out)
+
+    def __repr__(self) -> str:
+        return f"Operation({self.friendly_name!r}, doc_id={self.doc_id!r})"
+
+
+def _send_message() -> Operation:
+    return Operation(
+        "useAbraSendMessageMutation",
+        "7783822248314888",
+        {
+            "message": Slot("message"),
+            "externalConversationId": Slot("external_conversation_id"),
+            "offlineThreadingId": Slot("offline_threading_id"),
+            "suggestedPromptIndex": None,
+            "flashVideoRecapInput": {"images": []},
+            "flashPreviewInput": None,
+            "promptPrefix": None,
+            "entrypoint": "ABRA__CHAT__TEXT",
+            "icebreaker_type": "TEXT",
+            "__relay_internal__pv__AbraDebugDevOnlyrelayprovider": False,
+            "__relay_internal__pv__WebPixelRatiorelayprovider": 1,
+        },
+    )
+
+
+def _accept_tos() -> Operation:
+    # The variables of this mutation have always gone out as the Python repr of the dict
+    return Operation(
+        "useAbraAcceptTOSForTempUserMutation",
+        "7604648749596940",
+        str({
+            "dob": "1999-01-01",
+            "icebreaker_type": "TEXT",
+            "__relay_internal__pv__WebPixelRatiorelayprovider": 1,
+        }),
+        server_timestamps=False,
+    )
+
+
+def _search_plugin() -> Operation:
+    return Operation(
+        "AbraSearchPluginDialogQuery",
+        "6946734308765963",
+        {"abraMessageFetchID": Slot("fetch_id")},
+    )
+
+
+class OperationRegistry:
+    """
+    The GraphQL operations used by the client, by friendly name.
+
+    Meta rotates doc_ids from time to time; override them with the META_AI_DOC_IDS
+    environment variable ("useAbraSendMessageMutation=123,..."), a JSON file named by
+    META_AI_DOC_IDS_FILE, or override() at runtime.
+    """
+
+    def __init__(self, operations: Iterable[Operation]):
+        self._operations = {operation.friendly_name: operation for operation in operations}
+
+    @classmethod
+    def default(cls, environ: Optional[Dict[str, str]] = None) -> "OperationRegistry":
+        """The built-in operations with any doc_id overrides from the environment applied."""
+        environ = os.environ if environ is None else environ
+        registry = cls([_send_message(), _accept_tos(), _search_plugin()])
+        path = environ.get(DOC_IDS_FILE_ENV)
+        if path:
+            registry.load(path)
+        pairs = environ.get(DOC_IDS_ENV)
+        if pairs:
+            for pair in pairs.split(","):
+                name, _, doc_id = pair.partition("=")
+                if not doc_id:
+                    raise ValueError(f"Invalid {DOC_IDS_ENV} entry: {pair!r}")
+                registry.override(name.strip(), doc_id.strip())
+        return registry
+
+    def __getitem__(self, friendly_name: str) -> Operation:
+        return self._operations[friendly_name]
+
+    def __contains__(self, friendly_name: str) -> bool:
+        return friendly_name in self._operations
+
+    def override(self, friendly_name: str, doc_id: str):
+        """Points an operation at a new doc_id."""
+        operation = self._operations[friendly_name]
+        operation.doc_id = str(doc_id)
+        operation._templates.clear()
+
+    def load(self, path: str):
+        """Applies doc_id overrides from a JSON file of {friendly_name: doc_id}."""
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        for friendly_name, doc_id in overrides.items():
+            self.override(friendly_name, doc_id)
+
+    def doc_ids(self) -> Dict[str, str]:
+        return {name: operation.doc_id for name, operation in self._operations.items()}
+
+
+_default: Optional[OperationRegistry] = None
+
+
+def get_operations() -> OperationRegistry:
+    """The process-wide registry, built from the environment on first use."""
+    global _default
+    if _default is None:
+        _default = OperationRegistry.default()
+    return _default
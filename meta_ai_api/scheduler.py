@@ -0,0 +1,355 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Hashable, Optional, Sequence, Union
+
+from meta_ai_api.exceptions import SchedulerRejected
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "batch")
+# Wait times kept per tenant and class for the percentiles in stats()
+WAIT_SAMPLES = 1024
+
+
+class TenantQuota:
+    """
+    Share and limits of one tenant.
+
+    weight: share of the capacity relative to the other tenants of a class.
+    max_concurrency: calls of the tenant running at once (None for no limit).
+    rate: calls started per second, with bursts of up to `burst` (None for no limit).
+    max_queue: calls of the tenant waiting at once; beyond it acquire() is rejected.
+    """
+
+    def __init__(
+        self,
+        weight: float = 1.0,
+        max_concurrency: Optional[int] = None,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_queue: int = 1000,
+    ):
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate or 1.0)
+        self.max_queue = max_queue
+
+
+class Ticket:
+    """An admitted call; hand it back to Scheduler.release()."""
+
+    __slots__ = ("tenant", "priority", "enqueued", "started", "finish", "future")
+
+    def __init__(self, tenant: Hashable, priority: int, enqueued: float):
+        self.tenant = tenant
+        self.priority = priority
+        self.enqueued = enqueued
+        self.started: Optional[float] = None
+        self.finish = 0.0
+        self.future: Optional[asyncio.Future] = None
+
+
+class _Waits:
+    """Recent wait times and counters."""
+
+    def __init__(self):
+        self.samples: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.admitted = 0
+        self.rejected = 0
+        self.abandoned = 0
+
+    def stats(self) -> Dict:
+        ordered = sorted(self.samples)
+        stats = {"admitted": self.admitted, "rejected": self.rejected, "abandoned": self.abandoned}
+        if ordered:
+            stats["wait"] = {
+                "mean": sum(ordered) / len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p90": ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))],
+                "p99": ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))],
+                "max": ordered[-1],
+            }
+        return stats
+
+
+class _Tenant:
+    def __init__(self, quota: TenantQuota):
+        self.quota = quota
+        # One FIFO per priority class
+        self.queues: Dict[int, Deque[Ticket]] = {}
+        self.queued = 0
+        self.running = 0
+        self.last_finish: Dict[int, float] = {}
+        self.tokens = quota.burst
+        self.refilled = time.monotonic()
+        self.waits = _Waits()
+
+    def refill(self, now: float):
+        if self.quota.rate is not None:
+            self.tokens = min(self.quota.burst, self.tokens + (now - self.refilled) * self.quota.rate)
+        self.refilled = now
+
+    def blocked_for(self, now: float) -> float:
+        """Seconds until the tenant may start another call; 0 when it may now."""
+        quota = self.quota
+        if quota.max_concurrency is not None and self.running >= quota.max_concurrency:
+            return float("inf")
+        if quota.rate is not None:
+            self.refill(now)
+            if self.tokens < 1.0:
+                return (1.0 - self.tokens) / quota.rate
+        return 0.0
+
+
+class Scheduler:
+    """
+    Admission in front of a shared capacity (sessions, identities), by priority class
+    and tenant.
+
+    Classes are served in strict priority order: a call of a lower class only starts
+    while no call of a higher class is waiting, so interactive traffic never queues
+    behind a batch burst. Within a class, tenants share the capacity by weight with
+    start-time fair queueing: every queued call is tagged with a virtual finish time
+    of max(class clock, tenant's previous tag) + 1 / weight, and the smallest tag
+    goes first, so a tenant with a deep queue cannot crowd out one that just
+    arrived. Tenants over their concurrency or rate quota are skipped until they are
+    within it again.
+
+    Beyond max_idle_tenants tenants without queued or running calls, the least
+    recently active ones are forgotten; one that comes back starts with a fresh fair
+    share tag, rate bucket and wait stats.
+    """
+
+    def __init__(
+        self,
+        capacity: Union[int, Callable[[], int]] = 4,
+        priorities: Sequence[str] = PRIORITIES,
+        default_quota: Optional[TenantQuota] = None,
+        quotas: Optional[Dict[Hashable, TenantQuota]] = None,
+        max_idle_tenants: int = 1024,
+    ):
+        """
+        Args:
+            capacity: Calls running at once, or a callable returning the current
+                value (e.g. lambda: limiter.limit).
+            priorities (Sequence[str]): Class names, highest priority first.
+            default_quota (TenantQuota): Quota of tenants without their own.
+            quotas (Dict): TenantQuota by tenant key.
+            max_idle_tenants (int): Idle tenants kept before the oldest are forgotten.
+        """
+        self._capacity = capacity if callable(capacity) else (lambda: capacity)
+        self.priorities = tuple(priorities)
+        self.default_quota = default_quota or TenantQuota()
+        self.quotas: Dict[Hashable, TenantQuota] = dict(quotas or {})
+        self.tenants: Dict[Hashable, _Tenant] = {}
+        self.max_idle_tenants = max_idle_tenants
+        # Tenants without queued or running calls, least recently active first
+        self._idle: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.running = 0
+        self.queued = [0] * len(self.priorities)
+        self._clock = [0.0] * len(self.priorities)
+        self._class_waits = [_Waits() for _ in self.priorities]
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity()
+
+    def set_quota(self, tenant: Hashable, quota: TenantQuota):
+        """Sets the quota of a tenant; takes effect for its next call."""
+        self.quotas[tenant] = quota
+        if tenant in self.tenants:
+            self.tenants[tenant].quota = quota
+        self._dispatch()
+
+    def _tenant(self, tenant: Hashable) -> _Tenant:
+        state = self.tenants.get(tenant)
+        if state is None:
+            state = self.tenants[tenant] = _Tenant(self.quotas.get(tenant, self.default_quota))
+        self._idle.pop(tenant, None)
+        return state
+
+    def _settle(self, tenant: Hashable, state: _Tenant):
+        """Marks a tenant idle once it has no calls left, forgetting the oldest idle ones."""
+        if state.queued or state.running:
+            return
+        self._idle[tenant] = None
+        self._idle.move_to_end(tenant)
+        while len(self._idle) > self.max_idle_tenants:
+            evicted, _ = self._idle.popitem(last=False)
+            del self.tenants[evicted]
+
+    def _priority(self, priority: Optional[str]) -> int:
+        if priority is None:
+            return 0
+        try:
+            return self.priorities.index(priority)
+        except ValueError:
+            raise ValueError(f"Unknown priority {priority!r}, use one of {self.priorities}")
+
+    async def acquire(self, tenant: Hashable = None, priority: Optional[str] = None) -> Ticket:
+        """
+        Waits until a call of a tenant may start.
+
+        Args:
+            tenant (Hashable): Tenant key (API key, user, job); None for a shared default.
+            priority (str): Class name; defaults to the highest.
+
+        Returns:
+            Ticket: To be handed to release() when the call is done.
+
+        Raises:
+            SchedulerRejected: The tenant already has max_queue calls waiting.
+        """
+        level = self._priority(priority)
+        state = self._tenant(tenant)
+        ticket = Ticket(tenant, level, time.monotonic())
+        if state.queued >= state.quota.max_queue:
+            state.waits.rejected += 1
+            self._class_waits[level].rejected += 1
+            self._settle(tenant, state)
+            raise SchedulerRejected(f"Tenant {tenant!r} has {state.queued} calls queued already")
+
+        start = max(self._clock[level], state.last_finish.get(level, 0.0))
+        ticket.finish = state.last_finish[level] = start + 1.0 / state.quota.weight
+        ticket.future = asyncio.get_running_loop().create_future()
+        state.queues.setdefault(level, deque()).append(ticket)
+        state.queued += 1
+        self.queued[level] += 1
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Started just before the cancellation
+                self.release(ticket)
+            else:
+                self._remove(state, ticket)
+                state.waits.abandoned += 1
+                self._class_waits[level].abandoned += 1
+                self._settle(tenant, state)
+            raise
+        return ticket
+
+    def _remove(self, state: _Tenant, ticket: Ticket):
+        queue = state.queues.get(ticket.priority)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            state.queued -= 1
+            self.queued[ticket.priority] -= 1
+            self._dispatch()
+
+    def release(self, ticket: Ticket):
+        """Ends a call started by acquire() and lets the next one start."""
+        if ticket.started is None:
+            return
+        ticket.started = None
+        self.running -= 1
+        state = self.tenants[ticket.tenant]
+        state.running -= 1
+        self._dispatch()
+        self._settle(ticket.tenant, state)
+
+    @asynccontextmanager
+    async def slot(self, tenant: Hashable = None, priority: Optional[str] = None):
+        """Holds a started call for the body of an `async with`."""
+        ticket = await self.acquire(tenant, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _next(self, now: float):
+        """The next ticket to start, and otherwise the seconds until a rate quota allows one."""
+        retry = None
+        for level in range(len(self.priorities)):
+            if not self.queued[level]:
+                continue
+            best = None
+            for state in self.tenants.values():
+                queue = state.queues.get(level)
+                if not queue:
+                    continue
+                blocked = state.blocked_for(now)
+                if blocked:
+                    if blocked != float("inf"):
+                        retry = blocked if retry is None else min(retry, blocked)
+                    continue
+                if best is None or queue[0].finish < best.finish:
+                    best = queue[0]
+            if best is not None:
+                return best, None
+            # A higher class whose tenants are all over quota does not hold up lower classes
+        return None, retry
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self.running < self.capacity:
+            ticket, retry = self._next(now)
+            if ticket is None:
+                if retry is not None and self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(retry, self._on_timer)
+                return
+            state = self.tenants[ticket.tenant]
+            state.queues[ticket.priority].popleft()
+            state.queued -= 1
+            self.queued[ticket.priority] -= 1
+            if ticket.future.done():
+                # Cancelled while queued; acquire() counts it as abandoned
+                continue
+            # The class clock follows the start tag of the call that was picked
+            self._clock[ticket.priority] = max(
+                self._clock[ticket.priority], ticket.finish - 1.0 / state.quota.weight
+            )
+            if state.quota.rate is not None:
+                state.tokens -= 1.0
+            state.running += 1
+            self.running += 1
+            ticket.started = now
+            waited = now - ticket.enqueued
+            for waits in (state.waits, self._class_waits[ticket.priority]):
+                waits.admitted += 1
+                waits.samples.append(waited)
+            ticket.future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self) -> Dict:
+        """Queue depths, running calls and wait times, overall, per class and per tenant."""
+        return {
+            "capacity": self.capacity,
+            "running": self.running,
+            "queued": sum(self.queued),
+            "classes": {
+                name: {"queued": self.queued[level], **self._class_waits[level].stats()}
+                for level, name in enumerate(self.priorities)
+            },
+            "tenants": {
+                str(tenant): {"queued": state.queued, "running": state.running, **state.waits.stats()}
+                for tenant, state in self.tenants.items()
+            },
+        }
+
+
+def parse_quota(spec: str):
+    """
+    Parses a --quota option of the form TENANT=WEIGHT[:CONCURRENCY[:RATE]]; empty
+    fields keep their defaults, e.g. "nightly=0.5::2" or "alice=2:4".
+    """
+    tenant, separator, values = spec.partition("=")
+    if not separator or not tenant:
+        raise ValueError(f"Expected TENANT=WEIGHT[:CONCURRENCY[:RATE]], got {spec!r}")
+    fields = (values.split(":") + ["", "", ""])[:3]
+    return tenant, TenantQuota(
+        weight=float(fields[0]) if fields[0] else 1.0,
+        max_concurrency=int(fields[1]) if fields[1] else None,
+        rate=float(fields[2]) if fields[2] else None,
+    )
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import time
+from typing import Callable, Dict, List, Optional
+
+from meta_ai_api.batch import PromptExecutor, Throttle, affinity
+from meta_ai_api.limiter import AdaptiveLimiter
+
+logger = logging.getLogger(__name__)
+
+# How long blocking queue reads wait before re-checking for shutdown
+POLL_INTERVAL = 0.5
+
+
+def _worker_main(shard: int, inbox, outbox, options: Dict):
+    """Entry point of a worker process: one event loop, its own sessions and connections."""
+    asyncio.run(_worker_loop(shard, inbox, outbox, options))
+
+
+async def _worker_loop(shard: int, inbox, outbox, options: Dict):
+    executor = PromptExecutor(
+        lambda record: outbox.put(("result", shard, record)),
+        sessions=options["sessions"],
+        max_attempts=options["max_attempts"],
+        media_directory=options["media_directory"],
+        client_kwargs=options["client_kwargs"],
+        throttle=Throttle(min_delay=options["min_delay"]),
+        limiter=AdaptiveLimiter(**options["limiter"]) if options["limiter"] else None,
+        conversations=options["conversations"],
+    )
+
+    def snapshot() -> Dict:
+        metrics = {**executor.stats, "throttle_delay": executor.throttle.delay, "pid": os.getpid()}
+        if executor.limiter is not None:
+            metrics["limiter"] = executor.limiter.stats()
+        return metrics
+
+    async def report_metrics():
+        while True:
+            await asyncio.sleep(options["metrics_interval"])
+            outbox.put(("metrics", shard, snapshot()))
+
+    def next_item():
+        while True:
+            try:
+                return inbox.get(timeout=POLL_INTERVAL)
+            except queue_module.Empty:
+                continue
+
+    executor.start()
+    reporter = asyncio.create_task(report_metrics())
+    try:
+        while True:
+            item = await asyncio.to_thread(next_item)
+            if item is None:
+                break
+            await executor.submit(item)
+        await executor.join()
+    finally:
+        reporter.cancel()
+        executor.cancel()
+        outbox.put(("done", shard, snapshot()))
+
+
+class ShardedExecutor:
+    """
+    Spreads prompt items over a pool of worker processes.
+
+    Each worker runs its own event loop with its own MetaAI sessions and connection
+    pools, so JSON parsing, dumping and response formatting scale with the number of
+    cores. Items of the same conversation always land on the same worker (and the
+    same session inside it); stateless items go to the worker with the fewest
+    pending items. Results and per-worker metrics stream back to the parent. When a
+    worker stops early, the items it had not answered are reported as failed, as
+    are later items of its conversations.
+
+    It exposes the same start/submit/join/cancel interface as PromptExecutor.
+    """
+
+    def __init__(
+        self,
+        on_result: Callable[[Dict], None],
+        processes: Optional[int] = None,
+        sessions_per_process: int = 4,
+        max_pending_per_process: Optional[int] = None,
+        max_attempts: int = 3,
+        media_directory: Optional[str] = None,
+        client_kwargs: Optional[Dict] = None,
+        min_delay: float = 0.0,
+        metrics_interval: float = 5.0,
+        limiter: Optional[AdaptiveLimiter] = None,
+        conversations: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            on_result (Callable): Called in the parent with the result record of every item.
+            processes (int): Number of worker processes; defaults to the CPU count.
+            sessions_per_process (int): MetaAI sessions inside each worker.
+            max_pending_per_process (int): Items in flight per worker before submit() waits.
+            max_attempts (int): Attempts per item before it is reported as failed.
+            media_directory (str): Download generated media here when set.
+            client_kwargs (Dict): Keyword arguments for each MetaAI session; must be picklable.
+            min_delay (float): Minimum seconds between request starts within a worker.
+            metrics_interval (float): Seconds between metric reports from each worker.
+            limiter (AdaptiveLimiter): Template for the limiter of each worker; every
+                worker adapts its own, starting from these settings.
+            conversations (Dict): External conversation ids by conversation key to
+                resume; each worker gets the ones routed to it.
+        """
+        self.on_result = on_result
+        self.processes = processes or os.cpu_count() or 1
+        self.max_pending = max_pending_per_process or sessions_per_process * 4
+        self.options = {
+            "sessions": sessions_per_process,
+            "max_attempts": max_attempts,
+            "media_directory": media_directory,
+            "client_kwargs": client_kwargs or {},
+            "min_delay": min_delay,
+            "metrics_interval": metrics_interval,
+            "limiter": limiter.settings() if limiter is not None else None,
+        }
+        self.conversations = conversations or {}
+        self.pending: List[int] = [0] * self.processes
+        # Items sent to each worker and not answered yet, by id
+        self.in_flight: List[Dict[str, Dict]] = [{} for _ in range(self.processes)]
+        self.worker_metrics: Dict[int, Dict] = {}
+        self._finished = set()
+        self._inboxes = []
+        self._outbox = None
+        self._workers = []
+        self._collector: Optional[asyncio.Task] = None
+        self._capacity: Optional[asyncio.Condition] = None
+
+    def start(self):
+        # Spawn rather than fork: the parent may already be running an event loop and threads
+        context = multiprocessing.get_context("spawn")
+        self._outbox = context.Queue()
+        self._inboxes = [context.Queue() for _ in range(self.processes)]
+        self._workers = [
+            context.Process(
+                target=_worker_main,
+                args=(shard, inbox, self._outbox, {**self.options, "conversations": self._shard_conversations(shard)}),
+                name=f"meta-ai-shard-{shard}",
+                daemon=True,
+            )
+            for shard, inbox in enumerate(self._inboxes)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._capacity = asyncio.Condition()
+        self._collector = asyncio.create_task(self._collect())
+
+    def _shard_conversations(self, shard: int) -> Dict[str, str]:
+        return {
+            key: uuid for key, uuid in self.conversations.items() if affinity(key, self.processes) == shard
+        }
+
+    async def submit(self, item: Dict):
+        """Sends an item to its worker, waiting while that worker is saturated."""
+        if any(item["id"] in in_flight for in_flight in self.in_flight):
+            # The answer could not be told apart from that of the item already in flight
+            self.on_result(self._failed(item, f"An item with id {item['id']!r} is already in flight."))
+            return
+        live = [index for index in range(self.processes) if index not in self._finished]
+        if not live:
+            raise RuntimeError("All shard workers have stopped.")
+        if "conversation" in item:
+            shard = affinity(str(item["conversation"]), self.processes)
+        else:
+            shard = min(live, key=lambda index: self.pending[index])
+        async with self._capacity:
+            await self._capacity.wait_for(
+                lambda: self.pending[shard] < self.max_pending or shard in self._finished
+            )
+        if shard in self._finished:
+            # Only conversation items are pinned to a worker; they cannot move without its state
+            self.on_result(self._failed(item, f"Shard worker {shard} has stopped."))
+            return
+        self.pending[shard] += 1
+        self.in_flight[shard][item["id"]] = item
+        self._inboxes[shard].put(item)
+
+    @staticmethod
+    def _failed(item: Dict, error: str) -> Dict:
+        record = {"id": item["id"], "prompt": item["prompt"], "error": error, "attempts": 0}
+        if item.get("conversation") is not None:
+            record["conversation"] = item["conversation"]
+        return record
+
+    async def join(self):
+        """Waits for every submitted item and stops the workers."""
+        for inbox in self._inboxes:
+            inbox.put(None)
+        await self._collector
+        for worker in self._workers:
+            await asyncio.to_thread(worker.join)
+
+    def cancel(self):
+        if self._collector:
+            self._collector.cancel()
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    def _next_message(self):
+        while True:
+            try:
+                return self._outbox.get(timeout=POLL_INTERVAL)
+            except queue_module.Empty:
+                for shard, worker in enumerate(self._workers):
+                    if not worker.is_alive() and shard not in self._finished:
+                        return ("died", shard, {"exitcode": worker.exitcode})
+
+    async def _collect(self):
+        try:
+            while len(self._finished) < self.processes:
+                kind, shard, payload = await asyncio.to_thread(self._next_message)
+                if kind == "result":
+                    self.pending[shard] -= 1
+                    self.in_flight[shard].pop(payload["id"], None)
+                    self.on_result(payload)
+                else:
+                    self.worker_metrics[shard] = {**payload, "updated": time.time()}
+                    if kind in ("done", "died"):
+                        if kind == "died":
+                            logger.error(f"Shard {shard} exited unexpectedly: {payload}")
+                        self._finished.add(shard)
+                        self._fail_in_flight(shard, kind, payload)
+                async with self._capacity:
+                    self._capacity.notify_all()
+        finally:
+            async with self._capacity:
+                self._capacity.notify_all()
+
+    def _fail_in_flight(self, shard: int, kind: str, payload: Dict):
+        """Reports the items a stopped worker never answered as failed, to be retried on the next run."""
+        lost = list(self.in_flight[shard].values())
+        self.in_flight[shard].clear()
+        self.pending[shard] = 0
+        if not lost:
+            return
+        reason = f"exited with code {payload.get('exitcode')}" if kind == "died" else "stopped"
+        logger.error(f"Shard {shard} {reason}; failing its {len(lost)} unanswered items")
+        for item in lost:
+            self.on_result(self._failed(item, f"Shard worker {shard} {reason} before answering."))
+
+    def metrics(self) -> Dict:
+        """Latest metrics reported by every worker, plus the pending counts."""
+        return {
+            "pending": list(self.pending),
+            "workers": dict(self.worker_metrics),
+        }
@@ -0,0 +1,567 @@
+import abc
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+import ujson as json
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(abc.ABC):
+    """
+    Key-value store shared by MetaAI sessions, possibly across processes and nodes.
+
+    Values are strings; every write may carry a TTL in seconds after which the key
+    reads as absent. Subclasses implement the six operations below.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        pass
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        pass
+
+    @abc.abstractmethod
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Sets a key only if it is absent; returns whether it was set."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        pass
+
+    @abc.abstractmethod
+    async def delete_if(self, key: str, value: str) -> bool:
+        """Deletes a key only if it still holds value; returns whether it was deleted."""
+
+    @abc.abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Adds to a counter and returns the new value; ttl applies when the counter is created."""
+
+    async def close(self):
+        pass
+
+
+class MemoryStore(StateStore):
+    """A store for the sessions of one process."""
+
+    def __init__(self):
+        # key -> (value, expires_at monotonic or None)
+        self._entries: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    def _live(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.monotonic() + ttl if ttl is not None else None
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._live(key)
+        return entry[0] if entry is not None else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._entries[key] = (value, self._expiry(ttl))
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        if self._live(key) is not None:
+            return False
+        self._entries[key] = (value, self._expiry(ttl))
+        return True
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        entry = self._live(key)
+        if entry is None or entry[0] != value:
+            return False
+        del self._entries[key]
+        return True
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        entry = self._live(key)
+        if entry is None:
+            value, expires = amount, self._expiry(ttl)
+        else:
+            value, expires = int(entry[0]) + amount, entry[1]
+        self._entries[key] = (str(value), expires)
+        return value
+
+
+class SQLiteStore(StateStore):
+    """
+    A store in an SQLite file, shared by the processes of one host.
+
+    The database runs in WAL mode and every read-modify-write takes the write lock
+    up front (BEGIN IMMEDIATE), so counters and add() stay atomic across processes.
+    Queries run on a worker thread to keep the event loop free.
+    """
+
+    def __init__(self, path: str = "meta_ai_state.db"):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        return SQLiteStore, (self.path,)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+            )
+            self._connection = connection
+        return self._connection
+
+    def _run(self, operation: Callable[[sqlite3.Connection, float], object]):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(connection, time.time())
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+    async def _call(self, operation):
+        return await asyncio.to_thread(self._run, operation)
+
+    @staticmethod
+    def _expiry(now: float, ttl: Optional[float]) -> Optional[float]:
+        return now + ttl if ttl is not None else None
+
+    @staticmethod
+    def _live(connection: sqlite3.Connection, now: float, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        row = connection.execute("SELECT value, expires FROM state WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[1] is not None and row[1] <= now:
+            connection.execute("DELETE FROM state WHERE key = ?", (key,))
+            return None
+        return row
+
+    async def get(self, key: str) -> Optional[str]:
+        def operation(connection, now):
+            row = self._live(connection, now, key)
+            return row[0] if row is not None else None
+
+        return await self._call(operation)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        await self._call(lambda connection, now: connection.execute(
+            "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, self._expiry(now, ttl)),
+        ))
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        def operation(connection, now):
+            if self._live(connection, now, key) is not None:
+                return False
+            connection.execute(
+                "INSERT INTO state (key, value, expires) VALUES (?, ?, ?)", (key, value, self._expiry(now, ttl))
+            )
+            return True
+
+        return await self._call(operation)
+
+    async def delete(self, key: str):
+        await self._call(lambda connection, now: connection.execute("DELETE FROM state WHERE key = ?", (key,)))
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        return await self._call(lambda connection, now: connection.execute(
+            "DELETE FROM state WHERE key = ? AND value = ? AND (expires IS NULL OR expires > ?)", (key, value, now)
+        ).rowcount > 0)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        def operation(connection, now):
+            row = self._live(connection, now, key)
+            if row is None:
+                value, expires = amount, self._expiry(now, ttl)
+            else:
+                value, expires = int(row[0]) + amount, row[1]
+            connection.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)", (key, str(value), expires)
+            )
+            return value
+
+        return await self._call(operation)
+
+    async def purge(self) -> int:
+        """Deletes expired keys; returns how many."""
+        return await self._call(lambda connection, now: connection.execute(
+            "DELETE FROM state WHERE expires IS NOT NULL AND expires <= ?", (now,)
+        ).rowcount)
+
+    async def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class RedisError(Exception):
+    """An error reply from a Redis server."""
+
+
+class RedisStore(StateStore):
+    """
+    A store on a Redis (or Redis protocol compatible) server, shared by every node.
+
+    Speaks RESP over one connection, opened lazily and reopened after a failure;
+    commands are pipelined where an operation needs more than one. Only GET, SET
+    (PX, NX), DEL, INCRBY, PTTL, PEXPIRE and, for delete_if(), WATCH, UNWATCH,
+    MULTI and EXEC are used (no scripts), so simple stand-ins work too.
+    """
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", timeout: float = 5.0):
+        """
+        Args:
+            url (str): redis://[:password@]host[:port][/db]
+            timeout (float): Seconds to wait for a connection or a reply.
+        """
+        self.url = url
+        self.timeout = timeout
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def __reduce__(self):
+        return RedisStore, (self.url, self.timeout)
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            return RedisError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        setup = []
+        if self.password is not None:
+            setup.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        try:
+            for reply in await self._send(setup):
+                if isinstance(reply, RedisError):
+                    raise reply
+        except BaseException:
+            self._drop()
+            raise
+
+    async def _send(self, commands: List[tuple]) -> list:
+        self._writer.write(b"".join(self._encode(*command) for command in commands))
+        await self._writer.drain()
+        return [await asyncio.wait_for(self._read_reply(), self.timeout) for _ in commands]
+
+    async def execute(self, *commands: tuple) -> list:
+        """Sends pipelined commands and returns their replies; error replies raise RedisError."""
+        async with self._connection_lock():
+            replies = await self._execute(commands)
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _connection_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _execute(self, commands, retry: bool = True) -> list:
+        """Sends commands with the connection lock held, reconnecting once when retry is set."""
+        for attempt in (1, 2):
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._send(list(commands))
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                # The connection state is unknown after a failure; start over once
+                self._drop()
+                if attempt == 2 or not retry:
+                    raise ConnectionError(f"Redis at {self.host}:{self.port} unavailable: {e!r}")
+
+    def _drop(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    @staticmethod
+    def _px(ttl: Optional[float]) -> tuple:
+        return ("PX", max(1, int(ttl * 1000))) if ttl is not None else ()
+
+    async def get(self, key: str) -> Optional[str]:
+        return (await self.execute(("GET", key)))[0]
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        await self.execute(("SET", key, value, *self._px(ttl)))
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return (await self.execute(("SET", key, value, *self._px(ttl), "NX")))[0] is not None
+
+    async def delete(self, key: str):
+        await self.execute(("DEL", key))
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        # Optimistic transaction: EXEC is aborted if the key changes after WATCH
+        async with self._connection_lock():
+            watched, current = await self._execute([("WATCH", key), ("GET", key)])
+            if isinstance(watched, RedisError):
+                raise watched
+            if current != value:
+                await self._execute([("UNWATCH",)], retry=False)
+                return False
+            # A reconnect would lose the WATCH, so the transaction is not retried
+            replies = await self._execute([("MULTI",), ("DEL", key), ("EXEC",)], retry=False)
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return bool(replies[-1] and replies[-1][0])
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        if ttl is None:
+            return (await self.execute(("INCRBY", key, amount)))[0]
+        value, remaining = await self.execute(("INCRBY", key, amount), ("PTTL", key))
+        if remaining == -1:
+            # Created just now (or by a caller that failed before setting the TTL)
+            await self.execute(("PEXPIRE", key, max(1, int(ttl * 1000))))
+        return value
+
+    async def close(self):
+        if self._writer is not None:
+            writer = self._writer
+            self._drop()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+def open_store(url: str) -> StateStore:
+    """
+    A store from a URL: "memory://", "sqlite:///path/to/state.db" (or a bare path
+    ending in .db) and "redis://[:password@]host[:port][/db]".
+    """
+    if url.startswith(("redis://", "rediss://")):
+        if url.startswith("rediss://"):
+            raise ValueError("TLS connections to Redis are not supported")
+        return RedisStore(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    if url.endswith(".db"):
+        return SQLiteStore(url)
+    if url in ("memory", "memory://"):
+        return MemoryStore()
+    raise ValueError(f"Unsupported state store URL: {url!r}")
+
+
+def parse_limit(spec: str) -> Tuple[int, float]:
+    """Parses a COUNT/SECONDS limit such as "100/60"."""
+    count, _, seconds = spec.partition("/")
+    return int(count), float(seconds or 1.0)
+
+
+def state_from_args(args) -> Optional["SharedState"]:
+    """The SharedState selected by the --state and --global-limit CLI options."""
+    if not args.state and not args.global_limit:
+        return None
+    return SharedState(
+        open_store(args.state or "memory://"),
+        global_limit=parse_limit(args.global_limit) if args.global_limit else None,
+    )
+
+
+class SharedState:
+    """
+    The state MetaAI sessions share through a StateStore.
+
+    - Identities: the cookies and access token of a named identity, so a node that
+      starts (or restarts) with an identity another node already logged in uses
+      those instead of logging in again. A login lock makes sure only one node logs
+      in at a time per identity; the others wait for its result.
+    - Conversations: which identity owns a conversation, so any node can route a
+      follow-up to the right identity.
+    - Limits: fixed-window counters of prompt requests across every node, overall
+      and per identity; admit() waits for the next window once one is used up.
+
+    Pass it to MetaAI(state=...) and IdentityPool(state=...). Sessions only share an
+    identity when they use the same identity name.
+    """
+
+    def __init__(
+        self,
+        store: StateStore,
+        namespace: str = "meta_ai",
+        identity_ttl: float = 3600.0,
+        conversation_ttl: float = 7 * 24 * 3600.0,
+        login_timeout: float = 120.0,
+        global_limit: Optional[Tuple[int, float]] = None,
+        identity_limit: Optional[Tuple[int, float]] = None,
+    ):
+        """
+        Args:
+            store (StateStore): Where the state lives.
+            namespace (str): Key prefix, to run several fleets on one store.
+            identity_ttl (float): Seconds shared cookies and tokens are reused.
+            conversation_ttl (float): Seconds a conversation owner is remembered.
+            login_timeout (float): Longest a login may hold the identity's login lock.
+            global_limit: (prompts, seconds) allowed across all identities.
+            identity_limit: (prompts, seconds) allowed per identity.
+        """
+        self.store = store
+        self.namespace = namespace
+        self.identity_ttl = identity_ttl
+        self.conversation_ttl = conversation_ttl
+        self.login_timeout = login_timeout
+        self.global_limit = global_limit
+        self.identity_limit = identity_limit
+        self.node = uuid.uuid4().hex
+        self.logins = 0
+        self.shared_logins = 0
+        self.throttled = 0
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.namespace, *map(str, parts)))
+
+    async def identity(self, name: str, login: Callable[[], Awaitable[Dict]]) -> Dict:
+        """
+        The shared record of an identity, calling login() to create it when no node
+        has one yet.
+
+        Args:
+            name (str): Identity name.
+            login (Callable): Logs in and returns the record (e.g. {"cookies": ..., "access_token": ...}).
+        """
+        key = self._key("identity", name)
+        lock = self._key("login", name)
+        while True:
+            record = await self.store.get(key)
+            if record is not None:
+                self.shared_logins += 1
+                return json.loads(record)
+            # A fresh token per login, so a lock that expired and was taken over is left alone
+            token = f"{self.node}:{uuid.uuid4().hex}"
+            if await self.store.add(lock, token, ttl=self.login_timeout):
+                try:
+                    record = await login()
+                    await self.store.set(key, json.dumps(record), ttl=self.identity_ttl)
+                    self.logins += 1
+                    return record
+                finally:
+                    await self.store.delete_if(lock, token)
+            # Another node is logging in; its lock expires if it dies midway
+            await asyncio.sleep(0.5)
+
+    async def forget_identity(self, name: str, stale: Optional[Dict] = None):
+        """
+        Drops a shared identity record, e.g. after its cookies stopped working.
+
+        Args:
+            name (str): Identity name.
+            stale (Dict): The record that stopped working; when given, the shared
+                record is only dropped while it still is that one, so a fresh login
+                by another node is kept.
+        """
+        key = self._key("identity", name)
+        if stale is None:
+            await self.store.delete(key)
+            return
+        current = await self.store.get(key)
+        if current is not None and json.loads(current) == stale:
+            await self.store.delete_if(key, current)
+
+    async def remember_conversation(self, conversation_id: str, identity: str):
+        await self.store.set(self._key("conversation", conversation_id), identity, ttl=self.conversation_ttl)
+
+    async def conversation_owner(self, conversation_id: str) -> Optional[str]:
+        return await self.store.get(self._key("conversation", conversation_id))
+
+    async def allow(self, name: str, limit: int, window: float) -> float:
+        """
+        Counts one event against a fixed-window limit.
+
+        Returns:
+            float: 0 when the event is within the limit, else the seconds until the
+            next window starts.
+        """
+        now = time.time()
+        number = math.floor(now / window)
+        count = await self.store.incr(self._key("rate", name, number), ttl=window * 2)
+        if count <= limit:
+            return 0.0
+        return (number + 1) * window - now
+
+    async def admit(self, identity: Optional[str] = None):
+        """Waits until a prompt request is within the global and per-identity limits."""
+        limits = []
+        if self.identity_limit is not None and identity is not None:
+            limits.append((f"identity:{identity}", *self.identity_limit))
+        if self.global_limit is not None:
+            limits.append(("global", *self.global_limit))
+        for name, limit, window in limits:
+            while True:
+                wait = await self.allow(name, limit, window)
+                if not wait:
+                    break
+                self.throttled += 1
+                logger.debug(f"Prompt limit {name} reached, waiting {wait:.2f}s")
+                await asyncio.sleep(wait)
+
+    def stats(self) -> Dict:
+        return {"logins": self.logins, "shared_logins": self.shared_logins, "throttled": self.throttled}
+
+    async def close(self):
+        await self.store.close()
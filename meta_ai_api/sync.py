@@ -0,0 +1,218 @@
+import asyncio
+import queue
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+
+from meta_ai_api.main import MetaAI
+
+_DONE = object()
+# Chunks stream() reads ahead of a slow consumer before it stops pulling from upstream
+_STREAM_BUFFER = 16
+# Conversations remembered with the session they belong to
+_MAX_PINNED = 4096
+
+
+class SyncMetaAI:
+    """
+    A thread-safe blocking client for threaded apps and plain scripts.
+
+    One event loop runs for the lifetime of the client in a background thread and
+    owns a small pool of initialized MetaAI sessions, so cookies, tokens and
+    connections stay warm between calls instead of being rebuilt by asyncio.run().
+
+    Each call borrows a session from the pool. Calls without a conversation_id start
+    a new conversation; pass the "uuid" of a previous result to continue it. A
+    continued conversation waits for the session that started it, since its
+    cookies and token are the ones the conversation belongs to.
+    """
+
+    def __init__(self, sessions: int = 1, **client_kwargs):
+        """
+        Args:
+            sessions (int): Maximum number of MetaAI sessions used in parallel.
+            **client_kwargs: Keyword arguments for each MetaAI session.
+        """
+        self.max_sessions = sessions
+        self.client_kwargs = client_kwargs
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="meta-ai-loop", daemon=True)
+        self._thread.start()
+        self._sessions: List[MetaAI] = []
+        self._idle: List[MetaAI] = []
+        self._available: Optional[asyncio.Condition] = None
+        # conversation id -> the session it was started on, least recently used first
+        self._pinned: "OrderedDict[str, MetaAI]" = OrderedDict()
+        self._creating = 0
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _call(self, coro, timeout: Optional[float] = None):
+        if self._closed:
+            coro.close()
+            raise RuntimeError("SyncMetaAI is closed.")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # On a timeout or an interrupt the coroutine would keep running and hold its session
+            future.cancel()
+            raise
+
+    async def _acquire(self, conversation_id: Optional[str] = None) -> MetaAI:
+        """Borrows the session a conversation is pinned to, or any session otherwise."""
+        if self._available is None:
+            self._available = asyncio.Condition()
+        async with self._available:
+            while True:
+                owner = self._pinned.get(conversation_id) if conversation_id is not None else None
+                if owner is not None:
+                    if owner in self._idle:
+                        self._idle.remove(owner)
+                        return owner
+                elif self._idle:
+                    return self._idle.pop(0)
+                elif len(self._sessions) + self._creating < self.max_sessions:
+                    self._creating += 1
+                    break
+                await self._available.wait()
+
+        ai = MetaAI(**self.client_kwargs)
+        try:
+            await ai.initialize()
+        except BaseException:
+            # Don't leak the client and connections of a session that never joined the pool
+            await ai.close()
+            async with self._available:
+                self._creating -= 1
+                self._available.notify_all()
+            raise
+        self._creating -= 1
+        self._sessions.append(ai)
+        return ai
+
+    async def _release(self, ai: MetaAI):
+        async with self._available:
+            self._idle.append(ai)
+            self._available.notify_all()
+
+    def _pin(self, conversation_id: Optional[str], ai: MetaAI):
+        if conversation_id is None:
+            return
+        self._pinned[conversation_id] = ai
+        self._pinned.move_to_end(conversation_id)
+        if len(self._pinned) > _MAX_PINNED:
+            self._pinned.popitem(last=False)
+
+    def warmup(self, timeout: Optional[float] = None):
+        """Initializes every session up front so the first calls start hot."""
+
+        async def fill():
+            acquired = [await self._acquire() for _ in range(self.max_sessions - len(self._sessions))]
+            for ai in acquired:
+                await self._release(ai)
+
+        self._call(fill(), timeout)
+
+    async def _prompt(self, message: str, conversation_id: Optional[str], **kwargs):
+        ai = await self._acquire(conversation_id)
+        try:
+            if conversation_id is not None:
+                ai.external_conversation_id = conversation_id
+            async for result in ai.prompt(message, new_conversation=conversation_id is None, **kwargs):
+                if "event" not in result:
+                    self._pin(result.get("uuid"), ai)
+                yield result
+        finally:
+            await self._release(ai)
+
+    def ask(self, message: str, conversation_id: Optional[str] = None, timeout: Optional[float] = None, **kwargs) -> Dict:
+        """
+        Sends a prompt and blocks until the complete response is available.
+
+        Args:
+            message (str): The prompt.
+            conversation_id (str): The "uuid" of an earlier result to continue its conversation.
+            timeout (float): Seconds to wait for the response.
+            **kwargs: Further arguments for MetaAI.prompt.
+
+        Returns:
+            Dict: The final extracted data (message, sources, media, uuid).
+        """
+
+        async def collect():
+            final = None
+            async for result in self._prompt(message, conversation_id, **kwargs):
+                if "event" not in result:
+                    final = result
+            return final
+
+        return self._call(collect(), timeout)
+
+    def stream(self, message: str, conversation_id: Optional[str] = None, **kwargs) -> Iterator[Dict]:
+        """
+        Sends a prompt and yields the streamed chunks as they arrive.
+
+        Leaving the loop early cancels the underlying request.
+
+        Args:
+            message (str): The prompt.
+            conversation_id (str): The "uuid" of an earlier result to continue its conversation.
+            **kwargs: Further arguments for MetaAI.prompt.
+
+        Yields:
+            Dict: Chunks as produced by MetaAI.prompt(stream=True).
+        """
+        chunks: queue.Queue = queue.Queue()
+        # Released by the consumer for every chunk it takes, so a slow consumer holds
+        # back the upstream read instead of growing the queue
+        space = asyncio.Semaphore(_STREAM_BUFFER)
+
+        async def pump():
+            try:
+                async for result in self._prompt(message, conversation_id, stream=True, **kwargs):
+                    await space.acquire()
+                    chunks.put(result)
+            except BaseException as e:
+                chunks.put(e)
+                raise
+            finally:
+                chunks.put(_DONE)
+
+        if self._closed:
+            raise RuntimeError("SyncMetaAI is closed.")
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = chunks.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                self._loop.call_soon_threadsafe(space.release)
+                yield item
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def close(self):
+        """Closes every session and stops the background loop."""
+        if self._closed:
+            return
+
+        async def shutdown():
+            for ai in self._sessions:
+                await ai.close()
+
+        try:
+            self._call(shutdown())
+        finally:
+            self._closed = True
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
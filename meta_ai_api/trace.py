@@ -0,0 +1,367 @@
+import glob
+import gzip
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import ujson as json
+
+from meta_ai_api.delta import (
+    SnapshotDecoder,
+    SnapshotEncoder,
+    from_json_safe,
+    is_keyframe,
+    is_snapshot,
+    to_json_safe,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+MAGIC = b"MTRC"
+VERSION = 1
+SUFFIX = ".mtrace"
+
+# File header: magic, version, codec, serializer
+FILE_HEADER = struct.Struct(">4sBBB")
+# Block header: compressed length, uncompressed length
+BLOCK_HEADER = struct.Struct(">II")
+# Record header inside a block: serialized length
+RECORD_HEADER = struct.Struct(">I")
+
+CODECS = {"none": 0, "gzip": 1, "zstd": 2}
+SERIALIZERS = {"json": 0, "msgpack": 1}
+
+
+def _default_codec() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _default_serializer() -> str:
+    return "msgpack" if msgspec is not None else "json"
+
+
+def _compressor(codec: int):
+    if codec == CODECS["zstd"]:
+        if zstandard is None:
+            raise ImportError("zstd traces require zstandard: pip install zstandard")
+        return zstandard.ZstdCompressor(level=3).compress
+    if codec == CODECS["gzip"]:
+        return lambda data: gzip.compress(data, compresslevel=6)
+    return bytes
+
+
+def _decompressor(codec: int):
+    if codec == CODECS["zstd"]:
+        if zstandard is None:
+            raise ImportError("zstd traces require zstandard: pip install zstandard")
+        decompressor = zstandard.ZstdDecompressor()
+        return lambda data, size: decompressor.decompress(data, max_output_size=size)
+    if codec == CODECS["gzip"]:
+        return lambda data, size: gzip.decompress(data)
+    return lambda data, size: bytes(data)
+
+
+def _encoder(serializer: int):
+    if serializer == SERIALIZERS["msgpack"]:
+        if msgspec is None:
+            raise ImportError("msgpack traces require msgspec: pip install msgspec")
+        return msgspec.msgpack.Encoder().encode
+
+    def encode(record: Dict) -> bytes:
+        data = record.get("data")
+        if isinstance(data, (bytes, bytearray)):
+            # JSON has no bytes type; stream lines are stored as text
+            record = {**record, "data": data.decode("utf-8", errors="replace")}
+        if "snapshot" in record:
+            # Splice offsets refer to the original type, so bytes are tagged instead
+            record = {**record, "snapshot": to_json_safe(record["snapshot"])}
+        return json.dumps(record, ensure_ascii=False).encode("utf-8")
+
+    return encode
+
+
+def _decoder(serializer: int):
+    if serializer == SERIALIZERS["msgpack"]:
+        if msgspec is None:
+            raise ImportError("msgpack traces require msgspec: pip install msgspec")
+        return msgspec.msgpack.Decoder().decode
+
+    def decode(data) -> Dict:
+        record = json.loads(bytes(data))
+        if "snapshot" in record:
+            record["snapshot"] = from_json_safe(record["snapshot"])
+        return record
+
+    return decode
+
+
+class TraceWriter:
+    """
+    Compact binary trace of raw responses, replacing the pretty-printed text dump.
+
+    Records (timestamp, endpoint, conversation id, request id and the raw data) are
+    serialized with msgpack (via msgspec) or compact JSON, length-prefixed, and
+    grouped into blocks that are compressed with zstd or gzip. Blocks keep random
+    access cheap: a reader only decompresses the block holding a record.
+
+    Files are named <prefix>.<n>.mtrace and rotated once they reach max_bytes; with
+    max_files set, the oldest files are removed. Pass it to MetaAI(trace=...); one
+    writer can be shared by many sessions and is safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        prefix: str = "meta_ai_trace",
+        max_bytes: int = 256 * 1024 * 1024,
+        max_files: Optional[int] = None,
+        codec: Optional[str] = None,
+        serializer: Optional[str] = None,
+        block_size: int = 256 * 1024,
+        flush_interval: float = 5.0,
+        delta: bool = False,
+    ):
+        """
+        Args:
+            prefix (str): Path prefix of the trace files.
+            max_bytes (int): Size at which a new file is started.
+            max_files (int): Number of files to keep (default: all).
+            codec (str): "zstd", "gzip" or "none" (default: zstd when installed, else gzip).
+            serializer (str): "msgpack" or "json" (default: msgpack when msgspec is installed).
+            block_size (int): Uncompressed bytes collected before a block is compressed.
+            flush_interval (float): Longest time in seconds a record waits in an open block;
+                a background timer flushes blocks that fill more slowly.
+            delta (bool): Store stream snapshots as deltas against the previous line of
+                the same prompt; every file starts each prompt with a full snapshot.
+        """
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.codec = CODECS[codec or _default_codec()]
+        self.serializer = SERIALIZERS[serializer or _default_serializer()]
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self._compress = _compressor(self.codec)
+        self._encode = _encoder(self.serializer)
+        self.delta = delta
+        self._snapshots = SnapshotEncoder() if delta else None
+        self._block = bytearray()
+        self._block_started = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+        self._file = None
+        self._index = self._next_index()
+        self._lock = threading.Lock()
+        self.records = 0
+        self.raw_bytes = 0
+        self.written_bytes = 0
+
+    def _next_index(self) -> int:
+        existing = trace_files(self.prefix)
+        if not existing:
+            return 0
+        return int(existing[-1][len(self.prefix) + 1:-len(SUFFIX)]) + 1
+
+    def _path(self, index: int) -> str:
+        return f"{self.prefix}.{index:05d}{SUFFIX}"
+
+    def _open(self):
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self._path(self._index), "ab")
+        if self._file.tell() == 0:
+            self._file.write(FILE_HEADER.pack(MAGIC, VERSION, self.codec, self.serializer))
+        if self.max_files:
+            # Pruned once the next file exists, so a final rotation does not leave one file short
+            for path in trace_files(self.prefix)[:-self.max_files]:
+                os.remove(path)
+                logger.debug(f"Removed rotated trace file {path}")
+
+    def write(
+        self,
+        endpoint: str,
+        data,
+        conversation: Optional[str] = None,
+        request: Optional[int] = None,
+        timestamp: Optional[float] = None,
+    ):
+        """
+        Appends a record.
+
+        Args:
+            endpoint (str): Where the data came from (e.g. "stream_response (line 3)").
+            data: Raw bytes or text, or a decoded dict.
+            conversation (str): External conversation id.
+            request (int): prompt() request id, when hooks are active.
+            timestamp (float): Unix time; defaults to now.
+        """
+        record = {
+            "t": time.time() if timestamp is None else timestamp,
+            "endpoint": endpoint,
+            "conversation": conversation,
+            "request": request,
+        }
+        if self._snapshots is not None and is_snapshot(endpoint):
+            with self._lock:
+                # Encoded under the lock so deltas follow the order records are written in
+                record["snapshot"] = self._snapshots.encode(
+                    (conversation, request), data, keyframe=is_keyframe(endpoint)
+                )
+                self._append(self._encode(record))
+            return
+        record["data"] = data
+        encoded = self._encode(record)
+        with self._lock:
+            self._append(encoded)
+
+    def _append(self, encoded: bytes):
+        """Adds a serialized record to the open block; called with the lock held."""
+        if not self._block:
+            self._block_started = time.monotonic()
+            if self._timer is None:
+                self._schedule(self.flush_interval)
+        self._block += RECORD_HEADER.pack(len(encoded))
+        self._block += encoded
+        self.records += 1
+        if (
+            len(self._block) >= self.block_size
+            or time.monotonic() - self._block_started >= self.flush_interval
+        ):
+            self._flush_block()
+
+    def _schedule(self, delay: float):
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            if not self._block:
+                return
+            # The block the timer was started for may have been flushed for its size since
+            age = time.monotonic() - self._block_started
+            if age >= self.flush_interval:
+                self._flush_block()
+            else:
+                self._schedule(self.flush_interval - age)
+
+    def _flush_block(self):
+        if not self._block:
+            return
+        if self._file is None:
+            self._open()
+        compressed = self._compress(bytes(self._block))
+        self._file.write(BLOCK_HEADER.pack(len(compressed), len(self._block)))
+        self._file.write(compressed)
+        self._file.flush()
+        self.raw_bytes += len(self._block)
+        self.written_bytes += BLOCK_HEADER.size + len(compressed)
+        self._block.clear()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        self._index += 1
+        if self._snapshots is not None:
+            # Keep every file decodable on its own
+            self._snapshots.reset()
+
+    def flush(self):
+        """Compresses and writes the open block."""
+        with self._lock:
+            self._flush_block()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._flush_block()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"records": self.records, "raw_bytes": self.raw_bytes, "written_bytes": self.written_bytes}
+
+
+def trace_files(prefix: str) -> List[str]:
+    """The trace files written under a prefix, oldest first."""
+    return sorted(glob.glob(glob.escape(prefix) + ".[0-9]*" + SUFFIX))
+
+
+def read_header(data: bytes, path: str = "") -> Tuple[int, int]:
+    """Validates a file header and returns (codec, serializer)."""
+    if len(data) < FILE_HEADER.size:
+        raise ValueError(f"Not a trace file: {path}")
+    magic, version, codec, serializer = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a trace file (or unsupported version): {path}")
+    return codec, serializer
+
+
+def iter_blocks(data, path: str = "") -> Iterator[Tuple[int, int, int]]:
+    """
+    Yields (offset, compressed length, uncompressed length) of every complete block.
+    A block cut short by a crash ends the iteration.
+    """
+    offset = FILE_HEADER.size
+    while offset + BLOCK_HEADER.size <= len(data):
+        compressed, size = BLOCK_HEADER.unpack_from(data, offset)
+        if offset + BLOCK_HEADER.size + compressed > len(data):
+            logger.warning(f"Truncated block at offset {offset} in {path}")
+            return
+        yield offset, compressed, size
+        offset += BLOCK_HEADER.size + compressed
+
+
+def iter_records(block: bytes) -> Iterator[Tuple[int, memoryview]]:
+    """Yields (position, serialized record) for every record in an uncompressed block."""
+    view = memoryview(block)
+    position = 0
+    while position < len(block):
+        (length,) = RECORD_HEADER.unpack_from(block, position)
+        yield position, view[position + RECORD_HEADER.size:position + RECORD_HEADER.size + length]
+        position += RECORD_HEADER.size + length
+
+
+def read_trace(path: str) -> Iterator[Dict]:
+    """Yields every record of a trace file in order."""
+    with open(path, "rb") as f:
+        data = f.read()
+    codec, serializer = read_header(data, path)
+    decompress = _decompressor(codec)
+    decode = _decoder(serializer)
+    snapshots = SnapshotDecoder()
+    for offset, compressed, size in iter_blocks(data, path):
+        start = offset + BLOCK_HEADER.size
+        block = decompress(data[start:start + compressed], size)
+        for _, record in iter_records(block):
+            yield expand_record(decode(record), snapshots)
+
+
+def snapshot_stream(record: Dict) -> tuple:
+    """The stream a delta-encoded record belongs to."""
+    return record.get("conversation"), record.get("request")
+
+
+def expand_record(record: Dict, snapshots: SnapshotDecoder) -> Dict:
+    """Replaces a delta-encoded snapshot with the original data."""
+    if "snapshot" in record:
+        record["data"] = snapshots.decode(snapshot_stream(record), record.pop("snapshot"))
+    return record
@@ -0,0 +1,444 @@
+import bisect
+import logging
+import mmap
+import os
+import statistics
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import ujson as json
+
+from meta_ai_api.trace import (
+    BLOCK_HEADER,
+    FILE_HEADER,
+    RECORD_HEADER,
+    SERIALIZERS,
+    SUFFIX,
+    _decoder,
+    _decompressor,
+    iter_blocks,
+    iter_records,
+    read_header,
+    snapshot_stream,
+    trace_files,
+)
+from meta_ai_api.delta import is_snapshot, patch
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 2
+
+# Endpoints marking the first response data of a prompt attempt
+FIRST_CHUNK_ENDPOINTS = ("prompt (stream - first line)", "prompt (non-stream)", "prompt (non-stream - line 1)")
+
+if msgspec is not None:
+
+    class _RecordMeta(msgspec.Struct):
+        """The indexed fields of a record; the data is skipped while decoding."""
+
+        t: float
+        endpoint: str
+        conversation: Optional[str] = None
+        request: Optional[int] = None
+
+
+class _Segment:
+    """
+    One trace file, memory-mapped, with its sidecar index.
+
+    The index lists every block (offset, compressed and raw length) and every record
+    (block, position in block, time, endpoint, conversation, request), with the
+    strings interned. Record positions are also keyed by conversation, endpoint and
+    request, and the record times are kept sorted with their positions, so queries
+    look up or bisect their candidates instead of scanning every record. It is
+    extended incrementally when the file has grown and rebuilt when the file no
+    longer matches it.
+    """
+
+    def __init__(self, path: str, reindex: bool = False):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.codec, self.serializer = read_header(self._map, path)
+        self._decompress = _decompressor(self.codec)
+        self._decode = _decoder(self.serializer)
+        self._cached_block = (-1, b"")
+        # Last rebuilt snapshot per stream: (position, data)
+        self._snapshots: Dict[tuple, tuple] = {}
+        self.index = None if reindex else self._load_index()
+        self._update_index()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _load_index(self) -> Optional[Dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != INDEX_VERSION or index.get("end", 0) > len(self._map):
+            return None
+        return index
+
+    def _meta_decoder(self):
+        """Decodes (time, endpoint, conversation, request) of a record."""
+        if self.serializer == SERIALIZERS["msgpack"] and msgspec is not None:
+            decode_meta = msgspec.msgpack.Decoder(_RecordMeta).decode
+
+            def meta(record) -> tuple:
+                m = decode_meta(record)
+                return m.t, m.endpoint, m.conversation, m.request
+
+            return meta
+
+        def meta(record) -> tuple:
+            r = self._decode(record)
+            return r["t"], r["endpoint"], r.get("conversation"), r.get("request")
+
+        return meta
+
+    def _update_index(self):
+        index = self.index or {
+            "version": INDEX_VERSION,
+            "end": FILE_HEADER.size,
+            "blocks": [],
+            "records": [],
+            "endpoints": [],
+            "conversations": [],
+            # Record positions by conversation id, endpoint and request id
+            "by_conversation": {},
+            "by_endpoint": {},
+            "by_request": {},
+            # Record times in ascending order, with the position of each
+            "times": [],
+            "time_positions": [],
+        }
+        if index["end"] >= len(self._map) and self.index is not None:
+            return
+        endpoints = {name: i for i, name in enumerate(index["endpoints"])}
+        conversations = {name: i for i, name in enumerate(index["conversations"])}
+        meta = self._meta_decoder()
+
+        def intern(table: Dict[str, int], names: List[str], value: Optional[str]) -> int:
+            if value is None:
+                return -1
+            number = table.get(value)
+            if number is None:
+                number = table[value] = len(names)
+                names.append(value)
+            return number
+
+        added = 0
+        for offset, compressed, size in iter_blocks(self._map, self.path):
+            if offset < index["end"]:
+                continue
+            block_number = len(index["blocks"])
+            index["blocks"].append([offset, compressed, size])
+            for position, record in iter_records(self._block(block_number, index)):
+                t, endpoint, conversation, request = meta(record)
+                number = len(index["records"])
+                endpoint_number = intern(endpoints, index["endpoints"], endpoint)
+                conversation_number = intern(conversations, index["conversations"], conversation)
+                index["records"].append([block_number, position, t, endpoint_number, conversation_number, request])
+                index["by_endpoint"].setdefault(endpoint, []).append(number)
+                if conversation is not None:
+                    index["by_conversation"].setdefault(conversation, []).append(number)
+                if request is not None:
+                    # JSON object keys are strings
+                    index["by_request"].setdefault(str(request), []).append(number)
+                # Records are written in time order, so this is nearly always an append
+                at = bisect.bisect_right(index["times"], t)
+                index["times"].insert(at, t)
+                index["time_positions"].insert(at, number)
+                added += 1
+            index["end"] = offset + BLOCK_HEADER.size + compressed
+        self.index = index
+        logger.debug(f"Indexed {added} new records in {self.path}")
+        try:
+            with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(self.index_path + ".tmp", self.index_path)
+        except OSError as e:
+            logger.warning(f"Unable to write trace index {self.index_path}: {e}")
+
+    def _block(self, number: int, index: Optional[Dict] = None) -> bytes:
+        if self._cached_block[0] == number:
+            return self._cached_block[1]
+        offset, compressed, size = (index or self.index)["blocks"][number]
+        start = offset + BLOCK_HEADER.size
+        block = self._decompress(self._map[start:start + compressed], size)
+        self._cached_block = (number, block)
+        return block
+
+    def _record(self, position: int) -> Dict:
+        entry = self.index["records"][position]
+        block = self._block(entry[0])
+        (length,) = RECORD_HEADER.unpack_from(block, entry[1])
+        start = entry[1] + RECORD_HEADER.size
+        return self._decode(memoryview(block)[start:start + length])
+
+    def _same_stream(self, position: int) -> Iterator[int]:
+        """Earlier positions of snapshot records of the same stream, nearest first."""
+        entry = self.index["records"][position]
+        snapshot_endpoints = {i for i, name in enumerate(self.index["endpoints"]) if is_snapshot(name)}
+        if entry[5] is not None:
+            candidates = self.index["by_request"].get(str(entry[5]), [])
+        elif entry[4] >= 0:
+            candidates = self.index["by_conversation"].get(self.index["conversations"][entry[4]], [])
+        else:
+            candidates = range(len(self.index["records"]))
+        for i in range(bisect.bisect_left(candidates, position) - 1, -1, -1):
+            other = self.index["records"][candidates[i]]
+            if other[4] == entry[4] and other[5] == entry[5] and other[3] in snapshot_endpoints:
+                yield candidates[i]
+
+    def record(self, position: int) -> Dict:
+        """
+        Decodes the record at an index position.
+
+        A delta-encoded snapshot is rebuilt from the nearest full snapshot of its
+        stream, or from the last one rebuilt, so reading a stream in order stays linear.
+        """
+        record = self._record(position)
+        if "snapshot" not in record:
+            return record
+        stream = snapshot_stream(record)
+        snapshot = record.pop("snapshot")
+        if "full" in snapshot:
+            value = snapshot["full"]
+        else:
+            chain = []
+            cached = self._snapshots.get(stream)
+            for earlier in self._same_stream(position):
+                if cached is not None and cached[0] == earlier:
+                    value = cached[1]
+                    break
+                previous = self._record(earlier)["snapshot"]
+                chain.append(previous)
+                if "full" in previous:
+                    value = None
+                    break
+            else:
+                raise ValueError(f"Delta without a preceding full snapshot at record {position} of {self.path}")
+            chain.reverse()
+            chain.append(snapshot)
+            for step in chain:
+                value = step["full"] if "full" in step else patch(value, step["delta"])
+        self._snapshots[stream] = (position, value)
+        record["data"] = value
+        return record
+
+    def positions(
+        self,
+        conversation: Optional[str] = None,
+        request: Optional[int] = None,
+        endpoint: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> List[int]:
+        """Index positions of the records matching every given filter, in file order."""
+        index = self.index
+        keyed: List[List[int]] = []
+        if conversation is not None:
+            keyed.append(index["by_conversation"].get(conversation, []))
+        if request is not None:
+            keyed.append(index["by_request"].get(str(request), []))
+        if endpoint is not None:
+            # Endpoints match by substring; there are only a few distinct ones
+            lists = [positions for name, positions in index["by_endpoint"].items() if endpoint in name]
+            keyed.append(lists[0] if len(lists) == 1 else sorted(p for positions in lists for p in positions))
+
+        if not keyed:
+            if since is None and until is None:
+                return list(range(len(index["records"])))
+            times = index["times"]
+            start = 0 if since is None else bisect.bisect_left(times, since)
+            end = len(times) if until is None else bisect.bisect_right(times, until)
+            return sorted(index["time_positions"][start:end])
+
+        keyed.sort(key=len)
+        matches = keyed[0]
+        if len(keyed) > 1:
+            others = [set(positions) for positions in keyed[1:]]
+            matches = [p for p in matches if all(p in other for other in others)]
+        if since is not None or until is not None:
+            records = index["records"]
+            matches = [
+                p for p in matches
+                if (since is None or records[p][2] >= since) and (until is None or records[p][2] <= until)
+            ]
+        return matches
+
+    def entry(self, position: int) -> Dict:
+        """The index entry at a position with its strings resolved (no data)."""
+        entry = self.index["records"][position]
+        return {
+            "position": position,
+            "t": entry[2],
+            "endpoint": self.index["endpoints"][entry[3]],
+            "conversation": self.index["conversations"][entry[4]] if entry[4] >= 0 else None,
+            "request": entry[5],
+        }
+
+    def entries(self) -> Iterator[Dict]:
+        """Index entries with their strings resolved (no data)."""
+        for position in range(len(self.index["records"])):
+            yield self.entry(position)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def at(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": at(0.5),
+        "p90": at(0.9),
+        "p99": at(0.99),
+        "max": ordered[-1],
+    }
+
+
+class TraceReader:
+    """
+    Random access queries over TraceWriter files.
+
+    Files are memory-mapped and indexed once into a sidecar <file>.idx, so queries by
+    conversation, request, endpoint or time only decompress the blocks that hold
+    matching records, and latency stats need no decompression at all.
+    """
+
+    def __init__(self, paths: Union[str, Sequence[str]], reindex: bool = False):
+        """
+        Args:
+            paths: A TraceWriter prefix, a trace file, or a list of trace files.
+            reindex (bool): Rebuild the sidecar indexes from scratch.
+        """
+        if isinstance(paths, str):
+            paths = [paths] if paths.endswith(SUFFIX) else trace_files(paths)
+        self.segments = [_Segment(path, reindex) for path in paths]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def _matches(
+        self,
+        conversation: Optional[str] = None,
+        request: Optional[int] = None,
+        endpoint: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ):
+        for segment in self.segments:
+            for position in segment.positions(conversation, request, endpoint, since, until):
+                yield segment, segment.entry(position)
+
+    def query(self, **filters) -> Iterator[Dict]:
+        """
+        Yields the full records matching every given filter, in file order.
+
+        Args:
+            conversation (str): External conversation id.
+            request (int): prompt() request id.
+            endpoint (str): Substring of the endpoint.
+            since (float): Earliest unix time.
+            until (float): Latest unix time.
+        """
+        for segment, entry in self._matches(**filters):
+            yield segment.record(entry["position"])
+
+    def conversations(self) -> Dict[str, int]:
+        """Record counts by conversation id."""
+        counts: Dict[str, int] = {}
+        for segment in self.segments:
+            for conversation, positions in segment.index["by_conversation"].items():
+                counts[conversation] = counts.get(conversation, 0) + len(positions)
+        return counts
+
+    def latency(self, since: Optional[float] = None, until: Optional[float] = None) -> Dict:
+        """
+        Latency stats per prompt, from the index alone.
+
+        Records are grouped by request id (or conversation id when the request id was
+        not traced) within each file, so ids reused by older writers in other runs or
+        processes are not merged. A prompt's duration runs from its first to its last
+        record; its first-chunk latency up to its first response line.
+        """
+        groups: Dict = {}
+        for segment, entry in self._matches(since=since, until=until):
+            if entry["request"] is not None:
+                key = (segment.path, "request", entry["request"])
+            else:
+                key = (segment.path, "conversation", entry["conversation"])
+            if key[2] is None:
+                continue
+            group = groups.setdefault(key, {"first": entry["t"], "last": entry["t"], "first_chunk": None})
+            group["first"] = min(group["first"], entry["t"])
+            group["last"] = max(group["last"], entry["t"])
+            if group["first_chunk"] is None and entry["endpoint"] in FIRST_CHUNK_ENDPOINTS:
+                group["first_chunk"] = entry["t"]
+        return {
+            "prompts": len(groups),
+            "duration": _percentiles([g["last"] - g["first"] for g in groups.values()]),
+            "first_chunk": _percentiles(
+                [g["first_chunk"] - g["first"] for g in groups.values() if g["first_chunk"] is not None]
+            ),
+        }
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def run_trace(args) -> int:
+    """Entry point for `python -m meta_ai_api trace`."""
+    import sys
+
+    paths = args.paths[0] if len(args.paths) == 1 else args.paths
+    with TraceReader(paths, reindex=args.reindex) as reader:
+        since, until = _parse_time(args.since), _parse_time(args.until)
+        if args.stats:
+            sys.stdout.write(json.dumps(reader.latency(since, until), indent=2) + "\n")
+            return 0
+        if args.conversations:
+            sys.stdout.write(json.dumps(reader.conversations(), indent=2) + "\n")
+            return 0
+        for record in reader.query(
+            conversation=args.conversation,
+            request=args.request,
+            endpoint=args.endpoint,
+            since=since,
+            until=until,
+        ):
+            if isinstance(record.get("data"), (bytes, bytearray)):
+                record["data"] = record["data"].decode("utf-8", errors="replace")
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return 0
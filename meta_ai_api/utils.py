@@ -8,6 +8,7 @@ import httpx
 from bs4 import BeautifulSoup
 
 from meta_ai_api.exceptions import FacebookInvalidCredentialsException
+from meta_ai_api.proxy_pool import ProxyPool
 
 from meta_ai_api.extras import fake_agent
 from meta_ai_api.extras import USER_AGENT, SEC_CH_UA, SEC_CH_UA_PLATFORM, SEC_CH_UA_MOBILE
@@ -289,7 +290,10 @@ async def get_cookies() -> dict:
 
 
 async def get_session(
-    proxy: Optional[Dict] = None, test_url: str = "https://api.ipify.org/?format=json"
+    proxy: Optional[Dict] = None,
+    test_url: str = "https://api.ipify.org/?format=json",
+    proxy_pool: Optional[ProxyPool] = None,
+    identity: str = "default",
 ) -> httpx.AsyncClient:
     """
     Get an async session with the proxy set.
@@ -297,10 +301,16 @@ async def get_session(
     Args:
         proxy (Dict): The proxy to use (single proxy string, e.g., "http://proxy.com:8080")
         test_url (str): A test site from which we check that the proxy is installed correctly.
+        proxy_pool (ProxyPool): A health-checked pool to pick the proxy from. When given,
+            no probe request is made; the pool's background checker handles health.
+        identity (str): The identity the pooled proxy is assigned to.
 
     Returns:
         httpx.AsyncClient: An async client with the proxy set.
     """
+    if proxy_pool:
+        return httpx.AsyncClient(proxy=proxy_pool.assign(identity))
+
     if not proxy:
         return httpx.AsyncClient()
     
@@ -317,4 +327,4 @@ async def get_session(
                 client_kwargs["proxy"] = proxy
             return httpx.AsyncClient(**client_kwargs)
         else:
-            raise Exception("Proxy is not working.")
\ No newline at end of file
+            raise Exception("Proxy is not working.")
@@ -0,0 +1,74 @@
+import httpx
+import pytest
+import ujson as json
+
+# The parts of the www.meta.ai home page that get_cookies() extracts
+HOME_PAGE = (
+    '_js_datr":{"value":"JS",  abra_csrf":{"value":"CSRF", datr":{"value":"DATR", '
+    '"LSD",[],{"token":"LSDT"} DTSGInitData",[],{"token":"DTSG"'
+)
+ACCESS_TOKEN = "TOKEN1234567890123456789"
+
+
+def stream_line(text: str, state: str = "STREAMING", media=(), conversation: str = "conv_123_x") -> str:
+    """One line of a prompt response stream."""
+    message = {"id": conversation, "streaming_state": state, "composed_text": {"content": [{"text": text}]}}
+    if media:
+        message["imagine_card"] = {
+            "session": {
+                "media_sets": [{"imagine_media": [{"uri": uri, "media_type": "IMAGE", "prompt": "p"} for uri in media]}]
+            }
+        }
+    return json.dumps({"data": {"node": {"bot_response_message": message}}})
+
+
+class FakeMetaAI:
+    """
+    Answers the Meta AI endpoints in-process. A prompt is answered with `lines`, or by
+    `prompt(request)` when set; it may return a Response or a coroutine of one.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.lines = [
+            stream_line("Hel"),
+            stream_line("Hello", media=["u1"]),
+            stream_line("Hello world", state="OVERALL_DONE", media=["u1", "u2"]),
+        ]
+        self.prompt = None
+
+    def prompts(self):
+        return [r for r in self.requests if b"useAbraSendMessageMutation" in r.content]
+
+    def __call__(self, request: httpx.Request):
+        self.requests.append(request)
+        if request.url.host == "www.meta.ai" and request.method in ("GET", "HEAD"):
+            return httpx.Response(200, text=HOME_PAGE)
+        body = request.content
+        if b"useAbraAcceptTOSForTempUserMutation" in body:
+            return httpx.Response(
+                200,
+                json={"data": {"xab_abra_accept_terms_of_service": {"new_temp_user_auth": {"access_token": ACCESS_TOKEN}}}},
+            )
+        if b"useAbraSendMessageMutation" in body:
+            if self.prompt is not None:
+                return self.prompt(request)
+            return httpx.Response(200, text="\n".join(self.lines) + "\n")
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def meta(monkeypatch, tmp_path):
+    """Routes every httpx client to a FakeMetaAI; dump files go to tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    fake = FakeMetaAI()
+    original = httpx.AsyncClient
+
+    class Client(original):
+        def __init__(self, *args, **kwargs):
+            kwargs.pop("proxy", None)
+            kwargs["transport"] = httpx.MockTransport(fake)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(httpx, "AsyncClient", Client)
+    return fake
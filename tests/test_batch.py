@@ -0,0 +1,75 @@
+import asyncio
+from urllib.parse import parse_qs
+
+import pytest
+import ujson as json
+
+from meta_ai_api.batch import BatchRunner, parse_item
+
+
+def conversation_ids(meta):
+    ids = []
+    for request in meta.prompts():
+        variables = json.loads(parse_qs(request.content.decode())["variables"][0])
+        ids.append(variables["externalConversationId"])
+    return ids
+
+
+def run(tmp_path, lines):
+    runner = BatchRunner(str(tmp_path / "out.jsonl"), concurrency=1, max_attempts=1)
+    stats = asyncio.run(runner.run(lines))
+    return runner, stats
+
+
+def read_output(tmp_path):
+    with open(tmp_path / "out.jsonl", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_parse_item():
+    assert parse_item('"hi"', 3) == {"prompt": "hi", "id": "3", "new_conversation": True}
+    item = parse_item('{"prompt": "hi", "id": 7, "conversation": "c"}', 1)
+    assert item["id"] == "7" and item["new_conversation"] is False
+    assert parse_item("   ", 1) is None
+    for line in ("42", "[1, 2]", "null", '{"id": 1}', "{not json"):
+        with pytest.raises(ValueError):
+            parse_item(line, 1)
+
+
+def test_invalid_lines_become_error_records(meta, tmp_path):
+    runner, stats = run(tmp_path, ['"first"', "42", "null", '["a"]'])
+    assert stats["succeeded"] == 1 and stats["failed"] == 3
+    records = read_output(tmp_path)
+    assert sorted(r["id"] for r in records if "error" in r) == ["2", "3", "4"]
+    assert runner.completed == {"1"}
+
+
+def test_duplicate_ids_are_rejected(meta, tmp_path):
+    runner, stats = run(tmp_path, ['{"id": "a", "prompt": "one"}', '{"id": "a", "prompt": "two"}'])
+    assert stats["succeeded"] == 1 and stats["failed"] == 1
+    records = read_output(tmp_path)
+    assert sorted((r["prompt"], "error" in r) for r in records) == [("one", False), ("two", True)]
+    assert len(meta.prompts()) == 1
+
+
+def test_checkpoint_skips_finished_items(meta, tmp_path):
+    run(tmp_path, ['"first"', '"second"'])
+    _, stats = run(tmp_path, ['"first"', '"second"', '"third"'])
+    assert stats["skipped"] == 2 and stats["succeeded"] == 1
+    assert len(meta.prompts()) == 3
+
+
+def test_resumed_conversation_continues_after_restart(meta, tmp_path):
+    run(tmp_path, ['{"id": "a", "prompt": "one", "conversation": "chat"}'])
+    resumed, _ = run(
+        tmp_path,
+        [
+            '{"id": "a", "prompt": "one", "conversation": "chat"}',
+            '{"id": "b", "prompt": "two", "conversation": "chat"}',
+        ],
+    )
+    assert resumed.conversations == {"chat": "conv"}
+    first, second = conversation_ids(meta)
+    assert first != "conv"
+    # The restarted run continues the conversation the first run ended in
+    assert second == "conv"
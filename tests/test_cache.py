@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from meta_ai_api import MetaAI
+from meta_ai_api.cache import ResponseCache
+
+
+def test_normalized_hit_returns_a_copy():
+    cache = ResponseCache()
+    cache.set("Hello   World", "anon", {"message": "hi", "media": []})
+    result = cache.get("hello world", "anon")
+    assert result == {"message": "hi", "media": []}
+    result["media"].append("mutated")
+    assert cache.get("hello world", "anon")["media"] == []
+    assert cache.get("hello world", "authed") is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResponseCache(ttl=10)
+    cache.set("q", "anon", {"message": "a"})
+    now[0] += 9
+    assert cache.get("q", "anon") is not None
+    now[0] += 2
+    assert cache.get("q", "anon") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_lru_eviction_by_count_and_bytes():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "m", {"message": "1"})
+    cache.set("b", "m", {"message": "2"})
+    cache.get("a", "m")
+    cache.set("c", "m", {"message": "3"})
+    assert cache.get("b", "m") is None
+    assert cache.get("a", "m") is not None
+
+    small = ResponseCache(max_bytes=40)
+    small.set("a", "m", {"message": "x" * 10})
+    small.set("b", "m", {"message": "y" * 10})
+    assert len(small) == 1
+    assert small.stats()["bytes"] <= 40
+    small.set("huge", "m", {"message": "z" * 100})
+    assert small.get("huge", "m") is None
+
+
+def test_size_is_counted_in_encoded_bytes():
+    cache = ResponseCache()
+    cache.set("q", "m", {"message": "\u00e9" * 10})
+    assert cache.stats()["bytes"] == len('{"message":""}') + 20
+    # 24 characters, but 34 bytes
+    small = ResponseCache(max_bytes=30)
+    small.set("q", "m", {"message": "\u00e9" * 10})
+    assert len(small) == 0
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path)
+    cache.set("q", "anon", {"message": "a"})
+    cache.save()
+    assert ResponseCache(path=path).get("q", "anon") == {"message": "a"}
+
+
+def test_prompt_answers_from_cache_without_touching_the_conversation(meta):
+    async def run():
+        async with MetaAI(cache=ResponseCache()) as ai:
+            first = [r async for r in ai.prompt("Hi", new_conversation=True)]
+            ai.external_conversation_id = "mine"
+            second = [r async for r in ai.prompt("  hi ", new_conversation=True)]
+            return ai, first, second
+
+    ai, first, second = asyncio.run(run())
+    assert len(meta.prompts()) == 1
+    assert second == first and second[0]["message"].strip() == "Hello world"
+    assert ai.external_conversation_id == "mine"
+    assert ai.cache.stats()["hits"] == 1
+
+
+def test_prompt_does_not_cache_an_unfinished_answer(meta):
+    meta.lines = meta.lines[:-1]
+
+    async def run():
+        async with MetaAI(cache=ResponseCache()) as ai:
+            for _ in range(2):
+                async for _ in ai.prompt("hi", stream=True, new_conversation=True):
+                    pass
+            return ai
+
+    ai = asyncio.run(run())
+    assert len(meta.prompts()) == 2
+    assert len(ai.cache) == 0
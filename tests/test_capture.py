@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import ujson as json
+
+from meta_ai_api import Hooks, MetaAI, TailCapture
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_decoded_entries_count_towards_max_bytes(tmp_path):
+    capture = TailCapture(str(tmp_path / "tail.jsonl"), max_bytes=200)
+    for i in range(20):
+        capture.add(1, "extracted", {"message": "x" * 50, "index": i})
+    buffer = capture._buffers[1]
+    assert buffer.size <= 200 and buffer.dropped > 0
+    assert len(buffer.entries) < 20
+
+
+def test_attach_is_idempotent_per_bus(meta, tmp_path):
+    path = str(tmp_path / "tail.jsonl")
+    capture = TailCapture(path, latency_threshold=0.0)
+    hooks = Hooks()
+
+    async def run():
+        sessions = [MetaAI(hooks=hooks, capture=capture) for _ in range(3)]
+        async with sessions[0] as ai:
+            async for _ in ai.prompt("hi"):
+                pass
+
+    asyncio.run(run())
+    (record,) = read(path)
+    assert record["reasons"] == ["slow"]
+    endpoints = [entry["endpoint"] for entry in record["entries"]]
+    # The access token fetch inside the prompt and the prompt request itself
+    assert endpoints.count("event:request_start") == 2
+    assert endpoints.count("event:done") == 1
+
+
+def test_fast_prompts_are_discarded(meta, tmp_path):
+    path = tmp_path / "tail.jsonl"
+    capture = TailCapture(str(path), latency_threshold=60.0)
+
+    async def run():
+        async with MetaAI(capture=capture) as ai:
+            async for _ in ai.prompt("hi"):
+                pass
+
+    asyncio.run(run())
+    assert not path.exists()
+    assert capture.stats() == {"in_flight": 0, "kept": 0, "discarded": 1}
+
+
+def test_concurrent_prompts_fill_their_own_buffers(meta, tmp_path):
+    async def slow(request):
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, text="\n".join(meta.lines) + "\n")
+
+    meta.prompt = slow
+    path = str(tmp_path / "tail.jsonl")
+    capture = TailCapture(path, latency_threshold=0.0)
+
+    async def run():
+        # No Hooks passed: the capture registers on the session's own bus
+        async with MetaAI(capture=capture) as ai:
+            ai.access_token = await ai.get_access_token()
+
+            async def one():
+                async for _ in ai.prompt("hi", stream=True):
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(one(), one())
+
+    asyncio.run(run())
+    records = read(path)
+    assert len(records) == 2 and records[0]["request"] != records[1]["request"]
+    for record in records:
+        endpoints = [entry["endpoint"] for entry in record["entries"]]
+        assert endpoints.count("prompt (stream - first line)") == 1
+        assert sum(endpoint.startswith("stream_response") for endpoint in endpoints) == 2
+        assert endpoints.count("extracted") == 2
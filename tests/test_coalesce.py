@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+
+from meta_ai_api import MetaAI
+from meta_ai_api.coalesce import SingleFlight
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_identical_calls_share_one_upstream():
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(collect(flights.stream("k", upstream)) for _ in range(3)))
+        return flights, results
+
+    flights, results = asyncio.run(run())
+    assert results == [[0, 1, 2]] * 3
+    assert len(calls) == 1
+    assert flights.started == 1 and flights.coalesced == 2
+    assert flights.in_flight() == 0
+
+
+def test_late_joiner_gets_earlier_chunks():
+    release = None
+
+    async def upstream():
+        yield "a"
+        await release.wait()
+        yield "b"
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        flights = SingleFlight()
+        first = asyncio.create_task(collect(flights.stream("k", upstream)))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(collect(flights.stream("k", upstream)))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await first, await second
+
+    assert asyncio.run(run()) == (["a", "b"], ["a", "b"])
+
+
+def test_errors_reach_every_subscriber():
+    async def upstream():
+        yield 1
+        raise ValueError("upstream failed")
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(
+            collect(flights.stream("k", upstream)), collect(flights.stream("k", upstream)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_upstream_cancelled_when_last_subscriber_leaves():
+    cancelled = False
+
+    async def upstream():
+        nonlocal cancelled
+        try:
+            yield 1
+            await asyncio.sleep(10)
+            yield 2
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def run():
+        flights = SingleFlight()
+        stream = flights.stream("k", upstream)
+        assert await stream.__anext__() == 1
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        return flights.in_flight()
+
+    assert asyncio.run(run()) == 0
+    assert cancelled
+
+
+def test_followers_keep_their_own_conversation(meta):
+    body = "\n".join(meta.lines) + "\n"
+
+    async def slow(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, text=body)
+
+    meta.prompt = slow
+
+    async def run():
+        flights = SingleFlight()
+        async with MetaAI(coalescer=flights) as leader, MetaAI(coalescer=flights) as follower:
+            follower.external_conversation_id = "follower-conversation"
+            results = await asyncio.gather(
+                collect(leader.prompt("hi", new_conversation=True)),
+                collect(follower.prompt("hi", new_conversation=True)),
+            )
+            return leader, follower, flights, results
+
+    leader, follower, flights, results = asyncio.run(run())
+    assert len(meta.prompts()) == 1 and flights.coalesced == 1
+    assert results[0] == results[1]
+    assert leader.external_conversation_id == "conv"
+    assert follower.external_conversation_id == "follower-conversation"
@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from meta_ai_api import Deadline, MetaAI
+from meta_ai_api.exceptions import MetaAITimeout
+
+
+def slow_body(meta, first_delay, gap, lines=None):
+    """Answers prompts with headers at once, then one line per gap after first_delay."""
+
+    async def body():
+        await asyncio.sleep(first_delay)
+        for index, line in enumerate(lines or meta.lines):
+            if index:
+                await asyncio.sleep(gap)
+            yield (line + "\n").encode()
+
+    meta.prompt = lambda request: httpx.Response(200, content=body())
+
+
+async def prompt(deadline, stream):
+    async with MetaAI() as ai:
+        ai.access_token = "token"
+        return [chunk async for chunk in ai.prompt("hi", stream=stream, deadline=deadline)]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_first_byte_does_not_cap_generation(meta, stream):
+    slow_body(meta, first_delay=0.05, gap=0.2)
+    results = asyncio.run(prompt(Deadline(first_byte=0.3), stream))
+    assert results[-1]["message"] == "Hello world\n"
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize(
+    "deadline, first_delay, gap, phase",
+    [
+        (Deadline(first_byte=0.1), 0.5, 0.0, "first_byte"),
+        (Deadline(idle=0.1), 0.0, 0.5, "idle"),
+        (Deadline(idle=0.3, total=0.5), 0.0, 0.2, "total"),
+    ],
+)
+def test_limits_apply_to_the_body(meta, stream, deadline, first_delay, gap, phase):
+    slow_body(meta, first_delay, gap, lines=meta.lines * 2)
+    with pytest.raises(MetaAITimeout) as raised:
+        asyncio.run(prompt(deadline, stream))
+    assert raised.value.phase == phase
+
+
+def test_total_covers_retries():
+    async def run():
+        deadline = Deadline(total=0.2).start()
+        await deadline.sleep(0.1)
+        with pytest.raises(MetaAITimeout):
+            await deadline.sleep(0.5)
+
+    asyncio.run(run())
+
+
+def test_idle_does_not_bound_the_wait_for_headers(meta):
+    async def slow_headers(request):
+        # Emulates the socket: the read timeout also covers the wait for headers
+        try:
+            await asyncio.wait_for(asyncio.sleep(0.5), request.extensions["timeout"]["read"])
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout("read timed out", request=request)
+        return httpx.Response(200, text="\n".join(meta.lines) + "\n")
+
+    meta.prompt = slow_headers
+    assert Deadline(first_byte=2.0, idle=0.1).httpx_timeout().read == 30.0
+    with pytest.raises(MetaAITimeout) as raised:
+        asyncio.run(prompt(Deadline(first_byte=0.3, idle=0.1), stream=True))
+    assert raised.value.phase == "first_byte"
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+import ujson as json
+
+from meta_ai_api import MetaAI
+from meta_ai_api.decoding import LineDecoder, MsgspecDecoder, UjsonDecoder, _needed_fields, _sample_line, get_decoder, msgspec
+
+needs_msgspec = pytest.mark.skipif(msgspec is None, reason="msgspec is not installed")
+
+
+@needs_msgspec
+def test_msgspec_decoder_reads_the_same_fields():
+    line = _sample_line()
+    decoded = MsgspecDecoder().decode(line)
+    assert _needed_fields(decoded) == _needed_fields(UjsonDecoder().decode(line))
+    assert "tracking" not in decoded["data"]["node"]["bot_response_message"]
+    # Lines that do not fit the schema fall back to the full decode
+    assert MsgspecDecoder().decode(b'{"data": 5}') == {"data": 5}
+    with pytest.raises(ValueError):
+        MsgspecDecoder().decode(b"{broken")
+
+
+@needs_msgspec
+def test_complete_replaces_partial_decoders():
+    assert get_decoder("msgspec").complete is False
+    assert get_decoder("msgspec", complete=True).complete is True
+    assert get_decoder(complete=True).complete is True
+    decoder = UjsonDecoder()
+    assert get_decoder(decoder, complete=True) is decoder
+
+
+@needs_msgspec
+@pytest.mark.parametrize("stream", [False, True])
+def test_keep_raw_holds_the_full_payload(meta, stream):
+    def with_extras(line):
+        payload = json.loads(line)
+        message = payload["data"]["node"]["bot_response_message"]
+        message["tracking"] = {"kept": True}
+        if "imagine_card" in message:
+            message["imagine_card"]["session"]["media_sets"][0]["imagine_media"][0]["width"] = 512
+        return json.dumps(payload)
+
+    meta.lines = [with_extras(line) for line in meta.lines]
+
+    async def run():
+        async with MetaAI(keep_raw=True, decoder="msgspec") as ai:
+            return [chunk async for chunk in ai.prompt("hi", stream=stream)][-1]
+
+    result = asyncio.run(run())
+    assert result.raw["data"]["node"]["bot_response_message"]["tracking"] == {"kept": True}
+    assert result.media[0].raw["width"] == 512
+
+
+def test_decoder_without_decode_fails_at_instantiation():
+    class Nameless(LineDecoder):
+        name = "nameless"
+
+    with pytest.raises(TypeError):
+        Nameless()
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+import ujson as json
+
+from meta_ai_api import MetaAI, TraceWriter
+from meta_ai_api.delta import SnapshotDecoder, SnapshotEncoder, diff, from_json_safe, patch, to_json_safe
+from meta_ai_api.trace import read_trace, trace_files
+
+PAIRS = [
+    ("Hello", "Hello world"),
+    (b"Hello", b"Hello world"),
+    (b'{"text": "a"}', b'{"text": "ab"}'),
+    ({"a": 1, "b": [1, 2]}, {"b": [1, 3, 4], "c": {"d": b"x"}}),
+    ({"a": 1, "b": 2}, {"b": 2, "a": 1}),
+    ([1, 2, 3], [1]),
+    ("text", b"text"),
+]
+
+
+@pytest.mark.parametrize("previous, current", PAIRS)
+def test_patch_reverses_diff(previous, current):
+    result = patch(previous, diff(previous, current))
+    assert result == current and type(result) is type(current)
+    if isinstance(current, dict):
+        assert list(result) == list(current)
+
+
+@pytest.mark.parametrize("previous, current", PAIRS)
+def test_json_form_keeps_bytes(previous, current):
+    encoded = json.loads(json.dumps(to_json_safe(diff(previous, current))))
+    assert patch(previous, from_json_safe(encoded)) == current
+
+
+def test_snapshot_streams_and_keyframes():
+    encoder = SnapshotEncoder(keyframe_interval=2, max_streams=1)
+    decoder = SnapshotDecoder()
+    lines = [b"a", b"ab", b"abc", b"abcd"]
+    encoded = [encoder.encode("s", line) for line in lines]
+    assert ["full" in e for e in encoded] == [True, False, False, True]
+    assert [decoder.decode("s", e) for e in encoded] == lines
+    encoder.encode("other", b"x")
+    assert "full" in encoder.encode("s", b"abcde")
+
+
+def test_json_trace_keeps_bytes_snapshots(tmp_path):
+    prefix = str(tmp_path / "trace")
+    writer = TraceWriter(prefix, codec="gzip", serializer="json", delta=True)
+    lines = [b'{"text": "Hel"}', b'{"text": "Hello \\u00e9"}', b'{"text": "Hello \\u00e9!"}']
+    writer.write("prompt (stream - first line)", lines[0], conversation="c", request=1)
+    for i, line in enumerate(lines[1:], 2):
+        writer.write(f"stream_response (line {i})", line, conversation="c", request=1)
+    writer.close()
+    (path,) = trace_files(prefix)
+    assert [record["data"] for record in read_trace(path)] == lines
+
+
+def test_json_dump_round_trip(meta, tmp_path):
+    async def run():
+        async with MetaAI(delta_snapshots=True) as ai:
+            async for _ in ai.prompt("hi", stream=True):
+                pass
+            ai.save_json_dump()
+            return ai.raw_responses(), ai.json_dump_file
+
+    expected, path = asyncio.run(run())
+    loaded = MetaAI.load_raw_responses(path)
+    snapshots = [entry["data"] for entry in expected if entry["endpoint"].startswith("stream_response")]
+    assert snapshots and all(isinstance(data, bytes) for data in snapshots)
+    assert [entry["data"] for entry in loaded if entry["endpoint"].startswith("stream_response")] == snapshots
+
+
+def test_non_stream_body_is_delta_encoded_per_line(meta, tmp_path):
+    async def run():
+        async with MetaAI(delta_snapshots=True) as ai:
+            async for _ in ai.prompt("hi"):
+                pass
+            return ai.all_raw_responses, ai.raw_responses(), ai.dump_file
+
+    stored, expanded, dump_file = asyncio.run(run())
+    body = [entry for entry in stored if entry["endpoint"].startswith("prompt (non-stream")]
+    assert [entry["endpoint"] for entry in body] == [f"prompt (non-stream - line {i})" for i in (1, 2, 3)]
+    assert all("snapshot" in entry for entry in body)
+    assert "full" in body[0]["snapshot"] and "delta" in body[2]["snapshot"]
+    (final,) = [entry for entry in stored if entry["endpoint"] == "extract_last_response (FINAL)"]
+    assert final["snapshot"] == {"delta": None}
+    lines = [entry["data"] for entry in expanded if entry["endpoint"].startswith("prompt (non-stream")]
+    assert lines == [line.encode() for line in meta.lines]
+    with open(dump_file, encoding="utf-8") as f:
+        text = f.read()
+    # The text dump stays readable
+    assert "$bytes" not in text and meta.lines[-1] in text
+
+
+def test_concurrent_prompts_keep_separate_delta_chains(meta):
+    async def run():
+        async with MetaAI(delta_snapshots=True) as ai:
+            ai.access_token = await ai.get_access_token()
+
+            async def one():
+                async for _ in ai.prompt("hi", stream=True):
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(one(), one())
+            return ai.raw_responses()
+
+    expanded = asyncio.run(run())
+    snapshots = [entry["data"] for entry in expanded if entry["endpoint"].startswith("stream_response")]
+    assert sorted(snapshots) == sorted([line.encode() for line in meta.lines[1:]] * 2)
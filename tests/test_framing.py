@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from meta_ai_api.framing import LineTooLong, NDJSONFramer
+
+
+def frame(chunks, **kwargs):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        framer = NDJSONFramer(**kwargs)
+        return [line async for line in framer.frames(source())], framer
+
+    return asyncio.run(run())
+
+
+def test_lines_split_across_chunks():
+    lines, framer = frame([b'{"a":', b"1}\r\n\n{", b'"b":2}\n{"c"', b":3}"])
+    assert lines == [b'{"a":1}', b'{"b":2}', b'{"c":3}']
+    assert framer.lines == 3 and framer.bytes == sum(map(len, [b'{"a":', b"1}\r\n\n{", b'"b":2}\n{"c"', b":3}"]))
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_any_chunking_gives_the_same_lines(size):
+    data = b"".join(b'{"n":%d,"pad":"%s"}\n' % (i, b"x" * i) for i in range(30))
+    lines, _ = frame([data[i:i + size] for i in range(0, len(data), size)])
+    assert lines == data.split(b"\n")[:-1]
+
+
+def test_oversized_lines_are_skipped_without_buffering():
+    lines, framer = frame([b"short\n", b"x" * 10, b"y" * 10, b"z\nafter\n"], max_line_bytes=8)
+    assert lines == [b"short", b"after"]
+    assert framer.oversized == 1
+
+
+def test_oversized_lines_can_raise():
+    with pytest.raises(LineTooLong):
+        frame([b"x" * 20 + b"\n"], max_line_bytes=8, raise_on_oversize=True)
@@ -0,0 +1,114 @@
+import asyncio
+
+import ujson as json
+
+from meta_ai_api.gateway import Gateway
+
+
+async def request(port, method, path, body=None, headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nhost: test\r\nconnection: close\r\ncontent-length: {len(payload)}\r\n"
+    for name, value in (headers or {}).items():
+        head += f"{name}: {value}\r\n"
+    writer.write(head.encode() + b"\r\n" + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), content
+
+
+def serve(test, **kwargs):
+    async def run():
+        gateway = Gateway(port=0, identities=2, **kwargs)
+        await gateway.start()
+        try:
+            return await test(gateway._server.sockets[0].getsockname()[1])
+        finally:
+            await gateway.close()
+
+    return asyncio.run(run())
+
+
+def chat(text, **extra):
+    return {"messages": [{"role": "system", "content": "x"}, {"role": "user", "content": text}], **extra}
+
+
+def test_completion_and_continuation(meta):
+    async def test(port):
+        status, body = await request(port, "POST", "/v1/chat/completions", chat("hi"))
+        assert status == 200
+        completion = json.loads(body)
+        assert completion["choices"][0]["message"]["content"] == "Hello world\n"
+        conversation = completion["conversation_id"]
+        status, _ = await request(port, "POST", "/v1/chat/completions", chat("more", conversation_id=conversation))
+        assert status == 200
+        status, body = await request(port, "POST", "/v1/chat/completions", chat("more", conversation_id="nope"))
+        assert status == 404
+        status, body = await request(port, "GET", "/health")
+        return json.loads(body)
+
+    health = serve(test)
+    assert health["status"] == "ok" and health["busy"] == 0 and health["conversations"] == 1
+
+
+def test_streaming_sends_deltas(meta):
+    async def test(port):
+        return await request(port, "POST", "/v1/chat/completions", chat("hi", stream=True))
+
+    status, body = serve(test)
+    events = [line[len(b"data: "):] for line in body.split(b"\n\n") if line.startswith(b"data: ")]
+    assert status == 200 and events[-1] == b"[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    text = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks)
+    assert text == "Hello world\n"
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+    assert chunks[-1]["conversation_id"]
+
+
+def test_api_key_and_bad_requests(meta):
+    async def test(port):
+        denied, _ = await request(port, "GET", "/v1/models")
+        allowed, _ = await request(port, "GET", "/v1/models", headers={"authorization": "Bearer secret"})
+        no_user, _ = await request(
+            port, "POST", "/v1/chat/completions", {"messages": []}, headers={"authorization": "Bearer secret"}
+        )
+        return denied, allowed, no_user
+
+    assert serve(test, api_key="secret") == (401, 200, 400)
+
+
+def test_malformed_requests_get_an_error_body(meta):
+    async def raw(port, head, payload=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(head.encode() + b"\r\n" + payload)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, content = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), content
+
+    async def test(port):
+        head = "POST /v1/chat/completions HTTP/1.1\r\nhost: test\r\ncontent-length: many\r\n"
+        responses = [await raw(port, head)]
+        for body in ([1, 2], {"messages": ["hi"]}, {"messages": "hi"}):
+            responses.append(await request(port, "POST", "/v1/chat/completions", body))
+        return responses
+
+    for status, content in serve(test):
+        error = json.loads(content)["error"]
+        assert status == 400 and error["code"] == 400 and error["message"]
+
+
+def test_streaming_revised_text_is_not_resent(meta):
+    meta.lines[-1] = meta.lines[-1].replace("Hello world", "Hi world")
+
+    async def test(port):
+        return await request(port, "POST", "/v1/chat/completions", chat("hi", stream=True))
+
+    _, body = serve(test)
+    chunks = [json.loads(line[len(b"data: "):]) for line in body.split(b"\n\n")[:-2] if line.startswith(b"data: ")]
+    text = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks)
+    assert text == "Hello"
+    assert chunks[-1]["revised_content"] == "Hi world\n"
@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from meta_ai_api import Hooks, MetaAI
+
+
+def test_registration_and_wildcard():
+    hooks = Hooks()
+    assert not hooks.active
+    seen = []
+
+    @hooks.on("retry")
+    def on_retry(event):
+        seen.append(("retry", event.data["attempt"]))
+
+    hooks.on("*", lambda event: seen.append(("*", event.name)))
+    hooks.emit("retry", 1, attempt=2)
+    hooks.emit("done", 1)
+    assert seen == [("retry", 2), ("*", "retry"), ("*", "done")]
+    hooks.off("retry", on_retry)
+    assert hooks.active
+    with pytest.raises(ValueError):
+        hooks.on("unknown", print)
+
+
+def test_handler_errors_do_not_propagate():
+    hooks = Hooks()
+    hooks.on("done", lambda event: 1 / 0)
+    hooks.emit("done", 1)
+
+
+def test_prompt_lifecycle_events(meta):
+    hooks = Hooks()
+    events = []
+    hooks.on("*", events.append)
+
+    async def run():
+        async with MetaAI(hooks=hooks) as ai:
+            async for _ in ai.prompt("hi", stream=True):
+                pass
+
+    asyncio.run(run())
+    # The cookie fetch runs before the prompt, the access token fetch inside it
+    setup = [(event.name, event.data["operation"]) for event in events[:4]]
+    assert setup == [
+        ("request_start", "get_cookies"),
+        ("headers", "get_cookies"),
+        ("request_start", "useAbraAcceptTOSForTempUserMutation"),
+        ("headers", "useAbraAcceptTOSForTempUserMutation"),
+    ]
+    assert events[0].request is None and events[3].data["status"] == 200
+    prompt = events[2:]
+    names = [event.name for event in prompt]
+    assert names[2:5] == ["request_start", "headers", "first_chunk"]
+    assert names[-1] == "done" and names.count("chunk") == 2
+    assert len({event.request for event in prompt}) == 1
+    assert prompt[-1].data["closed"] is False
+
+
+def test_concurrent_prompts_keep_their_request_ids(meta):
+    async def slow(request):
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, text="\n".join(meta.lines) + "\n")
+
+    meta.prompt = slow
+    hooks = Hooks()
+    events = []
+    hooks.on("*", events.append)
+
+    async def run():
+        async with MetaAI(hooks=hooks) as ai:
+            ai.access_token = await ai.get_access_token()
+
+            async def one():
+                async for _ in ai.prompt("hi", stream=True):
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(one(), one())
+
+    asyncio.run(run())
+    by_request = {}
+    for event in events:
+        if event.request is not None:
+            by_request.setdefault(event.request, []).append(event.name)
+    assert len(by_request) == 2
+    for names in by_request.values():
+        assert names[0] == "request_start" and names[-1] == "done"
+        assert names.count("request_start") == 1 and names.count("chunk") == 2
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+
+from meta_ai_api import Hooks
+from meta_ai_api.limiter import AdaptiveLimiter
+
+
+def test_permits_are_granted_in_order():
+    async def run():
+        limiter = AdaptiveLimiter(initial_limit=2)
+        first, second = await limiter.acquire(), await limiter.acquire()
+        order = []
+
+        async def wait(name):
+            permit = await limiter.acquire()
+            order.append(name)
+            return permit
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("a", "b")]
+        await asyncio.sleep(0)
+        assert limiter.stats()["waiting"] == 2 and not order
+        limiter.release(first, sample=False)
+        await asyncio.sleep(0)
+        assert order == ["a"]
+        limiter.release(second, sample=False)
+        for permit in await asyncio.gather(*waiters):
+            limiter.release(permit, sample=False)
+        return order, limiter.in_flight
+
+    assert asyncio.run(run()) == (["a", "b"], 0)
+
+
+def test_cancelled_waiter_does_not_leak_a_permit():
+    async def run():
+        limiter = AdaptiveLimiter(initial_limit=1)
+        held = await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # Granted and cancelled in the same loop iteration
+        limiter.release(held, sample=False)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return limiter.in_flight, limiter.stats()["waiting"]
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+def sample(limiter, latency, error=False, in_flight=None):
+    permit = asyncio.run(limiter.acquire())
+    permit.started = time.monotonic() - latency
+    permit.error = error
+    if in_flight is not None:
+        permit.in_flight = in_flight
+    limiter.release(permit)
+
+
+def test_aimd_grows_when_saturated_and_backs_off_on_errors():
+    limiter = AdaptiveLimiter(initial_limit=2, algorithm="aimd", backoff=0.5)
+    for _ in range(8):
+        sample(limiter, 0.01, in_flight=2)
+    assert limiter.limit > 2
+    grown = limiter._limit
+    sample(limiter, 0.01, error=True)
+    assert limiter._limit == pytest.approx(max(1, grown * 0.5))
+    # The calls admitted under the old limit do not drop it again
+    sample(limiter, 0.01, error=True)
+    assert limiter.drops == 1 and limiter.errors == 2
+
+
+def test_aimd_does_not_grow_unused_limit():
+    limiter = AdaptiveLimiter(initial_limit=8, algorithm="aimd")
+    for _ in range(20):
+        sample(limiter, 0.01)
+    assert limiter.limit == 8
+
+
+def test_gradient_shrinks_when_latency_rises():
+    limiter = AdaptiveLimiter(initial_limit=16, algorithm="gradient", tolerance=1.0, smoothing=0.5)
+    for _ in range(5):
+        sample(limiter, 0.01, in_flight=16)
+    settled = limiter._limit
+    for _ in range(40):
+        sample(limiter, 0.5, in_flight=16)
+    assert limiter._limit < settled
+
+
+def test_slot_marks_errors_and_skips_cancellations():
+    async def run():
+        limiter = AdaptiveLimiter()
+        with pytest.raises(RuntimeError):
+            async with limiter.slot():
+                raise RuntimeError("boom")
+        errors = limiter.errors
+
+        async def hang():
+            async with limiter.slot():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(hang())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return errors, limiter.latency, limiter.in_flight
+
+    assert asyncio.run(run()) == (1, None, 0)
+
+
+def test_retries_drop_the_limit():
+    hooks = Hooks()
+    limiter = AdaptiveLimiter(initial_limit=8).attach(hooks)
+    hooks.emit("retry", 1, reason="no valid response")
+    assert limiter.limit == 4
+
+
+def test_settings_round_trip_and_validation():
+    limiter = AdaptiveLimiter(initial_limit=100, max_limit=10, algorithm="gradient")
+    assert limiter.limit == 10
+    assert AdaptiveLimiter(**limiter.settings()).settings() == limiter.settings()
+    with pytest.raises(ValueError):
+        AdaptiveLimiter(algorithm="vegas")
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import os
+
+import httpx
+
+from meta_ai_api.media import MediaDownloader
+
+IMAGE = b"\x89PNG" + bytes(range(256)) * 64
+
+
+def download(directory, handler, medias, **kwargs):
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with MediaDownloader(str(directory), client=client, chunk_size=1024, **kwargs) as downloader:
+            result = await downloader.download(medias)
+        await client.aclose()
+        return result
+
+    return asyncio.run(run())
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(str(request.url))
+        return httpx.Response(200, content=IMAGE, headers={"content-type": "image/png"})
+
+    medias = [{"url": "https://cdn/a.png"}, {"url": "https://cdn/b.png"}, {"url": "https://cdn/a.png"}]
+    result = download(tmp_path, handler, medias)
+    digest = hashlib.sha256(IMAGE).hexdigest()
+    assert {os.path.basename(item["path"]) for item in result} == {digest + ".png"}
+    assert sorted(set(requests)) == ["https://cdn/a.png", "https://cdn/b.png"]
+
+    # Already indexed URLs are not fetched again
+    requests.clear()
+    download(tmp_path, handler, [{"url": "https://cdn/a.png"}])
+    assert requests == []
+
+
+def test_resumes_partial_download_with_range(tmp_path):
+    url = "https://cdn/a.png"
+    partial = tmp_path / ".partial"
+    partial.mkdir(parents=True)
+    (partial / (hashlib.sha256(url.encode()).hexdigest() + ".part")).write_bytes(IMAGE[:100])
+    ranges = []
+
+    def handler(request):
+        ranges.append(request.headers.get("range"))
+        return httpx.Response(206, content=IMAGE[100:], headers={"content-type": "image/png"})
+
+    (item,) = download(tmp_path, handler, [{"url": url}])
+    assert ranges == ["bytes=100-"]
+    with open(item["path"], "rb") as f:
+        assert f.read() == IMAGE
+
+
+def test_retries_transient_errors_and_reports_failures(tmp_path, monkeypatch):
+    async def no_sleep(_):
+        pass
+
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+    attempts = {}
+
+    def handler(request):
+        url = str(request.url)
+        attempts[url] = attempts.get(url, 0) + 1
+        if url.endswith("flaky.png") and attempts[url] < 3:
+            return httpx.Response(503)
+        if url.endswith("gone.png"):
+            return httpx.Response(404)
+        return httpx.Response(200, content=IMAGE, headers={"content-type": "image/png"})
+
+    flaky, gone = download(
+        tmp_path, handler, [{"url": "https://cdn/flaky.png"}, {"url": "https://cdn/gone.png"}], max_retries=3
+    )
+    assert flaky["path"] is not None and attempts["https://cdn/flaky.png"] == 3
+    assert gone["path"] is None and "404" in gone["error"]
+    assert attempts["https://cdn/gone.png"] == 1
+
+
+def test_complete_partial_file_keeps_its_content_type(tmp_path):
+    url = "https://cdn/a.png"
+    partial = tmp_path / ".partial"
+    partial.mkdir(parents=True)
+    (partial / (hashlib.sha256(url.encode()).hexdigest() + ".part")).write_bytes(IMAGE)
+    methods = []
+
+    def handler(request):
+        methods.append(request.method)
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"content-type": "image/png"})
+        return httpx.Response(416, headers={"content-type": "text/html"})
+
+    # Without a type recorded by an earlier attempt, a HEAD request supplies it
+    (item,) = download(tmp_path, handler, [{"url": url}])
+    assert methods == ["GET", "HEAD"]
+    assert item["path"].endswith(".png")
+
+
+def test_interrupted_download_records_its_content_type(tmp_path, monkeypatch):
+    url = "https://cdn/a.png"
+    attempts = []
+
+    async def no_sleep(_):
+        pass
+
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+
+    def handler(request):
+        attempts.append(request.headers.get("range"))
+        if len(attempts) == 1:
+            async def body():
+                yield IMAGE[:2048]
+                raise httpx.ReadError("connection lost")
+
+            return httpx.Response(200, content=body(), headers={"content-type": "image/png"})
+        return httpx.Response(416)
+
+    (item,) = download(tmp_path, handler, [{"url": url}])
+    assert attempts[0] is None and attempts[1] == "bytes=2048-"
+    assert item["path"].endswith(".png")
+    assert os.listdir(tmp_path / ".partial") == []
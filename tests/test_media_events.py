@@ -0,0 +1,23 @@
+import asyncio
+
+from meta_ai_api import MetaAI
+
+
+async def prompt(**kwargs):
+    async with MetaAI() as ai:
+        return [chunk async for chunk in ai.prompt("draw", media_events=True, **kwargs)]
+
+
+def test_media_events_precede_the_chunks_that_carry_them(meta):
+    results = asyncio.run(prompt(stream=True))
+    kinds = [r["media"]["url"] if "event" in r else r["message"].strip() for r in results]
+    # The first line only serves to detect an error response
+    assert kinds == ["u1", "Hello", "u2", "Hello world"]
+    assert all(r["uuid"] == results[-1]["uuid"] for r in results if "event" in r)
+
+
+def test_media_events_without_streaming_yield_one_final_chunk(meta):
+    results = asyncio.run(prompt(stream=False))
+    assert [r.get("event") for r in results] == ["media", "media", None]
+    assert results[-1]["message"] == "Hello world\n"
+    assert [m["url"] for m in results[-1]["media"]] == ["u1", "u2"]
@@ -0,0 +1,93 @@
+import asyncio
+
+from meta_ai_api import AdaptiveLimiter, merge_streams, stream_many
+from meta_ai_api.main import MetaAI
+
+
+def numbers(count, delay=0.0, fail=False):
+    async def generate():
+        for i in range(count):
+            await asyncio.sleep(delay)
+            yield i
+        if fail:
+            raise ValueError("broken stream")
+
+    return generate
+
+
+async def collect(events, consume_delay=0.0):
+    items = []
+    async for event in events:
+        items.append(event)
+        await asyncio.sleep(consume_delay)
+    return items
+
+
+def test_events_are_tagged_and_errors_stay_local():
+    events = asyncio.run(collect(merge_streams({"a": numbers(3), "b": numbers(2, fail=True)})))
+    assert [e["chunk"] for e in events if e["stream"] == "a" and e["event"] == "chunk"] == [0, 1, 2]
+    assert [e["event"] for e in events if e["stream"] == "b"][-1] == "error"
+    assert [e["event"] for e in events if e["stream"] == "a"][-1] == "done"
+
+
+def test_concurrency_bounds_running_streams():
+    running = peak = 0
+
+    def tracked():
+        async def generate():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            yield 1
+            running -= 1
+
+        return generate
+
+    asyncio.run(collect(merge_streams({i: tracked() for i in range(6)}, concurrency=2)))
+    assert peak == 2
+
+
+def test_early_exit_closes_every_stream():
+    closed = []
+
+    def endless(key):
+        async def generate():
+            try:
+                while True:
+                    await asyncio.sleep(0)
+                    yield key
+            finally:
+                closed.append(key)
+
+        return generate
+
+    async def run():
+        async for event in merge_streams({k: endless(k) for k in "abc"}):
+            break
+
+    asyncio.run(run())
+    assert sorted(closed) == ["a", "b", "c"]
+
+
+def test_slow_consumer_does_not_count_as_upstream_latency():
+    limiter = AdaptiveLimiter(initial_limit=2)
+    streams = {i: numbers(5) for i in range(2)}
+    asyncio.run(collect(merge_streams(streams, max_buffer=1, limiter=limiter), consume_delay=0.05))
+    assert limiter.latency is not None and limiter.latency < 0.1
+    assert limiter.drops == 0
+
+
+def test_stream_many_shares_sessions(meta):
+    async def run():
+        sessions = [MetaAI(), MetaAI()]
+        for ai in sessions:
+            await ai.initialize()
+        try:
+            return await collect(stream_many(sessions, {i: f"prompt {i}" for i in range(4)}))
+        finally:
+            for ai in sessions:
+                await ai.close()
+
+    events = asyncio.run(run())
+    assert sorted(e["stream"] for e in events if e["event"] == "done") == [0, 1, 2, 3]
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+import ujson
+
+from meta_ai_api.models import Media, PromptResult, Source, to_plain
+
+
+def make_result():
+    return PromptResult(
+        "answer",
+        [Source("Title", "https://example.com", raw={"title": "Title"})],
+        [Media("https://cdn/x.png", "IMAGE", "cat")],
+        "conv",
+        raw={"data": {}},
+    )
+
+
+def test_dict_read_interface():
+    result = make_result()
+    assert result["message"] == "answer"
+    assert result.get("uuid") == "conv"
+    assert result.get("raw") is None and "raw" not in result
+    assert result.get("missing", 1) == 1
+    assert list(result) == ["message", "sources", "media", "uuid"]
+    assert result["media"][0]["url"] == "https://cdn/x.png"
+    with pytest.raises(KeyError):
+        result["raw"]
+
+
+def test_slots_keep_instances_small():
+    result = make_result()
+    assert not hasattr(result, "__dict__")
+    with pytest.raises(AttributeError):
+        result.extra = 1
+
+
+def test_plain_round_trip_drops_raw():
+    result = make_result()
+    plain = to_plain({"result": result, "list": [result]})
+    assert plain["result"] == {
+        "message": "answer",
+        "sources": [{"title": "Title", "link": "https://example.com"}],
+        "media": [{"url": "https://cdn/x.png", "type": "IMAGE", "prompt": "cat"}],
+        "uuid": "conv",
+    }
+    assert PromptResult.from_dict(plain["result"]) == result
+    assert result == plain["result"]
+
+
+def test_from_payload_keeps_raw_only_on_request():
+    payload = {"uri": "u", "media_type": "IMAGE", "prompt": "p", "extra": 1}
+    assert Media.from_payload(payload).raw is None
+    assert Media.from_payload(payload, keep_raw=True).raw is payload
+    assert Source.from_payload({"title": "t", "link": "l"}, keep_raw=True).raw == {"title": "t", "link": "l"}
+
+
+def test_records_are_dicts():
+    result = make_result()
+    assert json.loads(json.dumps(result)) == to_plain(result)
+    assert ujson.loads(ujson.dumps(result)) == to_plain(result)
+    result["message"] = "edited"
+    result["extra"] = 1
+    assert result.message == "edited" and result["extra"] == 1
+    result.uuid = "other"
+    assert result["uuid"] == "other" and isinstance(result, dict)
+
+
+def test_raw_fields_answer_the_dict_interface():
+    source = Source.from_payload({"title": "t", "link": "l", "snippet": "s"}, keep_raw=True)
+    assert source["snippet"] == "s" and source.get("snippet") == "s" and "snippet" in source
+    assert list(source) == ["title", "link"]
+    plain = Source.from_payload({"title": "t", "link": "l", "snippet": "s"})
+    assert plain.get("snippet") is None and "snippet" not in plain
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+
+from meta_ai_api import LoopWatchdog, MetaAI, Offloader
+from meta_ai_api import main
+
+
+def test_call_offloads_from_threshold():
+    offload = Offloader(threads=1, threshold=10)
+
+    async def run():
+        inline = await offload.call(threading.get_ident, size=1)
+        threaded = await offload.call(threading.get_ident, size=10)
+        return inline, threaded
+
+    inline, threaded = asyncio.run(run())
+    offload.close()
+    assert inline == threading.get_ident()
+    assert threaded != inline and offload.offloaded == 1
+
+
+def test_only_parsing_leaves_the_loop(meta, monkeypatch):
+    threads = {}
+    scan = main._scan_response
+    apply_scan = MetaAI._apply_scan
+
+    def recording_scan(*args):
+        threads["scan"] = threading.get_ident()
+        return scan(*args)
+
+    def recording_apply(self, result):
+        threads["apply"] = threading.get_ident()
+        return apply_scan(self, result)
+
+    monkeypatch.setattr(main, "_scan_response", recording_scan)
+    monkeypatch.setattr(MetaAI, "_apply_scan", recording_apply)
+    offload = Offloader(threads=1, threshold=0)
+
+    async def run():
+        threads["loop"] = threading.get_ident()
+        async with MetaAI(offload=offload) as ai:
+            results = [result async for result in ai.prompt("hi")]
+            return results, ai.external_conversation_id
+
+    (result,), conversation = asyncio.run(run())
+    offload.close()
+    assert result["message"].strip() == "Hello world"
+    assert conversation == "conv"
+    assert threads["scan"] != threads["loop"]
+    assert threads["apply"] == threads["loop"]
+
+
+def test_watchdog_reports_blocking_call():
+    stalls = []
+
+    async def run():
+        watchdog = LoopWatchdog(threshold=0.05, interval=0.01, on_stall=lambda blocked, stack: stalls.append(stack))
+        await watchdog.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)
+        await asyncio.sleep(0.05)
+        await watchdog.close()
+        return watchdog.stats()
+
+    stats = asyncio.run(run())
+    assert stats["stalls"] == 1
+    assert any("time.sleep" in line for line in stalls[0])
@@ -0,0 +1,38 @@
+from urllib.parse import parse_qs, urlencode
+
+import pytest
+import ujson as json
+
+from meta_ai_api.operations import DOC_IDS_ENV, DOC_IDS_FILE_ENV, Operation, OperationRegistry, Slot
+
+
+def test_compiled_body_matches_a_direct_encoding():
+    operation = Operation("Op", "42", {"message": Slot("message"), "fixed": [1, None], "id": Slot("id")})
+    values = {"message": {"sensitive_string_value": "héllo & = +"}, "id": "abc"}
+    auth = {"access_token": "t/o+k"}
+    expected = urlencode([
+        ("access_token", "t/o+k"),
+        ("fb_api_caller_class", "RelayModern"),
+        ("fb_api_req_friendly_name", "Op"),
+        ("variables", json.dumps({"message": values["message"], "fixed": [1, None], "id": "abc"})),
+        ("server_timestamps", "true"),
+        ("doc_id", "42"),
+    ]).encode()
+    assert operation.body(auth, **values) == expected
+    # The template is reused for the next call with the same auth fields
+    assert operation.body(auth, message="again", id="x") != expected
+    assert len(operation._templates) == 1
+
+
+def test_overrides_from_environment_and_file(tmp_path):
+    path = tmp_path / "ids.json"
+    path.write_text(json.dumps({"AbraSearchPluginDialogQuery": "111"}))
+    registry = OperationRegistry.default(
+        {DOC_IDS_FILE_ENV: str(path), DOC_IDS_ENV: "useAbraSendMessageMutation=222"}
+    )
+    assert registry.doc_ids()["AbraSearchPluginDialogQuery"] == "111"
+    operation = registry["useAbraSendMessageMutation"]
+    body = operation.body({"access_token": "t"}, message="m", external_conversation_id="c", offline_threading_id="o")
+    assert parse_qs(body.decode())["doc_id"] == ["222"]
+    with pytest.raises(ValueError):
+        OperationRegistry.default({DOC_IDS_ENV: "broken"})
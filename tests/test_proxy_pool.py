@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from meta_ai_api import proxy_pool
+from meta_ai_api.proxy_pool import ProxyPool
+
+
+def test_traffic_latency_does_not_trigger_failover():
+    pool = ProxyPool(["http://a:1", "http://b:1"])
+    for state in pool.proxies.values():
+        state.record(True, 0.2)
+    proxy = pool.assign("alice")
+    # Seconds to the headers of a real prompt are far above any probe latency
+    for _ in range(20):
+        pool.report(proxy, True, 5.0)
+    assert pool.assign("alice") == proxy
+    assert pool.proxies[proxy].latency == pytest.approx(0.2)
+    assert pool.proxies[proxy].traffic_latency == pytest.approx(5.0, rel=0.01)
+
+
+def test_failing_traffic_fails_over():
+    pool = ProxyPool(["http://a:1", "http://b:1"], max_consecutive_failures=2)
+    proxy = pool.assign("alice")
+    pool.report(proxy, False)
+    pool.report(proxy, False)
+    assert pool.assign("alice") != proxy
+    assert sum(state.assigned for state in pool.proxies.values()) == 1
+
+
+def test_assignments_spread_and_stick():
+    pool = ProxyPool(["http://a:1", "http://b:1"])
+    first, second = pool.assign("alice"), pool.assign("bob")
+    assert first != second
+    assert pool.assign("alice") == first
+    pool.release("alice")
+    assert pool.proxies[first].assigned == 0
+
+
+def test_probe_error_marks_proxy_unhealthy(monkeypatch):
+    class Broken:
+        def __init__(self, **kwargs):
+            raise RuntimeError("bad proxy url")
+
+    monkeypatch.setattr(proxy_pool.httpx, "AsyncClient", Broken)
+    pool = ProxyPool(["http://a:1"], max_consecutive_failures=1)
+    asyncio.run(pool.check_all())
+    state = pool.proxies["http://a:1"]
+    assert state.consecutive_failures == 1
+    assert not pool.is_healthy(state)
+
+
+def test_health_loop_survives_probe_errors(monkeypatch):
+    calls = []
+
+    class Flaky:
+        def __init__(self, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            raise httpx.ConnectError("refused")
+
+    monkeypatch.setattr(proxy_pool.httpx, "AsyncClient", Flaky)
+
+    async def run():
+        pool = ProxyPool(["http://a:1"], check_interval=0.01)
+        await pool.start()
+        await asyncio.sleep(0.1)
+        alive = not pool._task.done()
+        await pool.close()
+        return alive
+
+    assert asyncio.run(run())
+    assert len(calls) > 1
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from meta_ai_api import Scheduler, TenantQuota
+from meta_ai_api.exceptions import SchedulerRejected
+from meta_ai_api.scheduler import parse_quota
+
+
+async def run_calls(scheduler, calls, hold=0.0):
+    """Runs (tenant, priority) calls through the scheduler; returns the start order."""
+    order = []
+
+    async def call(tenant, priority):
+        async with scheduler.slot(tenant, priority):
+            order.append((tenant, priority))
+            await asyncio.sleep(hold)
+
+    # A blocker keeps the capacity busy until every call is queued
+    blocker = await scheduler.acquire("blocker")
+    tasks = [asyncio.create_task(call(tenant, priority)) for tenant, priority in calls]
+    await asyncio.sleep(0)
+    scheduler.release(blocker)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_interactive_goes_before_batch():
+    scheduler = Scheduler(capacity=1)
+    calls = [("job", "batch")] * 3 + [("user", "interactive")] * 2
+    order = asyncio.run(run_calls(scheduler, calls))
+    assert order[:2] == [("user", "interactive")] * 2
+
+
+def test_weighted_fair_share_within_a_class():
+    scheduler = Scheduler(capacity=1, quotas={"heavy": TenantQuota(weight=2.0)})
+    calls = [("deep", "batch")] * 9 + [("heavy", "batch")] * 6 + [("late", "batch")] * 3
+    order = [tenant for tenant, _ in asyncio.run(run_calls(scheduler, calls))]
+    # The tenant with a deep queue does not crowd out the others
+    assert "late" in order[:4]
+    first_twelve = order[:12]
+    assert first_twelve.count("heavy") >= 2 * first_twelve.count("late")
+
+
+def test_concurrency_quota_skips_to_other_tenants():
+    async def run():
+        scheduler = Scheduler(capacity=2, quotas={"a": TenantQuota(max_concurrency=1)})
+        running = {"a": 0, "peak": 0}
+
+        async def call(tenant):
+            async with scheduler.slot(tenant):
+                if tenant == "a":
+                    running["a"] += 1
+                    running["peak"] = max(running["peak"], running["a"])
+                await asyncio.sleep(0.01)
+                if tenant == "a":
+                    running["a"] -= 1
+
+        await asyncio.gather(*(call(tenant) for tenant in ["a"] * 4 + ["b"] * 4))
+        return running["peak"], scheduler.stats()
+
+    peak, stats = asyncio.run(run())
+    assert peak == 1
+    assert stats["running"] == 0 and stats["tenants"]["a"]["admitted"] == 4
+
+
+def test_rate_quota_spaces_starts():
+    async def run():
+        scheduler = Scheduler(capacity=4, quotas={"slow": TenantQuota(rate=20.0, burst=1.0)})
+        loop = asyncio.get_running_loop()
+        starts = []
+
+        async def call():
+            async with scheduler.slot("slow"):
+                starts.append(loop.time())
+
+        await asyncio.gather(*(call() for _ in range(4)))
+        return starts
+
+    starts = asyncio.run(run())
+    assert starts[-1] - starts[0] >= 0.12
+
+
+def test_queue_limit_and_cancellation():
+    async def run():
+        scheduler = Scheduler(capacity=1, quotas={"t": TenantQuota(max_queue=1)})
+        held = await scheduler.acquire("other")
+        waiter = asyncio.create_task(scheduler.acquire("t"))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerRejected):
+            await scheduler.acquire("t")
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release(held)
+        stats = scheduler.stats()
+        # The cancelled call left the queue, so the tenant can queue again
+        ticket = await scheduler.acquire("t")
+        scheduler.release(ticket)
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["queued"] == 0 and stats["running"] == 0
+    assert stats["tenants"]["t"]["rejected"] == 1 and stats["tenants"]["t"]["abandoned"] == 1
+
+
+def test_dynamic_capacity():
+    async def run():
+        limit = {"value": 1}
+        scheduler = Scheduler(capacity=lambda: limit["value"])
+        first = await scheduler.acquire()
+        second = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        assert not second.done()
+        limit["value"] = 2
+        # Any dispatch picks up the new capacity; the first call is still running
+        scheduler.set_quota("other", TenantQuota())
+        ticket = await asyncio.wait_for(second, 1)
+        return first.started is not None and ticket.started is not None, scheduler.running
+
+    assert asyncio.run(run()) == (True, 2)
+
+
+def test_parse_quota():
+    tenant, quota = parse_quota("nightly=0.5::2")
+    assert tenant == "nightly" and quota.weight == 0.5 and quota.max_concurrency is None and quota.rate == 2.0
+    with pytest.raises(ValueError):
+        parse_quota("missing-weight")
+    with pytest.raises(ValueError):
+        Scheduler()._priority("urgent")
+
+
+def test_idle_tenants_are_forgotten():
+    async def run():
+        scheduler = Scheduler(capacity=2, max_idle_tenants=2)
+        busy = await scheduler.acquire("busy")
+        for tenant in range(5):
+            async with scheduler.slot(tenant):
+                pass
+        tenants = set(scheduler.tenants)
+        scheduler.release(busy)
+        return tenants, set(scheduler.tenants)
+
+    running, idle = asyncio.run(run())
+    # A tenant with a running call is never forgotten
+    assert running == {"busy", 3, 4}
+    assert idle == {4, "busy"}
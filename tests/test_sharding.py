@@ -0,0 +1,80 @@
+import asyncio
+import queue
+
+from meta_ai_api.batch import affinity
+from meta_ai_api.sharding import ShardedExecutor
+
+
+class FakeWorker:
+    def __init__(self):
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.exitcode is None
+
+    def join(self):
+        pass
+
+    def terminate(self):
+        self.exitcode = -15
+
+
+def test_session_pick_is_independent_of_the_shard():
+    keys = [f"conversation-{i}" for i in range(400)]
+    for processes, sessions in ((2, 4), (4, 4), (3, 6)):
+        for shard in range(processes):
+            used = {affinity(k, sessions, salt="session") for k in keys if affinity(k, processes) == shard}
+            assert used == set(range(sessions)), (processes, sessions, shard)
+
+
+def test_items_of_a_dead_worker_are_reported_failed():
+    results = []
+
+    async def run():
+        executor = ShardedExecutor(results.append, processes=2, max_pending_per_process=100)
+        executor._outbox = queue.Queue()
+        executor._inboxes = [queue.Queue(), queue.Queue()]
+        executor._workers = [FakeWorker(), FakeWorker()]
+        executor._capacity = asyncio.Condition()
+        executor._collector = asyncio.create_task(executor._collect())
+        items = [{"id": str(i), "prompt": f"p{i}", "conversation": f"c{i}"} for i in range(8)]
+        dead = affinity("c0", 2)
+        for item in items:
+            await executor.submit(item)
+        # One worker is killed, the other answers its items
+        executor._workers[dead].exitcode = -9
+        for item in items:
+            if affinity(item["conversation"], 2) != dead:
+                executor._outbox.put(("result", 1 - dead, {"id": item["id"], "message": "ok"}))
+        while dead not in executor._finished:
+            await asyncio.sleep(0.01)
+        # Later items of the dead worker's conversations fail right away
+        await executor.submit({"id": "late", "prompt": "p", "conversation": "c0"})
+        executor._outbox.put(("done", 1 - dead, {}))
+        await asyncio.wait_for(executor._collector, 5)
+        return executor, dead
+
+    executor, dead = asyncio.run(run())
+    failed = {r["id"] for r in results if "error" in r}
+    expected = {str(i) for i in range(8) if affinity(f"c{i}", 2) == dead} | {"late"}
+    assert failed == expected
+    assert len(results) == 9
+    assert "exited with code -9" in next(r["error"] for r in results if r["id"] == "0")
+    assert executor.pending == [0, 0]
+
+
+def test_duplicate_id_in_flight_is_rejected():
+    results = []
+
+    async def run():
+        executor = ShardedExecutor(results.append, processes=2, max_pending_per_process=100)
+        executor._inboxes = [queue.Queue(), queue.Queue()]
+        executor._capacity = asyncio.Condition()
+        await executor.submit({"id": "a", "prompt": "one"})
+        await executor.submit({"id": "a", "prompt": "two"})
+        return executor
+
+    executor = asyncio.run(run())
+    assert [r["prompt"] for r in results] == ["two"] and "error" in results[0]
+    assert sum(inbox.qsize() for inbox in executor._inboxes) == 1
+    assert [item["prompt"] for in_flight in executor.in_flight for item in in_flight.values()] == ["one"]
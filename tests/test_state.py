@@ -0,0 +1,329 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from meta_ai_api import MetaAI
+from meta_ai_api.state import MemoryStore, RedisError, RedisStore, SharedState, SQLiteStore, StateStore, open_store
+
+
+class FakeRedis:
+    """
+    An in-process Redis stand-in speaking RESP, with the commands RedisStore uses:
+    AUTH, SELECT, GET, SET (PX, NX), DEL, INCRBY, PTTL, PEXPIRE, WATCH, UNWATCH,
+    MULTI and EXEC.
+    """
+
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}
+        # Bumped on every write, for WATCH
+        self.versions = {}
+        self.commands = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._client, "127.0.0.1", 0)
+        return self
+
+    @property
+    def url(self):
+        port = self.server.sockets[0].getsockname()[1]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{port}/2"
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            self._write(key, None)
+            return None
+        return entry
+
+    def _write(self, key, entry):
+        if entry is None:
+            self.data.pop(key, None)
+        else:
+            self.data[key] = entry
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _run(self, name, args):
+        if name == "GET":
+            entry = self._live(args[0])
+            return entry[0] if entry else None
+        if name == "SET":
+            options = [arg.upper() for arg in args[2:]]
+            expires = None
+            if "PX" in options:
+                expires = time.monotonic() + int(args[2 + options.index("PX") + 1]) / 1000
+            if "NX" in options and self._live(args[0]):
+                return None
+            self._write(args[0], (args[1], expires))
+            return "+OK"
+        if name == "DEL":
+            existed = self._live(args[0]) is not None
+            if existed:
+                self._write(args[0], None)
+            return int(existed)
+        if name == "INCRBY":
+            entry = self._live(args[0])
+            value = (int(entry[0]) if entry else 0) + int(args[1])
+            self._write(args[0], (str(value), entry[1] if entry else None))
+            return value
+        if name == "PTTL":
+            entry = self._live(args[0])
+            if entry is None:
+                return -2
+            return -1 if entry[1] is None else int((entry[1] - time.monotonic()) * 1000)
+        if name == "PEXPIRE":
+            entry = self._live(args[0])
+            if entry is None:
+                return 0
+            self._write(args[0], (entry[0], time.monotonic() + int(args[1]) / 1000))
+            return 1
+        return f"-ERR unknown command '{name}'"
+
+    def _handle(self, session, command):
+        name, args = command[0].upper(), command[1:]
+        self.commands.append(name)
+        if name == "AUTH":
+            return "+OK" if args[-1] == self.password else "-WRONGPASS invalid password"
+        if session.get("authenticated") is False:
+            return "-NOAUTH Authentication required"
+        if name == "SELECT":
+            return "+OK"
+        if name == "WATCH":
+            session["watched"].update({key: self.versions.get(key, 0) for key in args})
+            return "+OK"
+        if name == "UNWATCH":
+            session["watched"].clear()
+            return "+OK"
+        if name == "MULTI":
+            session["queue"] = []
+            return "+OK"
+        if name == "EXEC":
+            queued, session["queue"] = session["queue"], None
+            watched = dict(session["watched"])
+            session["watched"].clear()
+            if any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                return [None]
+            return [[self._run(n, a) for n, a in queued]]
+        if session["queue"] is not None:
+            session["queue"].append((name, args))
+            return "+QUEUED"
+        return self._run(name, args)
+
+    @classmethod
+    def _encode(cls, reply):
+        if isinstance(reply, list):
+            if reply == [None]:
+                return b"*-1\r\n"
+            (items,) = reply
+            return b"*%d\r\n" % len(items) + b"".join(cls._encode(item) for item in items)
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if reply.startswith(("+", "-")):
+            return reply.encode() + b"\r\n"
+        data = reply.encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    async def _client(self, reader, writer):
+        session = {"watched": {}, "queue": None, "authenticated": False if self.password else None}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    command.append((await reader.readexactly(length + 2))[:-2].decode())
+                reply = self._handle(session, command)
+                if command[0].upper() == "AUTH" and reply == "+OK":
+                    session["authenticated"] = True
+                writer.write(self._encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def with_store(request, tmp_path):
+    """Runs a coroutine function with a fresh store of each kind on one event loop."""
+
+    def run(body):
+        async def main():
+            server = None
+            if request.param == "memory":
+                store = MemoryStore()
+            elif request.param == "sqlite":
+                store = SQLiteStore(str(tmp_path / "state.db"))
+            else:
+                server = await FakeRedis(password="secret").start()
+                store = RedisStore(server.url)
+            try:
+                return await body(store)
+            finally:
+                await store.close()
+                if server is not None:
+                    await server.close()
+
+        return asyncio.run(main())
+
+    return run
+
+
+def test_store_operations(with_store):
+    async def body(store):
+        assert await store.get("k") is None
+        await store.set("k", "v")
+        assert await store.get("k") == "v"
+        assert not await store.add("k", "w")
+        assert await store.add("fresh", "w", ttl=0.05)
+        assert await store.incr("n", 2, ttl=60) == 2
+        assert await store.incr("n", 3, ttl=60) == 5
+        assert not await store.delete_if("k", "other")
+        assert await store.delete_if("k", "v")
+        assert await store.get("k") is None
+        await asyncio.sleep(0.1)
+        assert await store.get("fresh") is None
+        assert not await store.delete_if("fresh", "w")
+        await store.delete("n")
+        return await store.get("n")
+
+    assert with_store(body) is None
+
+
+def test_one_login_per_identity_across_nodes(with_store):
+    async def body(store):
+        logins = []
+
+        async def login():
+            logins.append(1)
+            await asyncio.sleep(0.1)
+            return {"cookies": {"datr": "D"}, "access_token": "T"}
+
+        nodes = [SharedState(store) for _ in range(3)]
+        records = await asyncio.gather(*(node.identity("alice", login) for node in nodes))
+        return len(logins), records, await store.get("meta_ai:login:alice")
+
+    logins, records, lock = with_store(body)
+    assert logins == 1 and all(record["access_token"] == "T" for record in records)
+    assert lock is None
+
+
+def test_expired_login_lock_is_not_released_by_its_old_holder(with_store):
+    async def body(store):
+        slow, fast = SharedState(store, login_timeout=0.1), SharedState(store, login_timeout=30)
+        second_login = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_login():
+            await asyncio.sleep(0.3)
+            raise RuntimeError("login failed")
+
+        async def fast_login():
+            second_login.set()
+            await release.wait()
+            return {"cookies": {}}
+
+        first = asyncio.create_task(slow.identity("bob", slow_login))
+        await asyncio.sleep(0.15)
+        # The first lock expired; another node takes over
+        second = asyncio.create_task(fast.identity("bob", fast_login))
+        await second_login.wait()
+        with pytest.raises(RuntimeError):
+            await first
+        held = await store.get("meta_ai:login:bob")
+        release.set()
+        await second
+        return held, fast.node
+
+    held, node = with_store(body)
+    assert held is not None and held.startswith(node)
+
+
+def test_forget_identity_keeps_a_newer_record(with_store):
+    async def body(store):
+        state = SharedState(store)
+        stale = await state.identity("carol", lambda: asyncio.sleep(0, {"cookies": {"v": 1}}))
+        await state.forget_identity("carol", stale)
+        fresh = await state.identity("carol", lambda: asyncio.sleep(0, {"cookies": {"v": 2}}))
+        # A node that still holds the old record does not drop the new one
+        await state.forget_identity("carol", stale)
+        kept = await state.identity("carol", lambda: asyncio.sleep(0, {"cookies": {"v": 3}}))
+        return fresh, kept
+
+    fresh, kept = with_store(body)
+    assert fresh == kept == {"cookies": {"v": 2}}
+
+
+def test_global_limit_waits_for_the_next_window(with_store):
+    async def body(store):
+        state = SharedState(store, global_limit=(2, 0.2))
+        started = time.monotonic()
+        for _ in range(3):
+            await state.admit()
+        return time.monotonic() - started, state.throttled
+
+    elapsed, throttled = with_store(body)
+    assert throttled == 1 and elapsed <= 0.3
+
+
+def test_redis_auth_and_errors():
+    async def main():
+        server = await FakeRedis(password="secret").start()
+        wrong = RedisStore(server.url.replace("secret", "wrong"))
+        with pytest.raises(RedisError):
+            await wrong.get("k")
+        store = RedisStore(server.url)
+        with pytest.raises(RedisError):
+            await store.execute(("FLUSHALL",))
+        await store.set("k", "v")
+        value = await store.get("k")
+        await wrong.close()
+        await store.close()
+        await server.close()
+        return value, server.commands
+
+    value, commands = asyncio.run(main())
+    assert value == "v" and "SELECT" in commands
+    assert isinstance(open_store("redis://localhost:6379/1"), RedisStore)
+
+
+def test_rejected_credentials_refresh_the_shared_identity(meta):
+    statuses = [401]
+
+    def prompt(request):
+        if statuses:
+            return httpx.Response(statuses.pop())
+        return httpx.Response(200, text="\n".join(meta.lines) + "\n")
+
+    meta.prompt = prompt
+    state = SharedState(MemoryStore())
+
+    async def run():
+        async with MetaAI(identity="dave", state=state) as ai:
+            return [result async for result in ai.prompt("hi")]
+
+    (result,) = asyncio.run(run())
+    assert result["message"].strip() == "Hello world"
+    tos = [r for r in meta.requests if b"useAbraAcceptTOSForTempUserMutation" in r.content]
+    assert len(tos) == 2 and state.logins == 2
+
+
+def test_incomplete_store_fails_at_instantiation():
+    class GetOnly(StateStore):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
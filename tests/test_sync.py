@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from meta_ai_api import MetaAI, SyncMetaAI
+
+
+def test_ask_and_stream_reuse_one_session(meta):
+    with SyncMetaAI() as client:
+        first = client.ask("hello")
+        chunks = list(client.stream("again", conversation_id=first["uuid"]))
+        assert first["message"] == "Hello world\n"
+        assert chunks[-1]["message"] == "Hello world\n"
+        assert len(client._sessions) == 1
+
+
+def test_timeout_cancels_the_call_and_frees_the_session(meta):
+    async def answer(request):
+        if len(meta.prompts()) == 1:
+            await asyncio.sleep(30)
+        return httpx.Response(200, text="\n".join(meta.lines) + "\n")
+
+    meta.prompt = answer
+    with SyncMetaAI() as client:
+        client.warmup()
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            # Well past the access token fetch, into the first prompt request
+            client.ask("hello", timeout=2)
+        assert len(meta.prompts()) == 1
+        # With one session, the next call only runs once the timed-out one let go of it
+        assert client.ask("hello", timeout=10)["message"] == "Hello world\n"
+        assert time.monotonic() - started < 10
+
+
+def test_continued_conversations_stay_on_their_session(meta):
+    with SyncMetaAI(sessions=2) as client:
+        client.warmup()
+        first, second = client._sessions
+        conversation = client.ask("hello")["uuid"]
+        # first is now the last idle session, so only the pin sends the call back to it
+        client.ask("again", conversation_id=conversation)
+        assert client._pinned[conversation] is first
+        assert second.external_conversation_id is None
+
+
+def test_failed_sessions_are_closed(meta, monkeypatch):
+    closed = []
+    original_close = MetaAI.close
+
+    async def failing_initialize(self):
+        self.session = self._create_session()
+        raise RuntimeError("initialize failed")
+
+    async def close(self):
+        closed.append(self)
+        await original_close(self)
+
+    monkeypatch.setattr(MetaAI, "initialize", failing_initialize)
+    monkeypatch.setattr(MetaAI, "close", close)
+    with SyncMetaAI() as client:
+        with pytest.raises(RuntimeError):
+            client.ask("hello")
+        assert len(closed) == 1 and closed[0].session.is_closed
+        assert client._sessions == [] and client._creating == 0
+
+
+def test_stream_stops_reading_ahead_of_a_slow_consumer(meta):
+    produced = 0
+
+    async def body():
+        nonlocal produced
+        for line in meta.lines[:1] * 100 + meta.lines[-1:]:
+            produced += 1
+            yield (line + "\n").encode()
+            await asyncio.sleep(0)
+
+    meta.prompt = lambda request: httpx.Response(200, content=body())
+    with SyncMetaAI() as client:
+        chunks = client.stream("hello")
+        next(chunks)
+        time.sleep(0.5)
+        assert produced < 30
+        assert len(list(chunks)) == 99
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from meta_ai_api import MetaAI, TraceWriter
+from meta_ai_api.trace import read_trace, trace_files
+from meta_ai_api.trace_reader import TraceReader
+
+
+@pytest.mark.parametrize("codec, serializer", [("gzip", "json"), ("none", "msgpack"), ("gzip", "msgpack")])
+def test_round_trip(tmp_path, codec, serializer):
+    prefix = str(tmp_path / "trace")
+    writer = TraceWriter(prefix, codec=codec, serializer=serializer)
+    writer.write("stream_response (line 1)", b'{"a": 1}', conversation="c1", request=7, timestamp=1.0)
+    writer.write("extracted", {"message": "hi"}, timestamp=2.0)
+    writer.close()
+    (path,) = trace_files(prefix)
+    records = list(read_trace(path))
+    assert [record["endpoint"] for record in records] == ["stream_response (line 1)", "extracted"]
+    assert records[0]["conversation"] == "c1" and records[0]["request"] == 7
+    assert records[0]["data"] in (b'{"a": 1}', '{"a": 1}')
+    assert records[1]["data"] == {"message": "hi"} and records[1]["t"] == 2.0
+
+
+def test_rotation_keeps_max_files(tmp_path):
+    prefix = str(tmp_path / "trace")
+    writer = TraceWriter(prefix, max_bytes=200, max_files=2, codec="none", serializer="json", block_size=1)
+    for i in range(20):
+        writer.write("extracted", {"index": i, "padding": "x" * 100})
+    writer.close()
+    files = trace_files(prefix)
+    assert len(files) == 2
+    indexes = [record["data"]["index"] for path in files for record in read_trace(path)]
+    assert indexes == sorted(indexes) and indexes[-1] == 19
+
+
+def test_truncated_block_is_skipped(tmp_path):
+    prefix = str(tmp_path / "trace")
+    writer = TraceWriter(prefix, codec="gzip", serializer="json", block_size=1)
+    writer.write("extracted", {"index": 0})
+    writer.write("extracted", {"index": 1})
+    writer.close()
+    (path,) = trace_files(prefix)
+    os.truncate(path, os.path.getsize(path) - 3)
+    assert [record["data"]["index"] for record in read_trace(path)] == [0]
+
+
+def test_prompt_writes_trace(meta, tmp_path):
+    prefix = str(tmp_path / "trace")
+    writer = TraceWriter(prefix, codec="gzip")
+
+    async def run():
+        async with MetaAI(trace=writer) as ai:
+            async for _ in ai.prompt("hi", stream=True):
+                pass
+
+    asyncio.run(run())
+    writer.close()
+    records = [record for path in trace_files(prefix) for record in read_trace(path)]
+    assert any(record["endpoint"].startswith("stream_response") for record in records)
+    assert records[-1]["endpoint"] == "extracted"
+
+
+def test_prompts_get_distinct_request_ids_without_hooks(meta, tmp_path):
+    prefix = str(tmp_path / "trace")
+    writer = TraceWriter(prefix, codec="gzip")
+
+    async def run():
+        async with MetaAI(trace=writer) as ai:
+            for _ in range(2):
+                async for _ in ai.prompt("hi", stream=True):
+                    pass
+
+    asyncio.run(run())
+    writer.close()
+    records = [record for path in trace_files(prefix) for record in read_trace(path)]
+    requests = {record["request"] for record in records if record["endpoint"].startswith("stream_response")}
+    assert len(requests) == 2 and None not in requests
+    with TraceReader(prefix) as reader:
+        assert reader.latency()["prompts"] == 2
+
+
+def test_flush_interval_flushes_an_idle_block(tmp_path):
+    prefix = str(tmp_path / "trace")
+    writer = TraceWriter(prefix, codec="gzip", serializer="json", flush_interval=0.1)
+    writer.write("extracted", {"message": "hi"})
+    assert writer.stats()["written_bytes"] == 0
+    time.sleep(0.5)
+    # Flushed without another write or an explicit flush()
+    assert writer.stats()["written_bytes"] > 0
+    (path,) = trace_files(prefix)
+    assert [record["data"] for record in read_trace(path)] == [{"message": "hi"}]
+    writer.close()
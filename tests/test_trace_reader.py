@@ -0,0 +1,100 @@
+import pytest
+
+from meta_ai_api.trace import TraceWriter, read_trace, trace_files
+from meta_ai_api.trace_reader import TraceReader
+
+
+def write_trace(prefix, delta=False, start=0, count=40):
+    writer = TraceWriter(prefix, codec="gzip", serializer="json", block_size=512, delta=delta)
+    for i in range(start, start + count):
+        conversation = f"conv{i % 3}"
+        request = i % 5
+        endpoint = "prompt (stream - first line)" if i % 5 == 0 else f"stream_response (line {i % 5})"
+        writer.write(endpoint, f"payload {conversation} {i}" * 3, conversation=conversation, request=request, timestamp=1000.0 + i)
+    writer.close()
+
+
+FILTERS = [
+    {"conversation": "conv1"},
+    {"request": 2},
+    {"endpoint": "first line"},
+    {"since": 1010.0, "until": 1020.0},
+    {"since": 1035.0},
+    {"conversation": "conv2", "request": 4, "since": 1005.0},
+    {"endpoint": "stream_response", "until": 1012.5},
+    {"conversation": "missing"},
+]
+
+
+def matches(record, conversation=None, request=None, endpoint=None, since=None, until=None):
+    return (
+        (conversation is None or record["conversation"] == conversation)
+        and (request is None or record["request"] == request)
+        and (endpoint is None or endpoint in record["endpoint"])
+        and (since is None or record["t"] >= since)
+        and (until is None or record["t"] <= until)
+    )
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_query_matches_full_scan(tmp_path, filters):
+    prefix = str(tmp_path / "trace")
+    write_trace(prefix)
+    expected = [r for path in trace_files(prefix) for r in read_trace(path) if matches(r, **filters)]
+    with TraceReader(prefix) as reader:
+        assert list(reader.query(**filters)) == expected
+
+
+def test_index_is_keyed_and_extended(tmp_path):
+    prefix = str(tmp_path / "trace")
+    writer = TraceWriter(prefix, codec="gzip", serializer="json")
+    for i in range(20):
+        writer.write("extracted", {"i": i}, conversation=f"conv{i % 3}", timestamp=1000.0 + i)
+    writer.flush()
+    with TraceReader(prefix) as reader:
+        (segment,) = reader.segments
+        assert segment.index["by_conversation"]["conv0"] == list(range(0, 20, 3))
+        assert segment.index["times"] == sorted(segment.index["times"])
+    for i in range(20, 40):
+        writer.write("extracted", {"i": i}, conversation=f"conv{i % 3}", timestamp=1000.0 + i)
+    writer.close()
+    with TraceReader(prefix) as reader:
+        (segment,) = reader.segments
+        assert len(segment.index["blocks"]) == 2
+        assert reader.conversations() == {"conv0": 14, "conv1": 13, "conv2": 13}
+        assert [r["data"]["i"] for r in reader.query(since=1038.0)] == [38, 39]
+
+
+def test_delta_records_are_rebuilt(tmp_path):
+    prefix = str(tmp_path / "trace")
+    write_trace(prefix, delta=True)
+    expected = [r for path in trace_files(prefix) for r in read_trace(path) if r["request"] == 3]
+    with TraceReader(prefix) as reader:
+        assert list(reader.query(request=3)) == expected
+        last = expected[-1]
+        (record,) = reader.query(request=3, since=last["t"])
+        assert record["data"] == last["data"]
+
+
+def test_latency_stats(tmp_path):
+    prefix = str(tmp_path / "trace")
+    write_trace(prefix, count=10)
+    with TraceReader(prefix) as reader:
+        stats = reader.latency()
+    assert stats["prompts"] == 5
+    assert stats["duration"]["max"] == 5.0
+    # Only request 0 starts with a first line
+    assert stats["first_chunk"]["count"] == 1
+
+
+def test_latency_does_not_merge_request_ids_across_files(tmp_path):
+    prefix = str(tmp_path / "trace")
+    for start in (0.0, 100.0):
+        # A separate run whose writer numbered its requests from 1 again
+        writer = TraceWriter(prefix, codec="gzip", serializer="json")
+        writer.write("prompt (non-stream)", "a", request=1, timestamp=start)
+        writer.write("extracted", {}, request=1, timestamp=start + 1.0)
+        writer.close()
+    with TraceReader(prefix) as reader:
+        stats = reader.latency()
+    assert stats["prompts"] == 2 and stats["duration"]["max"] == 1.0
@@ -0,0 +1,55 @@
+import asyncio
+
+from meta_ai_api import MetaAI
+from meta_ai_api.main import WARMUP_URLS
+
+
+def tos_requests(meta):
+    return [r for r in meta.requests if b"useAbraAcceptTOSForTempUserMutation" in r.content]
+
+
+def test_warmup_preconnects_and_fetches_the_token_once(meta):
+    async def run():
+        async with MetaAI(warmup=True) as ai:
+            assert ai._token_task is not None
+            return [chunk async for chunk in ai.prompt("hi")][-1]
+
+    result = asyncio.run(run())
+    assert result["message"] == "Hello world\n"
+    heads = {str(r.url) for r in meta.requests if r.method == "HEAD"}
+    assert heads == set(WARMUP_URLS)
+    assert len(tos_requests(meta)) == 1
+
+
+def test_failed_background_token_fetch_is_retried_inline(meta, monkeypatch):
+    async def run():
+        ai = MetaAI(warmup=True)
+        calls = []
+        fetch = ai.get_access_token
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("token endpoint down")
+            return await fetch()
+
+        monkeypatch.setattr(ai, "get_access_token", flaky)
+        async with ai:
+            result = [chunk async for chunk in ai.prompt("hi")][-1]
+        return result, calls
+
+    result, calls = asyncio.run(run())
+    assert result["message"] == "Hello world\n"
+    assert len(calls) == 2
+
+
+def test_close_cancels_pending_warmup(meta):
+    async def run():
+        ai = MetaAI(warmup=True)
+        await ai.initialize()
+        tasks = [*ai._warmup_tasks, ai._token_task]
+        await ai.close()
+        return tasks
+
+    tasks = asyncio.run(run())
+    assert all(task.done() for task in tasks)